@@ -1,35 +1,249 @@
-from flask import Flask, request, jsonify, send_file, render_template, send_from_directory
+from flask import Flask, Blueprint, current_app, request, jsonify, send_file, render_template, send_from_directory, after_this_request
 from flask_cors import CORS
-from zai import ZhipuAiClient  # Supondo que este seja o import correto para o seu cliente
-import pandas as pd
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import inch
-from reportlab.lib.colors import HexColor
+import httpx
+import numpy as np
+# pandas e reportlab são importados no primeiro uso (ler_planilhas_excel / renderizar_pdf)
 import io
 import os
+import gzip
+import base64
+import sys
 import json
 import re
+import pickle
+import queue
+import sqlite3
+import urllib.parse
+import atexit
+import hashlib
+import hmac
+import secrets
+import functools
+import bisect
+import heapq
+import contextlib
+import csv
+import zipfile
+import multiprocessing
 from datetime import datetime
 import uuid
+import asyncio
+import threading
+import time
+import weakref
+import math
+import unicodedata
+import difflib
+from collections import defaultdict, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, BrokenExecutor, wait, FIRST_COMPLETED, TimeoutError as FuturesTimeoutError
+import click
 from dotenv import load_dotenv
 
+# Opcionais: codificador JSON mais rápido e compressão brotli em /balcoes
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 # --- CONFIGURAÇÃO ---
 load_dotenv()
-app = Flask(__name__)
-application = app
-CORS(app)
-EXCEL_FILE = 'orcamento_final1.xlsx'
+# Rotas registradas na aplicação por create_app()
+rotas = Blueprint('architec', __name__, cli_group=None)
+EXCEL_FILE = os.getenv("CATALOGO_PLANILHA", 'orcamento_final1.xlsx')
+# Snapshot compilado do catálogo (defina CATALOGO_SNAPSHOT=0 para sempre ler o Excel)
+USAR_SNAPSHOT_CATALOGO = os.getenv("CATALOGO_SNAPSHOT", "1") != "0"
+# Recarga a quente: token do endpoint de administração e intervalo do observador (0 desativa)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+CATALOGO_WATCH_INTERVAL = float(os.getenv("CATALOGO_WATCH_INTERVAL", "0"))
+# Intervalo mínimo (s) entre as checagens, a cada requisição, da versão publicada por outro worker
+CATALOGO_PUBLICACAO_INTERVALO = float(os.getenv("CATALOGO_PUBLICACAO_INTERVALO", "2"))
+# Sessões de conversa: backend 'memoria' (LRU+TTL por processo) ou 'sqlite' (compartilhado entre workers)
+SESSOES_BACKEND = os.getenv("SESSOES_BACKEND", "memoria")
+SESSOES_MAX = int(os.getenv("SESSOES_MAX", "10000"))
+SESSOES_TTL = int(os.getenv("SESSOES_TTL", str(6 * 3600)))
+SESSOES_DB_FILE = os.getenv("SESSOES_DB_FILE", "orcamento.db")
+# Geração de PDF em segundo plano: espera curta nos downloads (depois 202 com Retry-After, em s)
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "2"))
+PDF_MAX_PENDENTES = int(os.getenv("PDF_MAX_PENDENTES", "50"))
+PDF_WAIT_TIMEOUT = float(os.getenv("PDF_WAIT_TIMEOUT", "2"))
+PDF_RETRY_AFTER = int(os.getenv("PDF_RETRY_AFTER", "1"))
+# /chat/stream: threads que processam as mensagens e máximo de streams abertos (em andamento + na fila)
+CHAT_STREAM_WORKERS = int(os.getenv("CHAT_STREAM_WORKERS", "8"))
+CHAT_STREAM_MAX_PENDENTES = int(os.getenv("CHAT_STREAM_MAX_PENDENTES", "32"))
+# Cache de PDFs endereçado por conteúdo (memória + disco, ambos com LRU)
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", "pdf_cache")
+PDF_CACHE_MEMORIA_MB = float(os.getenv("PDF_CACHE_MEMORIA_MB", "32"))
+PDF_CACHE_DISCO_MB = float(os.getenv("PDF_CACHE_DISCO_MB", "512"))
+# Exportação de PDFs em lote (/pdf/lote e `flask pdf-lote`): processos de renderização (0 = um por núcleo) e máximo de itens
+PDF_LOTE_PROCESSOS = int(os.getenv("PDF_LOTE_PROCESSOS", "0"))
+PDF_LOTE_MAX = int(os.getenv("PDF_LOTE_MAX", "5000"))
+# Projetos com vários balcões (/projeto): máximo de linhas por projeto e validade (s) do link assinado do PDF
+PROJETO_MAX_ITENS = int(os.getenv("PROJETO_MAX_ITENS", "1000"))
+PROJETO_LINK_PDF_TTL = int(os.getenv("PROJETO_LINK_PDF_TTL", "900"))
+# Extração de vários produtos (/extract-products): maior quantidade aceita por item
+EXTRACAO_QUANTIDADE_MAX = int(os.getenv("EXTRACAO_QUANTIDADE_MAX", "999"))
+# Confiança mínima para aplicar uma personalização sem consultar o GLM
+LIMIAR_CONFIANCA_LOCAL = float(os.getenv("LIMIAR_CONFIANCA_LOCAL", "0.75"))
+# Cache das respostas da IA (LLM_CACHE_DB vazio = só memória)
+LLM_CACHE_MAX = int(os.getenv("LLM_CACHE_MAX", "5000"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", "")
+# Precificação em lote (/quotes/batch): máximo de configurações por requisição
+LOTE_MAX_CONFIGURACOES = int(os.getenv("LOTE_MAX_CONFIGURACOES", "100000"))
 GLM_API_KEY = os.getenv("GLM_API_KEY")
+# Gateway do GLM: endpoint (compatível com OpenAI), prazo por chamada, concorrência e disjuntor
+GLM_BASE_URL = os.getenv("GLM_BASE_URL", "https://open.bigmodel.cn/api/paas/v4")
+GLM_MODELO = os.getenv("GLM_MODELO", "glm-4")
+GLM_TIMEOUT = float(os.getenv("GLM_TIMEOUT", "8"))
+GLM_MAX_CONCORRENCIA = int(os.getenv("GLM_MAX_CONCORRENCIA", "16"))
+GLM_FALHAS_PARA_ABRIR = int(os.getenv("GLM_FALHAS_PARA_ABRIR", "5"))
+GLM_TEMPO_CIRCUITO_ABERTO = float(os.getenv("GLM_TEMPO_CIRCUITO_ABERTO", "30"))
+# Motor do catálogo: 'memoria' (objetos em cada worker) ou 'sqlite' (arquivo indexado, compartilhado via mmap)
+CATALOGO_BACKEND = os.getenv("CATALOGO_BACKEND", "memoria")
+CATALOGO_CACHE_BALCOES = int(os.getenv("CATALOGO_CACHE_BALCOES", "256"))
+CATALOGO_MMAP_MB = int(os.getenv("CATALOGO_MMAP_MB", "256"))
+# Ocorrências do índice FTS5 já decodificadas, por catálogo SQLite (total de posições guardadas)
+CATALOGO_CACHE_OCORRENCIAS = int(os.getenv("CATALOGO_CACHE_OCORRENCIAS", "2000000"))
+# Listagem paginada de /balcoes: maior ?limite= aceito e páginas codificadas guardadas por versão do catálogo
+BALCOES_LIMITE_MAX = int(os.getenv("BALCOES_LIMITE_MAX", "500"))
+BALCOES_PAGINAS_CACHE = int(os.getenv("BALCOES_PAGINAS_CACHE", "256"))
+# Faixa de preço e melhores configurações (/balcoes/<id>/configuracoes): maior ?k= e respostas guardadas por versão
+CONFIGURACOES_K_MAX = int(os.getenv("CONFIGURACOES_K_MAX", "50"))
+CONFIGURACOES_CACHE = int(os.getenv("CONFIGURACOES_CACHE", "512"))
+# Instrumentação exposta em /metrics (METRICAS=0 desativa a coleta)
+METRICAS_ATIVAS = os.getenv("METRICAS", "1") != "0"
 
+# --- MÉTRICAS (FORMATO PROMETHEUS) ---
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
 
-# Inicializar cliente Zhipu AI
-try:
-    client = ZhipuAiClient(api_key=GLM_API_KEY)
-    print(" Cliente Zhipu AI inicializado com sucesso!")
-except Exception as e:
-    print(f" Erro ao inicializar cliente Zhipu AI: {e}")
-    client = None
+class Metricas:
+    """Contadores e histogramas em memória, exportados no formato texto do Prometheus.
+
+    Cada observação custa um bisect e um lock curto, o que permite deixar a
+    coleta sempre ligada. Gauges e contadores mantidos por outros objetos
+    entram por coletores, avaliados só na exportação. Os valores são por
+    processo: com vários workers, cada um expõe os seus.
+    """
+
+    def __init__(self, buckets=BUCKETS_LATENCIA, ativo=True):
+        self.buckets = tuple(buckets)
+        self.ativo = ativo
+        self._lock = threading.Lock()
+        self._descricoes = {}  # nome -> (tipo, ajuda)
+        self._contadores = defaultdict(int)  # (nome, rótulos) -> valor
+        self._histogramas = {}  # (nome, rótulos) -> [contagem por bucket..., +Inf, soma]
+        self._coletores = []  # funções -> [(nome, tipo, ajuda, [(rótulos, valor)])]
+
+    def descrever(self, nome, tipo, ajuda):
+        self._descricoes[nome] = (tipo, ajuda)
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        if not self.ativo:
+            return
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._lock:
+            self._contadores[chave] += valor
+
+    def observar(self, nome, segundos, **rotulos):
+        if not self.ativo:
+            return
+        chave = (nome, tuple(sorted(rotulos.items())))
+        posicao = bisect.bisect_left(self.buckets, segundos)
+        with self._lock:
+            histograma = self._histogramas.get(chave)
+            if histograma is None:
+                histograma = self._histogramas[chave] = [0] * (len(self.buckets) + 1) + [0.0]
+            histograma[posicao] += 1
+            histograma[-1] += segundos
+
+    @contextlib.contextmanager
+    def medir(self, nome, **rotulos):
+        """Observa a duração do bloco `with` no histograma `nome`"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nome, time.perf_counter() - inicio, **rotulos)
+
+    def cronometrar(self, nome, **rotulos):
+        """Decorador: observa a duração de cada chamada da função"""
+        def decorador(funcao):
+            @functools.wraps(funcao)
+            def envolvida(*args, **kwargs):
+                inicio = time.perf_counter()
+                try:
+                    return funcao(*args, **kwargs)
+                finally:
+                    self.observar(nome, time.perf_counter() - inicio, **rotulos)
+            return envolvida
+        return decorador
+
+    def registrar_coletor(self, coletor):
+        self._coletores.append(coletor)
+        return coletor
+
+    @staticmethod
+    def _rotulos(pares):
+        if not pares:
+            return ''
+        escapados = (
+            (chave, str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+            for chave, valor in pares
+        )
+        return '{' + ','.join(f'{chave}="{valor}"' for chave, valor in escapados) + '}'
+
+    @staticmethod
+    def _numero(valor):
+        # %g perde dígitos em bytes e contadores grandes
+        return str(valor) if isinstance(valor, int) else repr(float(valor))
+
+    def exportar(self):
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)"""
+        with self._lock:
+            contadores = dict(self._contadores)
+            histogramas = {chave: list(valores) for chave, valores in self._histogramas.items()}
+
+        familias = defaultdict(list)  # nome -> linhas
+        for (nome, rotulos), valor in sorted(contadores.items()):
+            familias[nome].append(f"{nome}{self._rotulos(rotulos)} {self._numero(valor)}")
+        for (nome, rotulos), valores in sorted(histogramas.items()):
+            acumulado = 0
+            for limite, contagem in zip(self.buckets + (float('inf'),), valores):
+                acumulado += contagem
+                le = '+Inf' if limite == float('inf') else f"{limite:g}"
+                familias[nome].append(f"{nome}_bucket{self._rotulos(rotulos + (('le', le),))} {acumulado}")
+            familias[nome].append(f"{nome}_sum{self._rotulos(rotulos)} {valores[-1]:.6f}")
+            familias[nome].append(f"{nome}_count{self._rotulos(rotulos)} {acumulado}")
+        for coletor in self._coletores:
+            try:
+                for nome, tipo, ajuda, amostras in coletor():
+                    self._descricoes.setdefault(nome, (tipo, ajuda))
+                    for rotulos, valor in amostras:
+                        familias[nome].append(f"{nome}{self._rotulos(tuple(sorted(rotulos.items())))} {self._numero(valor)}")
+            except Exception as e:
+                print(f"⚠️ Coletor de métricas falhou: {e}")
+
+        linhas = []
+        for nome, amostras in familias.items():
+            tipo, ajuda = self._descricoes.get(nome, ('untyped', ''))
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+            linhas.extend(amostras)
+        return '\n'.join(linhas) + '\n'
+
+metricas = Metricas(ativo=METRICAS_ATIVAS)
+metricas.descrever('architec_chat_duracao_segundos', 'histogram', 'Duração do processamento de uma mensagem do /chat, por estado da conversa')
+metricas.descrever('architec_etapa_duracao_segundos', 'histogram', 'Duração das etapas internas (busca, LLM, resumo, PDF...)')
+metricas.descrever('architec_sessoes_criadas_total', 'counter', 'Conversas novas criadas')
+metricas.descrever('architec_cache_total', 'counter', 'Consultas aos caches, por cache e resultado')
+metricas.descrever('architec_llm_chamadas_total', 'counter', 'Chamadas ao GLM, por resultado')
+metricas.descrever('architec_llm_falhas_total', 'counter', 'Falhas nas chamadas ao GLM, por motivo')
+metricas.descrever('architec_llm_tokens_total', 'counter', 'Tokens consumidos no GLM, por finalidade e tipo (prompt/resposta)')
+metricas.descrever('architec_http_erros_total', 'counter', 'Respostas 500 por rota')
 
 # --- ESTADOS DA CONVERSA (ATUALIZADOS) ---
 ESTADOS = {
@@ -41,7 +255,12 @@ ESTADOS = {
 }
 
 # --- NOVAS CLASSES DE DADOS ---
+# Os objetos do catálogo usam __slots__: com dezenas de milhares de SKUs por
+# worker, o __dict__ de cada instância pesava mais que os próprios dados
 class Balcao:
+    __slots__ = ('id', 'nome', 'tipo', 'preco_base', 'descricao', 'componentes', '_preco_total', '_interpretador',
+                 '_fragmentos_resumo', '_esquema_personalizacao')
+
     def __init__(self, id, nome, tipo, preco_base, descricao):
         self.id = id
         self.nome = nome
@@ -49,15 +268,46 @@ class Balcao:
         self.preco_base = preco_base
         self.descricao = descricao
         self.componentes = []
+        self._preco_total = None  # cache; o catálogo é somente leitura entre recargas
+        self._interpretador = None
+        self._fragmentos_resumo = None
+        self._esquema_personalizacao = None
+    
+    @property
+    def interpretador(self):
+        """InterpretadorPersonalizacao do balcão, criado no primeiro uso"""
+        if self._interpretador is None:
+            self._interpretador = InterpretadorPersonalizacao(self)
+        return self._interpretador
+    
+    @property
+    def fragmentos_resumo(self):
+        """Trechos já formatados do resumo (ver gerar_resumo_balcao_partes), criados no primeiro uso"""
+        if self._fragmentos_resumo is None:
+            self._fragmentos_resumo = FragmentosResumo(self)
+        return self._fragmentos_resumo
+    
+    @property
+    def esquema_personalizacao(self):
+        """EsquemaPersonalizacao (opções numeradas para o GLM), criado no primeiro uso"""
+        if self._esquema_personalizacao is None:
+            self._esquema_personalizacao = EsquemaPersonalizacao(self)
+        return self._esquema_personalizacao
     
     def adicionar_componente(self, componente):
         self.componentes.append(componente)
+        self._preco_total = None
+        self._fragmentos_resumo = None
+        self._esquema_personalizacao = None
+        self._interpretador = None
     
     def calcular_preco_total(self):
-        total = float(self.preco_base)
-        for comp in self.componentes:
-            total += comp.calcular_subtotal()
-        return total
+        if self._preco_total is None:
+            total = float(self.preco_base)
+            for comp in self.componentes:
+                total += comp.calcular_subtotal()
+            self._preco_total = total
+        return self._preco_total
     
     def to_dict(self):
         return {
@@ -71,6 +321,9 @@ class Balcao:
         }
 
 class Componente:
+    __slots__ = ('nome', 'categoria', 'quantidade', 'marca_padrao', 'cor_padrao', 'fornecedor_padrao',
+                 'preco_unitario', 'alternativas')
+
     def __init__(self, nome, categoria, quantidade, marca_padrao, cor_padrao, fornecedor_padrao, preco_unitario):
         self.nome = nome
         self.categoria = categoria
@@ -79,10 +332,11 @@ class Componente:
         self.cor_padrao = cor_padrao
         self.fornecedor_padrao = fornecedor_padrao
         self.preco_unitario = preco_unitario
-        self.alternativas = []
+        # Tupla imutável, compartilhada entre componentes de mesmo nome
+        self.alternativas = ()
     
     def adicionar_alternativa(self, alternativa):
-        self.alternativas.append(alternativa)
+        self.alternativas = self.alternativas + (alternativa,)
     
     def calcular_subtotal(self):
         return float(self.preco_unitario) * int(self.quantidade)
@@ -101,6 +355,8 @@ class Componente:
         }
 
 class Alternativa:
+    __slots__ = ('marca_alternativa', 'cor_alternativa', 'fornecedor_alternativo', 'preco_diferenca')
+
     def __init__(self, marca_alternativa, cor_alternativa, fornecedor_alternativo, preco_diferenca):
         self.marca_alternativa = marca_alternativa
         self.cor_alternativa = cor_alternativa
@@ -115,68 +371,891 @@ class Alternativa:
             'preco_adicional': float(self.preco_diferenca)
         }
 
+# --- SNAPSHOT COMPILADO DO CATÁLOGO ---
+# Versão do formato do snapshot; incremente ao mudar a estrutura de `dados`
+FORMATO_SNAPSHOT = 3
+
+def caminho_snapshot(arquivo_excel):
+    """Caminho do snapshot compilado correspondente a uma planilha"""
+    return os.path.splitext(arquivo_excel)[0] + '.catalogo.pkl'
+
+def caminho_snapshot_versao(arquivo_excel, sha256):
+    """Snapshot arquivado de uma versão, reaberto por sessões que a fixaram depois que a planilha mudou"""
+    return f"{os.path.splitext(arquivo_excel)[0]}.{sha256[:12]}.catalogo.pkl"
+
+def calcular_hash_arquivo(caminho):
+    """Calcula o SHA-256 do conteúdo de um arquivo"""
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+def _coluna(df, nome, tipo, padrao=None):
+    """Converte uma coluna inteira para uma lista Python do tipo desejado"""
+    if nome not in df.columns:
+        return [padrao] * len(df)
+    if tipo is str:
+        # Marcas, cores, fornecedores etc. se repetem: uma única cópia de cada texto
+        # (o pickle do snapshot preserva esse compartilhamento)
+        return list(map(sys.intern, map(str, df[nome].tolist())))
+    return list(map(tipo, df[nome].tolist()))
+
+def ler_planilhas_excel(arquivo_excel):
+    """Lê as três abas da planilha e devolve as linhas já convertidas em tuplas.
+
+    As personalizações saem agrupadas por nome de componente, para que a
+    junção com os componentes seja uma simples busca em dicionário.
+    """
+    import pandas as pd  # só é necessário quando não há snapshot válido
+
+    planilhas = pd.read_excel(
+        arquivo_excel,
+        sheet_name=['balcoes', 'componentes', 'personalizacoes'],
+        engine='openpyxl'
+    )
+
+    df_balcoes = planilhas['balcoes']
+    balcoes = list(zip(
+        _coluna(df_balcoes, 'id', int),
+        _coluna(df_balcoes, 'nome', str),
+        _coluna(df_balcoes, 'tipo', str),
+        _coluna(df_balcoes, 'preco_base', float),
+        _coluna(df_balcoes, 'descricao', str, '')
+    ))
+
+    df_componentes = planilhas['componentes']
+    componentes = list(zip(
+        _coluna(df_componentes, 'balcao_id', int),
+        _coluna(df_componentes, 'componente', str),
+        _coluna(df_componentes, 'categoria', str),
+        _coluna(df_componentes, 'quantidade', int),
+        _coluna(df_componentes, 'marca_padrao', str),
+        _coluna(df_componentes, 'cor_padrao', str),
+        _coluna(df_componentes, 'fornecedor_padrao', str),
+        _coluna(df_componentes, 'preco_unitario', float)
+    ))
+
+    df_personalizacoes = planilhas['personalizacoes']
+    linhas = list(zip(
+        _coluna(df_personalizacoes, 'marca_alternativa', str),
+        _coluna(df_personalizacoes, 'cor_alternativa', str),
+        _coluna(df_personalizacoes, 'fornecedor_alternativo', str),
+        _coluna(df_personalizacoes, 'preco_diferenca', float)
+    ))
+    nomes = pd.Series(_coluna(df_personalizacoes, 'componente', str), dtype=object)
+    # groupby preserva a ordem das linhas dentro de cada grupo
+    personalizacoes = {
+        nome: tuple(linhas[i] for i in posicoes)
+        for nome, posicoes in nomes.groupby(nomes, sort=False).indices.items()
+    }
+
+    return {
+        'balcoes': balcoes,
+        'componentes': componentes,
+        'personalizacoes': personalizacoes
+    }
+
+def _ler_snapshot(arquivo_snapshot):
+    """Lê o snapshot do disco; devolve None se não existir ou estiver corrompido"""
+    try:
+        with open(arquivo_snapshot, 'rb') as f:
+            snapshot = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️ Snapshot do catálogo inválido ({arquivo_snapshot}): {e}")
+        return None
+
+    if not isinstance(snapshot, dict) or snapshot.get('formato') != FORMATO_SNAPSHOT:
+        return None
+    return snapshot
+
+def _gravar_snapshot(arquivo_snapshot, snapshot):
+    """Grava o snapshot de forma atômica (arquivo temporário + rename)"""
+    temporario = f"{arquivo_snapshot}.{os.getpid()}.tmp"
+    try:
+        with open(temporario, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporario, arquivo_snapshot)
+        return True
+    except OSError as e:
+        print(f"⚠️ Não foi possível gravar o snapshot do catálogo: {e}")
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        return False
+
+def _arquivar_snapshot(arquivo_excel, snapshot):
+    """Guarda o snapshot também sob o nome da versão (link físico: os dados não são copiados)"""
+    arquivado = caminho_snapshot_versao(arquivo_excel, snapshot['sha256'])
+    if os.path.exists(arquivado):
+        return
+    try:
+        os.link(caminho_snapshot(arquivo_excel), arquivado)
+    except FileExistsError:
+        pass
+    except OSError:
+        _gravar_snapshot(arquivado, snapshot)
+
+def compilar_catalogo(arquivo_excel=EXCEL_FILE, forcar=False):
+    """Compila a planilha em um snapshot binário e devolve o snapshot.
+
+    O snapshot é reaproveitado enquanto o mtime/tamanho da planilha não mudar;
+    se mudarem, o hash do conteúdo decide se é preciso reprocessar o Excel.
+    """
+    arquivo_snapshot = caminho_snapshot(arquivo_excel)
+    stat = os.stat(arquivo_excel)
+    snapshot = None if forcar else _ler_snapshot(arquivo_snapshot)
+
+    if snapshot and snapshot['mtime_ns'] == stat.st_mtime_ns and snapshot['tamanho'] == stat.st_size:
+        _arquivar_snapshot(arquivo_excel, snapshot)
+        return snapshot
+
+    sha256 = calcular_hash_arquivo(arquivo_excel)
+    if snapshot and snapshot['sha256'] == sha256:
+        # Conteúdo idêntico (ex.: checkout novo); só atualiza a chave de mtime
+        snapshot['mtime_ns'] = stat.st_mtime_ns
+        snapshot['tamanho'] = stat.st_size
+        _gravar_snapshot(arquivo_snapshot, snapshot)
+        _arquivar_snapshot(arquivo_excel, snapshot)
+        return snapshot
+
+    print(f"⚙️ Compilando catálogo a partir de {arquivo_excel}...")
+    snapshot = {
+        'formato': FORMATO_SNAPSHOT,
+        'mtime_ns': stat.st_mtime_ns,
+        'tamanho': stat.st_size,
+        'sha256': sha256,
+        'dados': ler_planilhas_excel(arquivo_excel)
+    }
+    _gravar_snapshot(arquivo_snapshot, snapshot)
+    _arquivar_snapshot(arquivo_excel, snapshot)
+    return snapshot
+
+# --- ÍNDICE DE BUSCA ---
+# Palavras que não ajudam a distinguir um balcão de outro
+PALAVRAS_IGNORADAS = {
+    'a', 'o', 'as', 'os', 'um', 'uma', 'de', 'do', 'da', 'dos', 'das', 'e',
+    'com', 'para', 'pra', 'quero', 'gostaria', 'preciso', 'me', 'mostre', 'ver'
+}
+# Palavras do nome que indicam só a categoria, não um modelo ("quero um balcão")
+PALAVRAS_GENERICAS_NOME = {'balcao', 'balcoes', 'inferior', 'superior', 'armario', 'aereo', 'modulo'}
+
+def normalizar_texto(texto):
+    """Converte para minúsculas e remove acentos ("Balcão" -> "balcao")"""
+    decomposto = unicodedata.normalize('NFKD', str(texto))
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+def tokenizar(texto):
+    """Quebra um texto normalizado em palavras, ignorando as irrelevantes"""
+    return [t for t in re.findall(r'[a-z0-9]+', normalizar_texto(texto)) if t not in PALAVRAS_IGNORADAS]
+
+def trigramas(token):
+    """Trigramas de um token, com bordas, para casamento aproximado"""
+    marcado = f" {token} "
+    return {marcado[i:i + 3] for i in range(len(marcado) - 2)}
+
+class IndiceBusca:
+    """Índice invertido (palavras e trigramas) sobre nome e descrição dos balcões.
+
+    As listas de ocorrências são arrays NumPy, então a pontuação de uma
+    consulta custa algumas somas vetorizadas mesmo com dezenas de milhares
+    de balcões.
+    """
+    PESO_NOME = 2.0
+    PESO_DESCRICAO = 1.0
+    SIMILARIDADE_MINIMA = 0.45
+    BONUS_NOME_CONTIDO = 10.0
+
+    def __init__(self, balcoes):
+        self.lista = list(balcoes)
+        self.nomes_normalizados = [normalizar_texto(b.nome) for b in self.lista]
+        self.por_tipo = defaultdict(list)
+        ocorrencias = defaultdict(dict)  # token -> {posicao: peso}
+
+        for posicao, balcao in enumerate(self.lista):
+            self.por_tipo[balcao.tipo.lower()].append(balcao)
+            for campo, peso in ((balcao.nome, self.PESO_NOME), (balcao.descricao, self.PESO_DESCRICAO)):
+                for token in tokenizar(campo):
+                    pesos = ocorrencias[token]
+                    pesos[posicao] = max(pesos.get(posicao, 0.0), peso)
+
+        total = max(len(self.lista), 1)
+        self.postings = {}  # token -> (posicoes, pesos já multiplicados pelo idf)
+        for token, pesos in ocorrencias.items():
+            idf = math.log(1 + total / len(pesos))
+            self.postings[token] = (
+                np.fromiter(pesos.keys(), dtype=np.int64, count=len(pesos)),
+                np.fromiter(pesos.values(), dtype=np.float64, count=len(pesos)) * idf
+            )
+
+        self.trigramas = defaultdict(list)  # trigrama -> tokens do vocabulário
+        self.n_trigramas = {}
+        for token in self.postings:
+            tris = trigramas(token)
+            self.n_trigramas[token] = len(tris)
+            for tri in tris:
+                self.trigramas[tri].append(token)
+
+        codigos = np.array([b.tipo.lower() for b in self.lista], dtype=object)
+        self.mascara_tipo = {tipo: codigos == tipo for tipo in self.por_tipo}
+
+    def _expandir(self, token):
+        """Devolve [(token_do_vocabulario, similaridade)] para um token da consulta"""
+        if token in self.postings:
+            return [(token, 1.0)]
+        if len(token) < 3 or token.isdigit():
+            return []
+
+        tri_consulta = trigramas(token)
+        comuns = defaultdict(int)
+        for tri in tri_consulta:
+            for candidato in self.trigramas.get(tri, ()):
+                comuns[candidato] += 1
+
+        similares = []
+        for candidato, n in comuns.items():
+            similaridade = n / (len(tri_consulta) + self.n_trigramas[candidato] - n)
+            if similaridade >= self.SIMILARIDADE_MINIMA:
+                similares.append((candidato, similaridade))
+        similares.sort(key=lambda item: -item[1])
+        return similares[:3]
+
+    @metricas.cronometrar('architec_etapa_duracao_segundos', etapa='busca_catalogo')
+    def buscar(self, consulta, tipo=None, limite=None):
+        """Busca ranqueada; devolve [(balcao, pontuacao)] da mais relevante para a menos"""
+        if not self.lista:
+            return []
+        pontuacao = np.zeros(len(self.lista))
+        for token in tokenizar(consulta):
+            for termo, similaridade in self._expandir(token):
+                posicoes, pesos = self.postings[termo]
+                pontuacao[posicoes] += pesos * similaridade
+
+        if tipo:
+            mascara = self.mascara_tipo.get(tipo.lower())
+            if mascara is None:
+                return []
+            pontuacao[~mascara] = 0.0
+
+        candidatos = np.flatnonzero(pontuacao > 0)  # já em ordem de posição
+        if not candidatos.size:
+            return []
+
+        # Pré-seleção dos melhores (com folga para o bônus de nome contido);
+        # empates ficam com as primeiras posições, como na busca linear antiga
+        k = min(candidatos.size, (limite or candidatos.size) + 20)
+        if k < candidatos.size:
+            corte = np.partition(pontuacao[candidatos], -k)[-k]
+            acima = candidatos[pontuacao[candidatos] > corte]
+            iguais = candidatos[pontuacao[candidatos] == corte][:k - acima.size]
+            candidatos = np.concatenate((acima, iguais))
+
+        consulta_normalizada = normalizar_texto(consulta).strip()
+        resultado = []
+        for posicao in candidatos.tolist():
+            pontos = float(pontuacao[posicao])
+            # Bônus para o comportamento antigo: consulta contida no nome
+            if consulta_normalizada and consulta_normalizada in self.nomes_normalizados[posicao]:
+                pontos += self.BONUS_NOME_CONTIDO
+            resultado.append((pontos, posicao))
+
+        resultado.sort(key=lambda item: (-item[0], item[1]))
+        if limite:
+            resultado = resultado[:limite]
+        return [(self.lista[posicao], pontos) for pontos, posicao in resultado]
+
+# --- INTERPRETAÇÃO LOCAL DE PERSONALIZAÇÕES ---
+# Formas alternativas (já normalizadas) -> forma usada no catálogo
+SINONIMOS = {
+    'porta': 'frente', 'portas': 'frente', 'frentes': 'frente',
+    'dobradicas': 'dobradica', 'puxadores': 'puxador', 'pegador': 'puxador', 'pegadores': 'puxador',
+    'prateleiras': 'prateleira', 'divisorias': 'divisoria', 'divisor': 'divisoria',
+    'ripas': 'ripa', 'protetores': 'protetor', 'corredicas': 'corredica', 'trilho': 'corredica',
+    'gavetas': 'gaveta', 'rodizios': 'rodizio', 'rodinha': 'rodizio', 'rodinhas': 'rodizio',
+    'preta': 'preto', 'pretos': 'preto', 'pretas': 'preto', 'branca': 'branco', 'brancos': 'branco',
+    'brancas': 'branco', 'cinzas': 'cinza', 'dourada': 'dourado', 'dourados': 'dourado',
+    'fosco': 'matte', 'fosca': 'matte', 'mate': 'matte'
+}
+# Cores e marcas comuns, mesmo fora do catálogo: mencioná-las e não casar é sinal de conflito
+TERMOS_CONHECIDOS = {
+    'preto', 'branco', 'cinza', 'dourado', 'madeira', 'inox', 'aluminio', 'grafite', 'bronze',
+    'nogueira', 'carvalho', 'hafele', 'blum', 'grass', 'fgv', 'zen', 'hettich', 'tramontina'
+}
+
+def termos(texto):
+    """Tokens normalizados, com sinônimos resolvidos"""
+    return [SINONIMOS.get(t, t) for t in re.findall(r'[a-z0-9]+', normalizar_texto(texto))]
+
+class Interpretacao:
+    """Resultado da interpretação local: componente, alternativa e confiança (0 a 1)"""
+    def __init__(self, componente, alternativa, confianca):
+        self.componente = componente
+        self.alternativa = alternativa
+        self.confianca = confianca
+
+@functools.lru_cache(maxsize=4096)
+def termos_componente(nome, alternativas):
+    """Termos do nome e de cada alternativa de um componente.
+
+    Compartilhados entre todos os balcões que têm o componente (a tupla de
+    alternativas já é única por nome), em vez de recalculados por balcão. As
+    chaves prendem as alternativas de uma versão do catálogo, então o cache é
+    esvaziado quando uma versão é descartada (ver SistemaBalcoes.__init__).
+    """
+    return frozenset(termos(nome)), tuple(
+        (alt, frozenset(termos(alt.marca_alternativa)) | frozenset(termos(alt.cor_alternativa)))
+        for alt in alternativas
+    )
+
+class InterpretadorPersonalizacao:
+    """Casa pedidos como "trocar dobradiça para fgv curva" com (Componente, Alternativa).
+
+    O vocabulário (nomes de componentes, marcas e cores das alternativas) é
+    compilado uma vez por balcão; palavras fora dele são aproximadas com
+    difflib para tolerar erros de digitação.
+    """
+    SIMILARIDADE_MINIMA = 0.8
+
+    def __init__(self, balcao, termos_conhecidos=TERMOS_CONHECIDOS):
+        self.componentes = []  # (componente, termos do nome, [(alternativa, termos)])
+        vistos = set()
+        for comp in balcao.componentes:
+            if comp.nome in vistos:
+                continue  # personalizações valem por nome de componente
+            vistos.add(comp.nome)
+            termos_nome, alternativas = termos_componente(comp.nome, comp.alternativas)
+            self.componentes.append((comp, termos_nome, alternativas))
+
+        self.vocabulario = set()
+        for _, termos_nome, alternativas in self.componentes:
+            self.vocabulario |= termos_nome
+            for _, termos_alt in alternativas:
+                self.vocabulario |= termos_alt
+        self.termos_conhecidos = set(termos_conhecidos) | {
+            t for _, _, alternativas in self.componentes for _, termos_alt in alternativas for t in termos_alt
+        }
+        self._vocabulario_lista = sorted(self.vocabulario | self.termos_conhecidos)
+
+    def _termos_mensagem(self, mensagem):
+        """{termo_do_vocabulario: similaridade} para as palavras da mensagem"""
+        encontrados = {}
+        for termo in termos(mensagem):
+            if termo in self.vocabulario or termo in self.termos_conhecidos:
+                encontrados[termo] = 1.0
+            elif len(termo) >= 4 and not termo.isdigit():
+                proximos = difflib.get_close_matches(termo, self._vocabulario_lista, n=1, cutoff=self.SIMILARIDADE_MINIMA)
+                if proximos:
+                    similaridade = difflib.SequenceMatcher(None, termo, proximos[0]).ratio()
+                    encontrados[proximos[0]] = max(encontrados.get(proximos[0], 0.0), similaridade)
+        return encontrados
+
+    def interpretar(self, mensagem):
+        """Devolve a Interpretacao mais provável ou None se nada casar"""
+        if not self.componentes:
+            return None
+        encontrados = self._termos_mensagem(mensagem)
+        if not encontrados:
+            return None
+
+        def pontuar(conjunto):
+            return sum(encontrados.get(t, 0.0) for t in conjunto)
+
+        # Componente: fração das palavras do nome presentes na mensagem
+        pontos_componentes = [
+            (pontuar(termos_nome) / len(termos_nome) if termos_nome else 0.0, indice)
+            for indice, (_, termos_nome, _) in enumerate(self.componentes)
+        ]
+        pontos_componentes.sort(reverse=True)
+        melhor_pontos, melhor_indice = pontos_componentes[0]
+        empate = len(pontos_componentes) > 1 and pontos_componentes[1][0] == melhor_pontos
+
+        if melhor_pontos > 0 and not empate:
+            candidatos = [self.componentes[melhor_indice]]
+            confianca_componente = melhor_pontos
+        else:
+            # Nenhum componente citado: deixa as alternativas decidirem (com confiança menor)
+            candidatos = self.componentes
+            confianca_componente = 0.8
+
+        pontos_alternativas = sorted(
+            (
+                (pontuar(termos_alt), -ordem, comp, alt, termos_alt, termos_nome)
+                for comp, termos_nome, alternativas in candidatos
+                for ordem, (alt, termos_alt) in enumerate(alternativas)
+            ),
+            key=lambda item: (item[0], item[1]),
+            reverse=True
+        )
+        if not pontos_alternativas or pontos_alternativas[0][0] <= 0:
+            return None
+        pontos, _, comp, alt, termos_alt, termos_nome = pontos_alternativas[0]
+        if len(pontos_alternativas) > 1 and pontos_alternativas[1][0] == pontos:
+            return None  # ambíguo (ex.: "fgv" sem dizer qual modelo)
+
+        casados = [t for t in termos_alt if t in encontrados]
+        confianca = confianca_componente * (sum(encontrados[t] for t in casados) / len(casados))
+        # Cor/marca citada que não pertence à alternativa escolhida: provável pedido diferente
+        conflitos = [
+            t for t in encontrados
+            if t in self.termos_conhecidos and t not in termos_alt and t not in termos_nome
+        ]
+        if conflitos:
+            confianca *= 0.3
+        return Interpretacao(comp, alt, confianca)
+
+class ContadoresInterpretacao:
+    """Quantas personalizações foram resolvidas localmente vs. enviadas ao GLM"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.valores = {'local': 0, 'llm': 0, 'sem_ia': 0}
+
+    def registrar(self, origem):
+        with self._lock:
+            self.valores[origem] += 1
+
+    def resumo(self):
+        with self._lock:
+            valores = dict(self.valores)
+        total = sum(valores.values())
+        valores['taxa_local'] = round(valores['local'] / total, 4) if total else None
+        return valores
+
+contadores_interpretacao = ContadoresInterpretacao()
+
+# --- PRECIFICAÇÃO EM LOTE ---
+@functools.lru_cache(maxsize=65536)
+def chave_nome(texto):
+    """Forma canônica de um nome vindo de fora (sem acentos, caixa ou espaços extras)"""
+    return ' '.join(normalizar_texto(texto).split())
+
+def personalizacoes_configuracao(configuracao):
+    """[(componente, marca, cor)] de uma configuração de /quotes/batch; ValueError se alguma for inválida"""
+    itens = []
+    for personalizacao in configuracao.get('personalizacoes') or []:
+        if isinstance(personalizacao, dict):
+            componente = personalizacao.get('componente')
+            marca = personalizacao.get('marca', personalizacao.get('marca_alternativa'))
+            cor = personalizacao.get('cor', personalizacao.get('cor_alternativa'))
+        elif isinstance(personalizacao, (list, tuple)) and len(personalizacao) == 3:
+            componente, marca, cor = personalizacao
+        else:
+            raise ValueError("Personalização inválida: informe componente, marca e cor")
+        itens.append((componente, marca, cor))
+    return itens
+
+class TabelaPrecos:
+    """Catálogo compilado em arrays NumPy para precificar muitas configurações de uma vez.
+
+    Cada linha é um balcão e cada coluna um de seus componentes (zeros
+    completam as linhas mais curtas). As somas são feitas coluna a coluna,
+    na mesma ordem do cálculo escalar, para que os totais sejam idênticos
+    aos de `ConversaBalcao.calcular_orcamento_final`.
+    """
+
+    def __init__(self, balcoes):
+        balcoes = list(balcoes)
+        largura = max((len(b.componentes) for b in balcoes), default=0)
+        self.ids = [b.id for b in balcoes]
+        self.linha_por_id = {b.id: i for i, b in enumerate(balcoes)}
+        self.linha_por_nome = {}
+        self.preco_base = np.array([float(b.preco_base) for b in balcoes], dtype=np.float64)
+        self.quantidades = np.zeros((len(balcoes), largura), dtype=np.int64)
+        self.precos_unitarios = np.zeros((len(balcoes), largura), dtype=np.float64)
+
+        # Alternativas achatadas: (linha, componente, marca, cor) -> posição nos arrays
+        self.alternativas = {}
+        self.componente_alternativa = []  # nome do componente no catálogo
+        linhas, colunas, quantidades, precos = [], [], [], []
+        linhas_alt, colunas_alt, diferencas = [], [], []
+        for i, balcao in enumerate(balcoes):
+            self.linha_por_nome.setdefault(chave_nome(balcao.nome), i)
+            for j, comp in enumerate(balcao.componentes):
+                linhas.append(i)
+                colunas.append(j)
+                quantidades.append(int(comp.quantidade))
+                precos.append(float(comp.preco_unitario))
+                for alt in comp.alternativas:
+                    chave = (i, chave_nome(comp.nome), chave_nome(alt.marca_alternativa), chave_nome(alt.cor_alternativa))
+                    # Como em aplicar_personalizacao, vale o primeiro componente que tem a alternativa
+                    if chave not in self.alternativas:
+                        self.alternativas[chave] = len(diferencas)
+                        self.componente_alternativa.append(comp.nome)
+                        linhas_alt.append(i)
+                        colunas_alt.append(j)
+                        diferencas.append(alt.preco_diferenca)
+        self.quantidades[linhas, colunas] = quantidades
+        self.precos_unitarios[linhas, colunas] = precos
+
+        self.totais_padrao = self.preco_base.copy()
+        for j in range(largura):
+            self.totais_padrao += self.precos_unitarios[:, j] * self.quantidades[:, j]
+        self.diferencas = np.array(diferencas, dtype=np.float64)
+        adicionais = self.diferencas * self.quantidades[linhas_alt, colunas_alt]
+        # Posição -1 = "sem personalização"/"configuração inválida"
+        self._adicionais = np.append(adicionais, 0.0)
+        self._totais = np.append(self.totais_padrao, np.nan)
+
+    def precificar_indices(self, linhas, alternativas):
+        """Núcleo vetorizado: `linhas` (N,) indica o balcão de cada configuração e
+        `alternativas` (N, P) as alternativas aplicadas, em ordem (-1 = nenhuma)"""
+        totais = self._totais[linhas]
+        for p in range(alternativas.shape[1]):
+            totais = totais + self._adicionais[alternativas[:, p]]
+        return totais
+
+    def resolver(self, configuracao):
+        """Converte uma configuração em (linha do balcão, [alternativas]); ValueError se inválida"""
+        referencia = configuracao.get('balcao')
+        if referencia is None:
+            referencia = configuracao.get('balcao_id')
+        linha = self.linha_por_id.get(referencia)
+        if linha is None and isinstance(referencia, str):
+            texto = referencia.strip()
+            linha = self.linha_por_id.get(int(texto)) if texto.isdigit() else None
+            if linha is None:
+                linha = self.linha_por_nome.get(chave_nome(texto))
+        if linha is None:
+            raise ValueError(f"Balcão '{referencia}' não encontrado")
+
+        # Uma personalização por componente; a última vence e vai para o fim (como na conversa)
+        escolhidas = {}
+        for componente, marca, cor in personalizacoes_configuracao(configuracao):
+            indice = self.alternativas.get((linha, chave_nome(componente), chave_nome(marca), chave_nome(cor)))
+            if indice is None:
+                raise ValueError(f"Alternativa '{marca} ({cor})' não encontrada para o componente '{componente}'")
+            nome = self.componente_alternativa[indice]
+            escolhidas.pop(nome, None)
+            escolhidas[nome] = indice
+        return linha, list(escolhidas.values())
+
+    def precificar(self, configuracoes):
+        """Precifica uma lista de configurações; devolve um dict por configuração, na mesma ordem"""
+        linhas, escolhas, erros = [], [], {}
+        for n, configuracao in enumerate(configuracoes):
+            try:
+                linha, indices = self.resolver(configuracao)
+            except (ValueError, TypeError, AttributeError) as e:
+                erros[n] = str(e) if isinstance(e, ValueError) else "Configuração inválida"
+                linha, indices = -1, []
+            linhas.append(linha)
+            escolhas.append(indices)
+
+        tamanhos = np.fromiter(map(len, escolhas), dtype=np.int64, count=len(escolhas))
+        alternativas = np.full((len(escolhas), int(tamanhos.max(initial=0))), -1, dtype=np.int64)
+        alternativas[np.arange(alternativas.shape[1]) < tamanhos[:, None]] = [i for indices in escolhas for i in indices]
+        totais = self.precificar_indices(np.array(linhas, dtype=np.int64), alternativas).tolist()
+
+        resultados = []
+        for n, configuracao in enumerate(configuracoes):
+            resultado = {'referencia': configuracao.get('referencia') if isinstance(configuracao, dict) else None}
+            if n in erros:
+                resultado['erro'] = erros[n]
+            else:
+                resultado['balcao_id'] = self.ids[linhas[n]]
+                resultado['total'] = totais[n]
+            resultados.append(resultado)
+        return resultados
+
+def ler_configuracoes_csv(texto):
+    """Lê configurações de um CSV (referencia, balcao, componente, marca, cor).
+
+    Linhas com a mesma `referencia` formam uma configuração (uma linha por
+    personalização); sem essa coluna, cada linha é uma configuração.
+    """
+    configuracoes = {}
+    for numero, linha in enumerate(csv.DictReader(io.StringIO(texto))):
+        linha = {(k or '').strip().lower(): (v or '').strip() for k, v in linha.items()}
+        referencia = linha.get('referencia') or str(numero + 1)
+        configuracao = configuracoes.setdefault(
+            referencia, {'referencia': referencia, 'balcao': linha.get('balcao'), 'personalizacoes': []}
+        )
+        if linha.get('componente'):
+            configuracao['personalizacoes'].append(
+                (linha['componente'], linha.get('marca', ''), linha.get('cor', ''))
+            )
+    return list(configuracoes.values())
+
+def precificar_lote(configuracoes, catalogo=None):
+    """API Python da precificação em lote (mesmo formato do /quotes/batch)"""
+    return (catalogo or sistema_balcoes).tabela_precos(configuracoes).precificar(configuracoes)
+
+# --- FAIXA DE PREÇO E MELHORES CONFIGURAÇÕES ---
+def atende(texto, restricao):
+    """Todas as palavras da restrição (marca ou cor) aparecem no texto, com sinônimos"""
+    return not restricao or set(termos(restricao)) <= set(termos(texto))
+
+class OpcoesConfiguracao:
+    """Escolhas independentes de um balcão: para cada componente personalizável,
+    o padrão (sem custo adicional) ou uma de suas alternativas.
+
+    O total de uma configuração é o preço do balcão mais a soma dos
+    adicionais escolhidos, então a faixa sai da melhor opção de cada
+    componente e as k melhores configurações saem de um heap sobre as
+    opções ordenadas, sem enumerar o produto das combinações.
+    """
+    def __init__(self, balcao, marca=None, cor=None):
+        self.base = balcao.calcular_preco_total()
+        self.grupos = []  # (componente, [(adicional, alternativa ou None)])
+        self.sem_restricao = []  # componentes sem nenhuma opção na marca/cor pedida
+        vistos = set()
+        for comp in balcao.componentes:
+            if not comp.alternativas or comp.nome in vistos:
+                continue  # personalizações valem por nome de componente (como em aplicar_personalizacao)
+            vistos.add(comp.nome)
+            opcoes, chaves = [(0.0, None)], set()
+            for alt in comp.alternativas:
+                chave = (chave_nome(alt.marca_alternativa), chave_nome(alt.cor_alternativa))
+                if chave not in chaves:
+                    chaves.add(chave)
+                    opcoes.append((alt.preco_diferenca * comp.quantidade, alt))
+            if marca or cor:
+                restritas = [
+                    (adicional, alt) for adicional, alt in opcoes
+                    if atende(alt.marca_alternativa if alt else comp.marca_padrao, marca)
+                    and atende(alt.cor_alternativa if alt else comp.cor_padrao, cor)
+                ]
+                if restritas:
+                    opcoes = restritas
+                else:
+                    self.sem_restricao.append(comp.nome)
+            self.grupos.append((comp, opcoes))
+
+    def melhores(self, k, mais_caras=False):
+        """As k configurações mais baratas (ou mais caras), da melhor para a pior.
+
+        Cada estado do heap guarda a posição escolhida em cada componente;
+        um estado só avança componentes a partir do último que ele avançou,
+        o que gera cada combinação uma única vez. São no máximo k retiradas,
+        cada uma com até um sucessor por componente.
+        """
+        sinal = -1 if mais_caras else 1
+        listas = [sorted(opcoes, key=lambda opcao: sinal * opcao[0]) for _, opcoes in self.grupos]
+        inicial = tuple(0 for _ in listas)
+        heap = [(sum(sinal * lista[0][0] for lista in listas), inicial, 0)]
+        escolhidas = []
+        while heap and len(escolhidas) < k:
+            custo, posicoes, ultimo = heapq.heappop(heap)
+            escolhidas.append(posicoes)
+            for g in range(ultimo, len(listas)):
+                proxima = posicoes[g] + 1
+                if proxima < len(listas[g]):
+                    passo = sinal * (listas[g][proxima][0] - listas[g][posicoes[g]][0])
+                    heapq.heappush(heap, (custo + passo, posicoes[:g] + (proxima,) + posicoes[g + 1:], g))
+        return [self._configuracao(listas, posicoes) for posicoes in escolhidas]
+
+    def _configuracao(self, listas, posicoes):
+        # Somado na ordem dos componentes, como calcular_orcamento_final faz com as personalizações
+        total = self.base
+        personalizacoes = []
+        for (comp, _), lista, posicao in zip(self.grupos, listas, posicoes):
+            adicional, alt = lista[posicao]
+            if alt is None:
+                continue
+            total += adicional
+            personalizacoes.append({
+                'componente': comp.nome,
+                'marca': alt.marca_alternativa,
+                'cor': alt.cor_alternativa,
+                'fornecedor': alt.fornecedor_alternativo,
+                'preco_adicional': float(adicional)
+            })
+        return {'total': float(total), 'personalizacoes': personalizacoes}
+
+    def faixa(self):
+        """(menor total, maior total) entre todas as configurações"""
+        return self.melhores(1)[0]['total'], self.melhores(1, mais_caras=True)[0]['total']
+
+# --- RESPOSTAS JSON COMPRIMIDAS ---
+# Campos de cada balcão na listagem de /balcoes (?campos= escolhe um subconjunto)
+CAMPOS_BALCAO = ('id', 'nome', 'tipo', 'preco_base', 'descricao', 'preco_total', 'componentes')
+# Abaixo disso a compressão não compensa o custo
+COMPRESSAO_MIN_BYTES = 1024
+CODIFICACOES_SUPORTADAS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+def codificar_json(dados):
+    """JSON compacto, com chaves ordenadas, em bytes (orjson quando instalado)"""
+    if orjson is not None:
+        return orjson.dumps(dados, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(dados, separators=(',', ':'), sort_keys=True, ensure_ascii=False).encode('utf-8')
+
+CURSOR_EXPIRADO = "cursor inválido ou de uma versão anterior do catálogo; recomece a listagem"
+
+def codificar_cursor(balcao_id):
+    return base64.urlsafe_b64encode(json.dumps(balcao_id).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decodificar_cursor(cursor):
+    """Id do último balcão da página anterior; ValueError se o cursor for inválido"""
+    try:
+        balcao_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except Exception:
+        balcao_id = None
+    if not isinstance(balcao_id, int):
+        raise ValueError("cursor inválido")
+    return balcao_id
+
+class CorpoResposta:
+    """Corpo já codificado de uma resposta, seu ETag e as versões comprimidas (criadas sob demanda)"""
+    __slots__ = ('corpo', 'etag', '_comprimidos')
+
+    def __init__(self, corpo):
+        self.corpo = corpo
+        self.etag = hashlib.sha1(corpo).hexdigest()[:20]
+        self._comprimidos = {}
+
+    def codificado(self, codificacao):
+        """(bytes, codificação efetivamente usada ou None)"""
+        if codificacao is None or len(self.corpo) < COMPRESSAO_MIN_BYTES:
+            return self.corpo, None
+        comprimido = self._comprimidos.get(codificacao)
+        if comprimido is None:
+            if codificacao == 'br':
+                comprimido = brotli.compress(self.corpo, quality=5)
+            else:
+                comprimido = gzip.compress(self.corpo, compresslevel=6, mtime=0)
+            self._comprimidos[codificacao] = comprimido
+        return comprimido, codificacao
+
+def resposta_comprimida(corpo_resposta, mimetype='application/json'):
+    """Resposta com ETag, comprimida conforme o Accept-Encoding do cliente (304 se o ETag bater)"""
+    dados, codificacao = corpo_resposta.codificado(request.accept_encodings.best_match(CODIFICACOES_SUPORTADAS))
+    resposta = current_app.response_class(dados, mimetype=mimetype)
+    if codificacao:
+        resposta.headers['Content-Encoding'] = codificacao
+        resposta.set_etag(f"{corpo_resposta.etag}-{codificacao}")
+    else:
+        resposta.set_etag(corpo_resposta.etag)
+    resposta.vary.add('Accept-Encoding')
+    resposta.headers['Cache-Control'] = 'public, no-cache'
+    return resposta.make_conditional(request)
+
+def linha_listagem(balcao):
+    """Todos os campos de CAMPOS_BALCAO de um balcão"""
+    return {
+        'id': int(balcao.id),
+        'nome': balcao.nome,
+        'tipo': balcao.tipo,
+        'preco_base': float(balcao.preco_base),
+        'descricao': balcao.descricao,
+        'preco_total': float(balcao.calcular_preco_total()),
+        'componentes': len(balcao.componentes)
+    }
+
 # --- SISTEMA DE CARREGAMENTO DE DADOS ---
+def montar_balcoes(dados):
+    """Cria os objetos do catálogo a partir das linhas da planilha; devolve {id: Balcao}"""
+    balcoes = {}
+    for id, nome, tipo, preco_base, descricao in dados['balcoes']:
+        balcao = Balcao(
+            id=id,
+            nome=nome,
+            tipo=tipo,
+            preco_base=preco_base,
+            descricao=descricao
+        )
+        balcoes[balcao.id] = balcao
+    
+    # Alternativas: uma única tupla por nome de componente, compartilhada
+    alternativas_por_componente = {
+        componente_nome: tuple(
+            Alternativa(
+                marca_alternativa=marca,
+                cor_alternativa=cor,
+                fornecedor_alternativo=fornecedor,
+                preco_diferenca=preco_diferenca
+            )
+            for marca, cor, fornecedor, preco_diferenca in linhas
+        )
+        for componente_nome, linhas in dados['personalizacoes'].items()
+    }
+    
+    # Componentes (já ligados às suas alternativas)
+    for balcao_id, nome, categoria, quantidade, marca, cor, fornecedor, preco in dados['componentes']:
+        if balcao_id in balcoes:
+            componente = Componente(
+                nome=nome,
+                categoria=categoria,
+                quantidade=quantidade,
+                marca_padrao=marca,
+                cor_padrao=cor,
+                fornecedor_padrao=fornecedor,
+                preco_unitario=preco
+            )
+            componente.alternativas = alternativas_por_componente.get(nome, ())
+            balcoes[balcao_id].adicionar_componente(componente)
+    
+    # Totais calculados uma única vez por versão do catálogo (interpretadores, no primeiro uso)
+    for balcao in balcoes.values():
+        balcao.calcular_preco_total()
+    return balcoes
+
+def memoria_balcoes(balcoes, vistos):
+    """Bytes aproximados dos objetos de `balcoes` (textos e tuplas compartilhados contam uma vez)"""
+    def tamanho(*objetos):
+        total = 0
+        for obj in objetos:
+            if id(obj) not in vistos:  # textos internados e tuplas compartilhadas contam uma vez
+                vistos.add(id(obj))
+                total += sys.getsizeof(obj)
+        return total
+    
+    total = 0
+    for balcao in balcoes:
+        total += tamanho(balcao, balcao.componentes, balcao.nome, balcao.tipo, balcao.descricao, balcao.preco_base)
+        for comp in balcao.componentes:
+            total += tamanho(comp, comp.nome, comp.categoria, comp.marca_padrao, comp.cor_padrao,
+                             comp.fornecedor_padrao, comp.preco_unitario, comp.alternativas)
+            for alt in comp.alternativas:
+                total += tamanho(alt, alt.marca_alternativa, alt.cor_alternativa,
+                                 alt.fornecedor_alternativo, alt.preco_diferenca)
+    return total
+
 class SistemaBalcoes:
-    def __init__(self):
+    def __init__(self, arquivo_excel=EXCEL_FILE, usar_snapshot=USAR_SNAPSHOT_CATALOGO, versao=None):
+        self.arquivo_excel = arquivo_excel
+        self.usar_snapshot = usar_snapshot
+        self.versao_arquivada = versao  # abre o snapshot arquivado dessa versão em vez da planilha
+        self.versao = None  # prefixo do SHA-256 da planilha carregada
+        self.carregado_em = None
         self.balcoes = {}
+        self.indice = IndiceBusca([])
+        self._listagens = {}  # tipo -> (balcões, {id: posição}) da listagem de /balcoes
+        self._paginas_balcoes = OrderedDict()  # (tipo, campos, limite, cursor) -> CorpoResposta (LRU)
+        self._paginas_lock = threading.Lock()
+        self._configuracoes = OrderedDict()  # (id, ordem, k, marca, cor) -> CorpoResposta (LRU)
+        self._configuracoes_lock = threading.Lock()
+        self._tabela_precos = None  # TabelaPrecos desta versão, criada no primeiro uso
+        self._memoria_estimada = None
+        # Versão descartada: solta as alternativas dela presas no cache de termos_componente
+        weakref.finalize(self, termos_componente.cache_clear)
         self.carregar_dados()
     
+    @metricas.cronometrar('architec_etapa_duracao_segundos', etapa='carregar_catalogo')
     def carregar_dados(self):
         """Carrega todas as planilhas e cria a estrutura de objetos"""
         try:
-            # Carregar planilha de balcões
-            df_balcoes = pd.read_excel(EXCEL_FILE, sheet_name='balcoes', engine='openpyxl')
-            
-            for _, row in df_balcoes.iterrows():
-                balcao = Balcao(
-                    id=int(row['id']),
-                    nome=str(row['nome']),
-                    tipo=str(row['tipo']),
-                    preco_base=float(row['preco_base']),
-                    descricao=str(row.get('descricao', ''))
-                )
-                self.balcoes[balcao.id] = balcao
+            if self.versao_arquivada:
+                snapshot = _ler_snapshot(caminho_snapshot_versao(self.arquivo_excel, self.versao_arquivada))
+                if snapshot is None:
+                    raise FileNotFoundError(f"snapshot da versão {self.versao_arquivada} não encontrado")
+                dados, sha256 = snapshot['dados'], snapshot['sha256']
+            elif self.usar_snapshot:
+                snapshot = compilar_catalogo(self.arquivo_excel)
+                dados, sha256 = snapshot['dados'], snapshot['sha256']
+            else:
+                sha256 = calcular_hash_arquivo(self.arquivo_excel)
+                dados = ler_planilhas_excel(self.arquivo_excel)
             
+            self.balcoes = montar_balcoes(dados)
             print(f"✓ Carregados {len(self.balcoes)} balcões")
-            
-            # Carregar planilha de componentes
-            df_componentes = pd.read_excel(EXCEL_FILE, sheet_name='componentes', engine='openpyxl')
-            
-            for _, row in df_componentes.iterrows():
-                balcao_id = int(row['balcao_id'])
-                if balcao_id in self.balcoes:
-                    componente = Componente(
-                        nome=str(row['componente']),
-                        categoria=str(row['categoria']),
-                        quantidade=int(row['quantidade']),
-                        marca_padrao=str(row['marca_padrao']),
-                        cor_padrao=str(row['cor_padrao']),
-                        fornecedor_padrao=str(row['fornecedor_padrao']),
-                        preco_unitario=float(row['preco_unitario'])
-                    )
-                    self.balcoes[balcao_id].adicionar_componente(componente)
-            
             print(f"✓ Carregados componentes para todos os balcões")
+            print(f"✓ Carregadas opções de personalização")
             
-            # Carregar planilha de personalizações
-            df_personalizacoes = pd.read_excel(EXCEL_FILE, sheet_name='personalizacoes', engine='openpyxl')
-            
-            for _, row in df_personalizacoes.iterrows():
-                componente_nome = str(row['componente'])
-                
-                # Para cada balcão, adicionar alternativa ao componente correspondente
-                for balcao in self.balcoes.values():
-                    for componente in balcao.componentes:
-                        if componente.nome == componente_nome:
-                            alternativa = Alternativa(
-                                marca_alternativa=str(row['marca_alternativa']),
-                                cor_alternativa=str(row['cor_alternativa']),
-                                fornecedor_alternativo=str(row['fornecedor_alternativo']),
-                                preco_diferenca=float(row['preco_diferenca'])
-                            )
-                            componente.adicionar_alternativa(alternativa)
+            self.indice = IndiceBusca(self.balcoes.values())
+            print(f"✓ Índice de busca com {len(self.indice.postings)} termos")
             
-            print(f"✓ Carregadas opções de personalização")
+            self.versao = sha256[:12]
+            self.carregado_em = datetime.now()
             
         except Exception as e:
             print(f"✗ Erro ao carregar dados: {e}")
@@ -185,261 +1264,3412 @@ class SistemaBalcoes:
     
     def buscar_balcoes_por_tipo(self, tipo):
         """Busca balcões por tipo (superior/inferior)"""
-        return [balcao for balcao in self.balcoes.values() if balcao.tipo.lower() == tipo.lower()]
+        return list(self.indice.por_tipo.get(tipo.lower(), ()))
     
     def buscar_balcao_por_nome(self, nome):
-        """Busca balcão pelo nome (busca parcial)"""
-        for balcao in self.balcoes.values():
-            if nome.lower() in balcao.nome.lower():
+        """Busca balcão pelo nome (busca parcial, sem acentos e tolerante a erros de digitação)"""
+        return self.buscar_balcao_citado(nome)
+    
+    def buscar_balcoes(self, consulta, tipo=None, limite=None):
+        """Busca ranqueada por nome e descrição; devolve [(balcao, pontuacao)]"""
+        return self.indice.buscar(consulta, tipo=tipo, limite=limite)
+    
+    def buscar_balcao_destacado(self, consulta, tipo=None):
+        """Devolve o balcão só se ele se destacar claramente dos demais na busca"""
+        resultado = self.indice.buscar(consulta, tipo=tipo, limite=2)
+        if len(resultado) == 1 or (len(resultado) == 2 and resultado[0][1] >= 1.5 * resultado[1][1]):
+            return resultado[0][0]
+        return None
+    
+    def buscar_balcao_citado(self, consulta, tipo=None):
+        """Balcão destacado na busca cujo nome a consulta cita por uma palavra própria.
+
+        Casar só na descrição ou só em palavras genéricas ("balcão",
+        "inferior") não basta: "quero um balcão" ou "quero um com porta"
+        devolvem None, e o chat pergunta o tipo em vez de escolher um modelo.
+        """
+        balcao = self.buscar_balcao_destacado(consulta, tipo=tipo)
+        if balcao is None:
+            return None
+        palavras_nome = set(tokenizar(balcao.nome)) - PALAVRAS_GENERICAS_NOME
+        for token in tokenizar(consulta):
+            if any(termo in palavras_nome for termo, _ in self.indice._expandir(token)):
                 return balcao
         return None
     
     def listar_todos_balcoes(self):
         """Lista todos os balcões disponíveis"""
         return list(self.balcoes.values())
-
-# --- ATUALIZAÇÃO DA CLASSE CONVERSA ---
-class ConversaBalcao:
-    def __init__(self):
-        self.estado = ESTADOS['INICIO']
-        self.balcao_selecionado = None
-        self.tipo_selecionado = None  # 'superior' ou 'inferior'
-        self.personalizacoes = []  # Lista de alterações feitas no formato {'componente_nome': 'alternativa_escolhida'}
-        self.orcamento_final = None
     
-    def reiniciar(self):
-        self.estado = ESTADOS['INICIO']
-        self.balcao_selecionado = None
-        self.tipo_selecionado = None
-        self.personalizacoes = []
-        self.orcamento_final = None
+    def _listagem(self, tipo):
+        """(balcões, {id: posição}) da listagem, filtrada por tipo se houver"""
+        listagem = self._listagens.get(tipo)
+        if listagem is None:
+            balcoes = tuple(self.indice.por_tipo.get(tipo, ())) if tipo else tuple(self.balcoes.values())
+            listagem = (balcoes, {balcao.id: posicao for posicao, balcao in enumerate(balcoes)})
+            self._listagens[tipo] = listagem
+        return listagem
     
-    def aplicar_personalizacao(self, componente_nome, alternativa_obj):
-        """Aplica uma personalização ao balcão"""
-        if not self.balcao_selecionado:
-            return False
-        
-        for componente in self.balcao_selecionado.componentes:
-            if componente.nome == componente_nome:
-                # Verificar se a alternativa existe para este componente
-                for alt in componente.alternativas:
-                    if alt.marca_alternativa == alternativa_obj.marca_alternativa and alt.cor_alternativa == alternativa_obj.cor_alternativa:
-                        # Se já existe uma personalização para este componente, remove a antiga
-                        self.personalizacoes = [p for p in self.personalizacoes if p['componente'] != componente_nome]
-                        
-                        # Adiciona a nova
-                        self.personalizacoes.append({
-                            'componente': componente_nome,
-                            'alternativa': alternativa_obj,
-                            'preco_adicional_total': alternativa_obj.preco_diferenca * componente.quantidade
-                        })
-                        return True
-        return False
+    def _pagina_listagem(self, tipo, limite, apos):
+        """(total, [linha_listagem], id do último balcão se houver mais páginas)"""
+        balcoes, posicoes = self._listagem(tipo)
+        inicio = 0
+        if apos is not None:
+            if apos not in posicoes:
+                raise ValueError(CURSOR_EXPIRADO)
+            inicio = posicoes[apos] + 1
+        fim = len(balcoes) if limite is None else min(len(balcoes), inicio + limite)
+        ultimo = balcoes[fim - 1].id if fim < len(balcoes) else None
+        return len(balcoes), [linha_listagem(balcao) for balcao in balcoes[inicio:fim]], ultimo
     
-    def calcular_orcamento_final(self):
-        """Calcula o orçamento final com todas as personalizações"""
-        if not self.balcao_selecionado:
-            return 0
-        
-        total = self.balcao_selecionado.calcular_preco_total()
-        for personalizacao in self.personalizacoes:
-            total += personalizacao['preco_adicional_total']
-        
-        self.orcamento_final = total
-        return total
+    def pagina_balcoes(self, tipo=None, campos=None, limite=None, apos=None):
+        """CorpoResposta de uma página de /balcoes desta versão.
 
-# --- FUNÇÕES DE PROMPT E GERAÇÃO DE RESPOSTA ---
-def gerar_resumo_balcao(balcao, personalizacoes_ativas=[]):
-    """Gera uma string formatada com o resumo do balcão e seus componentes"""
-    if not balcao:
-        return "Nenhum balcão selecionado."
+        `apos` é o id do último balcão da página anterior (o cursor); sem
+        `limite` a listagem vai até o fim. ValueError se o cursor não existir
+        nesta versão do catálogo.
+        """
+        chave = (tipo, campos, limite, apos)
+        with self._paginas_lock:
+            pagina = self._paginas_balcoes.get(chave)
+            if pagina is not None:
+                self._paginas_balcoes.move_to_end(chave)
+                return pagina
 
-    resposta = f" *Orçamento para: {balcao.nome}*\n\n"
-    resposta += f" *Preço Base da Estrutura:* R$ {balcao.preco_base:.2f}\n\n"
-    resposta += " *Componentes Incluídos (Configuração Padrão):*\n"
+        total, itens, ultimo = self._pagina_listagem(tipo, limite, apos)
+        if campos:
+            itens = [{campo: item[campo] for campo in campos} for item in itens]
+        pagina = CorpoResposta(codificar_json({
+            "total": total,
+            "balcoes": itens,
+            "proximo_cursor": codificar_cursor(ultimo) if ultimo is not None else None
+        }))
 
-    for comp in balcao.componentes:
-        # Verifica se há uma personalização ativa para este componente
-        personalizacao_ativa = next((p for p in personalizacoes_ativas if p['componente'] == comp.nome), None)
-        
-        if personalizacao_ativa:
-            alt = personalizacao_ativa['alternativa']
-            preco_unitario = comp.preco_unitario + alt.preco_diferenca
-            descricao_alt = f" (Personalizado: {alt.marca_alternativa} - {alt.cor_alternativa})"
-        else:
-            preco_unitario = comp.preco_unitario
-            descricao_alt = ""
+        with self._paginas_lock:
+            self._paginas_balcoes[chave] = pagina
+            while len(self._paginas_balcoes) > BALCOES_PAGINAS_CACHE:
+                self._paginas_balcoes.popitem(last=False)
+        return pagina
+    
+    def payload_balcoes(self):
+        """JSON já codificado (e seu ETag) da listagem completa de /balcoes desta versão"""
+        pagina = self.pagina_balcoes()
+        return pagina.corpo, pagina.etag
+    
+    def configuracoes_balcao(self, balcao_id, mais_caras=False, k=5, marca=None, cor=None):
+        """CorpoResposta com a faixa de preço e as k configurações mais baratas (ou
+        mais caras) do balcão nesta versão; None se o balcão não existir"""
+        chave = (balcao_id, mais_caras, k, marca, cor)
+        with self._configuracoes_lock:
+            corpo = self._configuracoes.get(chave)
+            if corpo is not None:
+                self._configuracoes.move_to_end(chave)
+                return corpo
 
-        subtotal = preco_unitario * comp.quantidade
-        
-        resposta += f"  • *{comp.nome}* (x{comp.quantidade}) - {comp.marca_padrao} ({comp.cor_padrao}){descricao_alt}\n"
-        resposta += f"    💵 Unitário: R$ {preco_unitario:.2f} | Subtotal: R$ {subtotal:.2f}\n"
+        balcao = self.balcoes.get(balcao_id)
+        if balcao is None:
+            return None
+        opcoes = OpcoesConfiguracao(balcao, marca, cor)
+        minimo, maximo = opcoes.faixa()
+        corpo = CorpoResposta(codificar_json({
+            "balcao_id": balcao.id,
+            "nome": balcao.nome,
+            "total_padrao": float(balcao.calcular_preco_total()),
+            "faixa": {"min": minimo, "max": maximo},
+            "ordem": "maior" if mais_caras else "menor",
+            "restricoes": {"marca": marca, "cor": cor},
+            "sem_restricao": opcoes.sem_restricao,
+            "configuracoes": opcoes.melhores(k, mais_caras)
+        }))
 
-        # Sugestões de personalização (só mostra se não houver personalização ativa)
-        if not personalizacao_ativa and comp.alternativas:
-            resposta += "    ✨ *Opções de personalização disponíveis:*\n"
-            for alt in comp.alternativas:
-                novo_preco = comp.preco_unitario + alt.preco_diferenca
-                resposta += f"      - Trocar para {alt.marca_alternativa} ({alt.cor_alternativa}) "
-                resposta += f"por R$ {novo_preco:.2f}/unid (dif. +R$ {alt.preco_diferenca:.2f})\n"
-        resposta += "\n"
+        with self._configuracoes_lock:
+            self._configuracoes[chave] = corpo
+            while len(self._configuracoes) > CONFIGURACOES_CACHE:
+                self._configuracoes.popitem(last=False)
+        return corpo
     
-    total_final = balcao.calcular_preco_total() + sum(p['preco_adicional_total'] for p in personalizacoes_ativas)
-    resposta += f"💰 *VALOR TOTAL DO ORÇAMENTO:* R$ {total_final:.2f}\n\n"
+    def tabela_precos(self, configuracoes=None):
+        """Arrays de preços desta versão do catálogo, para a precificação em lote.
+
+        `configuracoes` indica quais balcões serão consultados; aqui a tabela
+        cobre o catálogo todo, mas CatalogoSQLite monta só os citados.
+        """
+        if self._tabela_precos is None:
+            self._tabela_precos = TabelaPrecos(self.listar_todos_balcoes())
+        return self._tabela_precos
     
-    if not personalizacoes_ativas:
-        resposta += "🤔 *Deseja personalizar algum componente? Me diga qual e para qual opção!*\n"
-        resposta += "Ex: 'Trocar a dobradiça para Hafele' ou 'Mudar a cor da frente para Madeira'.\n"
-    else:
-        resposta += "✅ *Personalização aplicada! Deseja alterar mais algo ou finalizar o orçamento?*\n"
-        resposta += "Digite 'finalizar' para concluir e gerar o PDF."
+    def memoria_estimada(self):
+        """Bytes aproximados dos objetos e do índice desta versão (calculado uma única vez)"""
+        if self._memoria_estimada is None:
+            total = sys.getsizeof(self.balcoes) + memoria_balcoes(self.balcoes.values(), set())
+            total += sum(posicoes.nbytes + pesos.nbytes for posicoes, pesos in self.indice.postings.values())
+            self._memoria_estimada = total
+        return self._memoria_estimada
 
-    return resposta
+# --- CATÁLOGO EM SQLITE ---
+# Versão do esquema do banco do catálogo; incremente ao mudar as tabelas
+FORMATO_BANCO_CATALOGO = 3
 
-# --- FUNÇÕES AUXILIARES (PDF, etc.) ---
-def gerar_pdf_balcao_final(conversa):
-    """Gera PDF com orçamento final do balcão"""
+ESQUEMA_BANCO_CATALOGO = """
+CREATE TABLE meta (chave TEXT PRIMARY KEY, valor TEXT) WITHOUT ROWID;
+CREATE TABLE balcoes (
+    posicao INTEGER PRIMARY KEY, id INTEGER NOT NULL, nome TEXT, nome_normalizado TEXT, tipo TEXT,
+    tipo_chave TEXT, preco_base REAL, descricao TEXT, preco_total REAL, n_componentes INTEGER, nome_chave TEXT,
+    posicao_tipo INTEGER
+);
+CREATE TABLE componentes (
+    balcao_id INTEGER, ordem INTEGER, nome TEXT, categoria TEXT, quantidade INTEGER, marca_padrao TEXT,
+    cor_padrao TEXT, fornecedor_padrao TEXT, preco_unitario REAL, PRIMARY KEY (balcao_id, ordem)
+) WITHOUT ROWID;
+CREATE TABLE personalizacoes (
+    componente TEXT, ordem INTEGER, marca TEXT, cor TEXT, fornecedor TEXT, preco_diferenca REAL,
+    PRIMARY KEY (componente, ordem)
+) WITHOUT ROWID;
+"""
+
+# Índice de busca em FTS5: palavras (já normalizadas por `tokenizar`) do nome e da descrição,
+# com rowid = posição, e o vocabulário com bordas (" token ") para a busca por trigramas
+ESQUEMA_BUSCA_FTS5 = """
+CREATE VIRTUAL TABLE busca USING fts5(nome, descricao, content='', detail=column);
+CREATE VIRTUAL TABLE vocabulario_tri USING fts5(token, tokenize='trigram');
+"""
+
+# Sem FTS5 (SQLite compilado sem ele): o índice de IndiceBusca em tabelas comuns,
+# com as ocorrências como arrays NumPy em binário
+ESQUEMA_BUSCA_TABELAS = """
+CREATE TABLE ocorrencias (token TEXT PRIMARY KEY, posicoes BLOB, pesos BLOB) WITHOUT ROWID;
+CREATE TABLE vocabulario (token TEXT PRIMARY KEY, n_trigramas INTEGER) WITHOUT ROWID;
+CREATE TABLE trigramas (tri TEXT PRIMARY KEY, tokens TEXT) WITHOUT ROWID;
+"""
+
+# Criados depois da carga (mais rápido que manter os índices durante os INSERTs)
+INDICES_BANCO_CATALOGO = """
+CREATE UNIQUE INDEX balcoes_id ON balcoes (id);
+CREATE INDEX balcoes_tipo ON balcoes (tipo_chave, posicao);
+CREATE UNIQUE INDEX balcoes_posicao_tipo ON balcoes (tipo_chave, posicao_tipo);
+CREATE INDEX balcoes_nome ON balcoes (nome_normalizado);
+CREATE INDEX balcoes_nome_chave ON balcoes (nome_chave, posicao);
+"""
+
+def caminho_banco_catalogo(arquivo_excel, sha256):
+    """Um arquivo por versão da planilha: quem ainda lê a versão anterior não é afetado pela nova"""
+    return f"{os.path.splitext(arquivo_excel)[0]}.{sha256[:12]}.catalogo.db"
+
+def uri_somente_leitura(caminho):
+    # immutable=1: o arquivo nunca muda depois de publicado, então o SQLite dispensa os locks
+    return f"file:{urllib.parse.quote(os.path.abspath(caminho))}?mode=ro&immutable=1"
+
+@functools.lru_cache(maxsize=None)
+def fts5_disponivel():
+    """True se o SQLite deste Python tem FTS5 com o tokenizador de trigramas"""
+    conn = sqlite3.connect(':memory:')
     try:
-        buffer = io.BytesIO()
-        p = canvas.Canvas(buffer, pagesize=letter)
-        width, height = letter
+        conn.execute("CREATE VIRTUAL TABLE teste USING fts5(x, tokenize='trigram')")
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
 
-        # Cabeçalho
-        p.setFillColor(HexColor('#2E86AB'))
-        p.rect(0, height - 100, width, 100, fill=True, stroke=False)
-        
-        p.setFillColorRGB(1, 1, 1)
-        p.setFont("Helvetica-Bold", 20)
-        p.drawString(inch, height - 1.5 * inch, f"ORÇAMENTO - {conversa.balcao_selecionado.nome}")
-        
-        p.setFont("Helvetica", 12)
-        p.drawString(inch, height - 1.8 * inch, f"Data: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
-        p.drawString(inch, height - 2 * inch, f"Tipo: {conversa.balcao_selecionado.tipo.capitalize()}")
+def banco_catalogo_valido(caminho):
+    """True se o banco existe, está no formato atual e seu índice de busca pode ser lido aqui"""
+    if not os.path.exists(caminho):
+        return False
+    try:
+        conn = sqlite3.connect(uri_somente_leitura(caminho), uri=True)
+        try:
+            meta = dict(conn.execute("SELECT chave, valor FROM meta"))
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+    return meta.get('formato') == str(FORMATO_BANCO_CATALOGO) and (meta.get('busca') != 'fts5' or fts5_disponivel())
 
-        # Componentes
-        y = height - 2.5 * inch
-        p.setFillColorRGB(0, 0, 0)
-        p.setFont("Helvetica-Bold", 12)
-        p.drawString(inch, y, "ESTRUTURA E COMPONENTES:")
-        y -= 0.3 * inch
-        p.setFont("Helvetica", 10)
-        
-        # Preço base
-        p.drawString(inch, y, f"Preço Base da Estrutura: R$ {conversa.balcao_selecionado.preco_base:.2f}")
-        y -= 0.25 * inch
+def gravar_banco_catalogo(caminho, dados):
+    """Grava as três abas e o índice de busca num banco novo, publicado com troca atômica.
 
-        for comp in conversa.balcao_selecionado.componentes:
-            p.drawString(inch, y, f"• {comp.nome}:")
-            y -= 0.2 * inch
-            
-            # Verifica se foi personalizado
-            personalizacao = next((p for p in conversa.personalizacoes if p['componente'] == comp.nome), None)
-            if personalizacao:
-                alt = personalizacao['alternativa']
-                marca, cor = alt.marca_alternativa, alt.cor_alternativa
-                preco = comp.preco_unitario + alt.preco_diferenca
-            else:
-                marca, cor = comp.marca_padrao, comp.cor_padrao
-                preco = comp.preco_unitario
-            
-            p.drawString(1.5 * inch, y, f"Marca/Cor: {marca} ({cor}) | Qtd: {comp.quantidade} | Unitário: R$ {preco:.2f}")
-            y -= 0.2 * inch
-            p.drawString(1.5 * inch, y, f"Subtotal: R$ {preco * comp.quantidade:.2f}")
-            y -= 0.3 * inch
+    O índice de busca vai para tabelas FTS5 se o SQLite as tiver; senão,
+    para as tabelas comuns de ESQUEMA_BUSCA_TABELAS.
+    """
+    balcoes = montar_balcoes(dados)
+    indice = IndiceBusca(balcoes.values())
+    busca = 'fts5' if fts5_disponivel() else 'tabelas'
+    # Posição de cada balcão dentro do seu tipo: balcoes[i] de uma listagem por tipo é uma busca no índice
+    contadores = defaultdict(int)
+    posicoes_tipo = []
+    for b in indice.lista:
+        posicoes_tipo.append(contadores[b.tipo.lower()])
+        contadores[b.tipo.lower()] += 1
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    conn = sqlite3.connect(temporario)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executescript(ESQUEMA_BANCO_CATALOGO)
+        conn.executescript(ESQUEMA_BUSCA_FTS5 if busca == 'fts5' else ESQUEMA_BUSCA_TABELAS)
+        conn.executemany(
+            "INSERT INTO balcoes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ((posicao, b.id, b.nome, nome_normalizado, b.tipo, b.tipo.lower(), float(b.preco_base), b.descricao,
+              b.calcular_preco_total(), len(b.componentes), chave_nome(b.nome), posicao_tipo)
+             for posicao, (b, nome_normalizado, posicao_tipo)
+             in enumerate(zip(indice.lista, indice.nomes_normalizados, posicoes_tipo)))
+        )
+        conn.executemany(
+            "INSERT INTO componentes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ((b.id, ordem, c.nome, c.categoria, int(c.quantidade), c.marca_padrao, c.cor_padrao,
+              c.fornecedor_padrao, float(c.preco_unitario))
+             for b in indice.lista for ordem, c in enumerate(b.componentes))
+        )
+        conn.executemany(
+            "INSERT INTO personalizacoes VALUES (?, ?, ?, ?, ?, ?)",
+            ((componente, ordem, marca, cor, fornecedor, float(preco_diferenca))
+             for componente, linhas in dados['personalizacoes'].items()
+             for ordem, (marca, cor, fornecedor, preco_diferenca) in enumerate(linhas))
+        )
+        if busca == 'fts5':
+            conn.executemany(
+                "INSERT INTO busca (rowid, nome, descricao) VALUES (?, ?, ?)",
+                ((posicao, ' '.join(tokenizar(b.nome)), ' '.join(tokenizar(b.descricao)))
+                 for posicao, b in enumerate(indice.lista))
+            )
+            # Na ordem do vocabulário em memória: candidatos empatados saem na mesma ordem
+            conn.executemany("INSERT INTO vocabulario_tri (token) VALUES (?)", ((f" {token} ",) for token in indice.postings))
+        else:
+            conn.executemany(
+                "INSERT INTO ocorrencias VALUES (?, ?, ?)",
+                ((token, posicoes.tobytes(), pesos.tobytes()) for token, (posicoes, pesos) in indice.postings.items())
+            )
+            conn.executemany("INSERT INTO vocabulario VALUES (?, ?)", indice.n_trigramas.items())
+            conn.executemany(
+                "INSERT INTO trigramas VALUES (?, ?)",
+                ((tri, ' '.join(tokens)) for tri, tokens in indice.trigramas.items())
+            )
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", (('formato', str(FORMATO_BANCO_CATALOGO)), ('busca', busca)))
+        conn.executescript(INDICES_BANCO_CATALOGO)
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(temporario, caminho)
 
-            if y < 150: # Adiciona nova página se estiver acabando o espaço
-                p.showPage()
-                y = height - inch
+def em_lotes(valores, tamanho=500):
+    """Fatias de `valores` que cabem no limite de parâmetros de uma consulta"""
+    for inicio in range(0, len(valores), tamanho):
+        yield valores[inicio:inicio + tamanho]
 
-        # Personalizações Aplicadas
-        if conversa.personalizacoes:
-            y -= 0.2 * inch
-            p.setFont("Helvetica-Bold", 12)
-            p.drawString(inch, y, "PERSONALIZAÇÕES APLICADAS:")
-            y -= 0.3 * inch
-            p.setFont("Helvetica", 10)
-            
-            for p_item in conversa.personalizacoes:
-                alt = p_item['alternativa']
-                p.drawString(inch, y, f"• {p_item['componente']}: Alterado para {alt.marca_alternativa} ({alt.cor_alternativa})")
-                y -= 0.2 * inch
-                p.drawString(1.5 * inch, y, f"  Adicional no total: +R$ {p_item['preco_adicional_total']:.2f}")
-                y -= 0.3 * inch
-        
-        # Totais
-        y -= 0.2 * inch
+class ConsultaCatalogo:
+    """Mapeamento somente leitura cujos valores vêm de `buscar(chave)` (None = chave ausente)"""
+    def __init__(self, buscar, contem=None):
+        self.buscar = buscar
+        self.contem = contem  # teste de presença mais barato que `buscar`, se houver
+
+    def get(self, chave, padrao=None):
+        valor = self.buscar(chave)
+        return padrao if valor is None else valor
+
+    def __getitem__(self, chave):
+        valor = self.buscar(chave)
+        if valor is None:
+            raise KeyError(chave)
+        return valor
+
+    def __contains__(self, chave):
+        if self.contem is not None:
+            return self.contem(chave)
+        return self.buscar(chave) is not None
+
+class MapaBalcoesSQLite(ConsultaCatalogo):
+    """Interface de dict (id -> Balcao) sobre a tabela de balcões"""
+    def __init__(self, catalogo):
+        super().__init__(catalogo.balcao)
+        self.catalogo = catalogo
+
+    def __len__(self):
+        return self.catalogo.contagem()
+
+    def __iter__(self):
+        conn = self.catalogo._conexao()
+        return (linha[0] for linha in conn.execute("SELECT id FROM balcoes ORDER BY posicao"))
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        return iter(ListaBalcoesSQLite(self.catalogo))
+
+    def items(self):
+        return ((balcao.id, balcao) for balcao in self.values())
+
+class ListaBalcoesSQLite:
+    """Sequência preguiçosa dos balcões (na ordem da planilha), opcionalmente de um só tipo"""
+    def __init__(self, catalogo, tipo=None):
+        self.catalogo = catalogo
+        self.tipo = tipo
+
+    def __len__(self):
+        return self.catalogo.contagem(self.tipo)
+
+    def _ids(self, inicio, quantidade):
+        conn = self.catalogo._conexao()
+        if self.tipo is None:
+            # posicao é contínua (0..n-1): intervalo direto na chave primária
+            linhas = conn.execute(
+                "SELECT id FROM balcoes WHERE posicao >= ? ORDER BY posicao LIMIT ?", (inicio, quantidade)
+            )
+        else:
+            # Idem com a posição dentro do tipo (sem OFFSET, que percorreria as linhas puladas)
+            linhas = conn.execute(
+                "SELECT id FROM balcoes WHERE tipo_chave = ? AND posicao_tipo >= ? ORDER BY posicao_tipo LIMIT ?",
+                (self.tipo, inicio, quantidade)
+            )
+        return [linha[0] for linha in linhas]
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            inicio, fim, passo = indice.indices(len(self))
+            ids = self._ids(inicio, max(fim - inicio, 0))
+            return [self.catalogo.balcao(balcao_id) for balcao_id in ids[::passo]]
+        if indice < 0:
+            indice += len(self)
+        ids = self._ids(indice, 1) if indice >= 0 else []
+        if not ids:
+            raise IndexError(indice)
+        return self.catalogo.balcao(ids[0])
+
+    def __iter__(self):
+        # Em lotes e sem passar pelo cache: percorrer o catálogo não expulsa os balcões em uso
+        conn = self.catalogo._conexao()
+        filtro, parametros = ("AND tipo_chave = ?", (self.tipo,)) if self.tipo else ("", ())
+        ultima = -1
+        while True:
+            linhas = conn.execute(
+                f"SELECT posicao, id FROM balcoes WHERE posicao > ? {filtro} ORDER BY posicao LIMIT 500",
+                (ultima,) + parametros
+            ).fetchall()
+            if not linhas:
+                return
+            ultima = linhas[-1][0]
+            yield from self.catalogo._montar([balcao_id for _, balcao_id in linhas])
+
+class IndiceBuscaSQLite(IndiceBusca):
+    """IndiceBusca sobre as tabelas do banco: mesmo algoritmo e ranking, sem copiar o índice para a memória"""
+    def __init__(self, catalogo):
+        self.lista = ListaBalcoesSQLite(catalogo)
+        self.nomes_normalizados = catalogo.consulta("SELECT nome_normalizado FROM balcoes WHERE posicao = ?")
+        if catalogo.busca == 'fts5':
+            self.postings = ConsultaCatalogo(catalogo.ocorrencias_fts5, catalogo.no_vocabulario_fts5)
+            self.n_trigramas = ConsultaCatalogo(lambda token: len(trigramas(token)))
+            self.trigramas = ConsultaCatalogo(catalogo.tokens_com_trigrama_fts5)
+        else:
+            self.postings = catalogo.consulta(
+                "SELECT posicoes, pesos FROM ocorrencias WHERE token = ?",
+                lambda linha: (np.frombuffer(linha[0], dtype=np.int64), np.frombuffer(linha[1], dtype=np.float64))
+            )
+            self.n_trigramas = catalogo.consulta("SELECT n_trigramas FROM vocabulario WHERE token = ?")
+            self.trigramas = catalogo.consulta("SELECT tokens FROM trigramas WHERE tri = ?", lambda linha: linha[0].split(' '))
+        self.mascara_tipo = ConsultaCatalogo(catalogo.mascara_tipo)
+
+class CatalogoSQLite(SistemaBalcoes):
+    """Catálogo num arquivo SQLite indexado (um por versão da planilha), com a mesma API de SistemaBalcoes.
+
+    Os workers abrem o mesmo arquivo só para leitura e mapeado em memória:
+    as páginas ficam no cache do sistema operacional, compartilhadas, em vez
+    de cada processo guardar o catálogo inteiro em objetos Python. Só os
+    balcões em uso viram objetos, num LRU pequeno.
+    """
+    def __init__(self, arquivo_excel=EXCEL_FILE, usar_snapshot=USAR_SNAPSHOT_CATALOGO, tamanho_cache=CATALOGO_CACHE_BALCOES, versao=None):
+        self.caminho_banco = None
+        self.busca = None  # 'fts5' ou 'tabelas': onde está o índice de busca do banco
+        self.tamanho_cache = tamanho_cache
+        self._local = threading.local()
+        self._cache = OrderedDict()  # id -> Balcao, LRU dos balcões em uso
+        self._alternativas = OrderedDict()  # nome do componente -> tupla de Alternativa (LRU), compartilhada
+        self._ocorrencias = OrderedDict()  # token -> (posições, pesos) do FTS5 (LRU, limitado pelo total de posições)
+        self._posicoes_em_cache = 0
+        self._cache_lock = threading.Lock()
+        self._contagens = {}  # tipo -> quantidade de balcões
+        self._mascaras = {}  # tipo -> máscara por posição, usada no filtro da busca
+        super().__init__(arquivo_excel, usar_snapshot, versao)
+    
+    @metricas.cronometrar('architec_etapa_duracao_segundos', etapa='carregar_catalogo')
+    def carregar_dados(self):
+        """Abre o banco desta versão da planilha, gravando-o antes se ainda não existir"""
+        try:
+            # Versão arquivada: o banco dela já existe, a planilha nem é lida
+            sha256 = self.versao_arquivada or calcular_hash_arquivo(self.arquivo_excel)
+            caminho = caminho_banco_catalogo(self.arquivo_excel, sha256)
+            if self.versao_arquivada and not banco_catalogo_valido(caminho):
+                raise FileNotFoundError(f"banco da versão {self.versao_arquivada} não encontrado")
+            if not banco_catalogo_valido(caminho):
+                if self.usar_snapshot:
+                    snapshot = compilar_catalogo(self.arquivo_excel)
+                    dados, sha256 = snapshot['dados'], snapshot['sha256']
+                else:
+                    dados = ler_planilhas_excel(self.arquivo_excel)
+                caminho = caminho_banco_catalogo(self.arquivo_excel, sha256)
+                gravar_banco_catalogo(caminho, dados)
+                print(f"✓ Banco do catálogo gravado em {caminho}")
+            
+            self.caminho_banco = caminho
+            self.busca = self._conexao().execute("SELECT valor FROM meta WHERE chave = 'busca'").fetchone()[0]
+            self.balcoes = MapaBalcoesSQLite(self)
+            self.indice = IndiceBuscaSQLite(self)
+            print(f"✓ Catálogo SQLite com {len(self.balcoes)} balcões")
+            
+            self.versao = sha256[:12]
+            self.carregado_em = datetime.now()
+            
+        except Exception as e:
+            print(f"✗ Erro ao carregar dados: {e}")
+    
+    def _conexao(self):
+        """Conexão somente leitura desta thread (refeita após fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(uri_somente_leitura(self.caminho_banco), uri=True, check_same_thread=False)
+            conn.execute(f"PRAGMA mmap_size = {CATALOGO_MMAP_MB * 1024 * 1024}")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+    
+    def consulta(self, sql, converter=lambda linha: linha[0]):
+        """ConsultaCatalogo respondida por uma consulta de uma linha com um parâmetro"""
+        def buscar(chave):
+            linha = self._conexao().execute(sql, (chave,)).fetchone()
+            return None if linha is None else converter(linha)
+        return ConsultaCatalogo(buscar)
+    
+    def contagem(self, tipo=None):
+        """Quantidade de balcões (de um tipo, se informado)"""
+        if tipo not in self._contagens:
+            conn = self._conexao()
+            if tipo is None:
+                self._contagens[tipo] = conn.execute("SELECT COUNT(*) FROM balcoes").fetchone()[0]
+            else:
+                self._contagens[tipo] = conn.execute("SELECT COUNT(*) FROM balcoes WHERE tipo_chave = ?", (tipo,)).fetchone()[0]
+        return self._contagens[tipo]
+    
+    def no_vocabulario_fts5(self, token):
+        with self._cache_lock:
+            if token in self._ocorrencias:
+                return True
+        # " token " só aparece no vocabulário com bordas se o token inteiro estiver lá
+        return self._conexao().execute(
+            "SELECT 1 FROM vocabulario_tri WHERE vocabulario_tri MATCH ?", (f'" {token} "',)
+        ).fetchone() is not None
+    
+    def ocorrencias_fts5(self, token):
+        """(posições, pesos × idf) de um token, como em IndiceBusca.postings, a partir do FTS5.
+
+        Palavras comuns ("balcao", "gavetas") casam com boa parte do catálogo
+        e custam caro para decodificar: ficam num LRU limitado pelo total de
+        posições (CATALOGO_CACHE_OCORRENCIAS).
+        """
+        with self._cache_lock:
+            ocorrencias = self._ocorrencias.get(token)
+            if ocorrencias is not None:
+                self._ocorrencias.move_to_end(token)
+                return ocorrencias
+        ocorrencias = self._ler_ocorrencias_fts5(token)
+        if ocorrencias is None or len(ocorrencias[0]) > CATALOGO_CACHE_OCORRENCIAS:
+            return ocorrencias
+        with self._cache_lock:
+            if token not in self._ocorrencias:
+                self._ocorrencias[token] = ocorrencias
+                self._posicoes_em_cache += len(ocorrencias[0])
+                while self._posicoes_em_cache > CATALOGO_CACHE_OCORRENCIAS:
+                    _, (posicoes, _) = self._ocorrencias.popitem(last=False)
+                    self._posicoes_em_cache -= len(posicoes)
+        return ocorrencias
+    
+    def _ler_ocorrencias_fts5(self, token):
+        conn = self._conexao()
+        frase = f'"{token}"'  # tokens só têm [a-z0-9]: as aspas bastam
+        posicoes = [p for (p,) in conn.execute("SELECT rowid FROM busca WHERE busca MATCH ?", (frase,))]
+        if not posicoes:
+            return None
+        no_nome = {p for (p,) in conn.execute("SELECT rowid FROM busca WHERE busca MATCH ?", (f"nome : {frase}",))}
+        idf = math.log(1 + max(self.contagem(), 1) / len(posicoes))
+        pesos = [IndiceBusca.PESO_NOME if p in no_nome else IndiceBusca.PESO_DESCRICAO for p in posicoes]
+        return (np.array(posicoes, dtype=np.int64), np.array(pesos, dtype=np.float64) * idf)
+    
+    def tokens_com_trigrama_fts5(self, tri):
+        """Tokens do vocabulário que contêm o trigrama (bordas incluídas), na ordem do vocabulário"""
+        tokens = [token.strip() for (token,) in self._conexao().execute(
+            "SELECT token FROM vocabulario_tri WHERE vocabulario_tri MATCH ? ORDER BY rowid", (f'"{tri}"',)
+        )]
+        return tokens or None
+    
+    def mascara_tipo(self, tipo):
+        """Máscara booleana (por posição) dos balcões do tipo, ou None se não houver nenhum"""
+        if tipo not in self._mascaras:
+            posicoes = [linha[0] for linha in self._conexao().execute(
+                "SELECT posicao FROM balcoes WHERE tipo_chave = ?", (tipo,)
+            )]
+            mascara = None
+            if posicoes:
+                mascara = np.zeros(self.contagem(), dtype=bool)
+                mascara[posicoes] = True
+            self._mascaras[tipo] = mascara
+        return self._mascaras[tipo]
+    
+    def _montar(self, ids):
+        """Lê do banco e monta os balcões de `ids` (na mesma ordem), sem passar pelo cache"""
+        conn = self._conexao()
+        balcoes, componentes = {}, []
+        for lote in em_lotes(list(ids)):
+            marcadores = ','.join('?' * len(lote))
+            for balcao_id, nome, tipo, preco_base, descricao in conn.execute(
+                f"SELECT id, nome, tipo, preco_base, descricao FROM balcoes WHERE id IN ({marcadores})", lote
+            ):
+                balcoes[balcao_id] = Balcao(id=balcao_id, nome=nome, tipo=tipo, preco_base=preco_base, descricao=descricao)
+            componentes.extend(conn.execute(
+                "SELECT balcao_id, nome, categoria, quantidade, marca_padrao, cor_padrao, fornecedor_padrao, preco_unitario "
+                f"FROM componentes WHERE balcao_id IN ({marcadores}) ORDER BY balcao_id, ordem", lote
+            ))
+        
+        alternativas = self._alternativas_por_nome({linha[1] for linha in componentes})
+        for balcao_id, nome, categoria, quantidade, marca, cor, fornecedor, preco in componentes:
+            componente = Componente(nome, categoria, quantidade, marca, cor, fornecedor, preco)
+            componente.alternativas = alternativas.get(nome, ())
+            balcoes[balcao_id].adicionar_componente(componente)
+        return [balcoes[balcao_id] for balcao_id in ids if balcao_id in balcoes]
+    
+    def _alternativas_por_nome(self, nomes):
+        """{nome do componente: tupla de Alternativa}, a mesma tupla para todos os balcões em memória"""
+        with self._cache_lock:
+            alternativas = {nome: self._alternativas[nome] for nome in nomes if nome in self._alternativas}
+        faltando = sorted(set(nomes).difference(alternativas))
+        if faltando:
+            lidas = {nome: [] for nome in faltando}
+            conn = self._conexao()
+            for lote in em_lotes(faltando):
+                marcadores = ','.join('?' * len(lote))
+                for componente, marca, cor, fornecedor, preco_diferenca in conn.execute(
+                    "SELECT componente, marca, cor, fornecedor, preco_diferenca FROM personalizacoes "
+                    f"WHERE componente IN ({marcadores}) ORDER BY componente, ordem", lote
+                ):
+                    lidas[componente].append(Alternativa(marca, cor, fornecedor, preco_diferenca))
+            with self._cache_lock:
+                for nome, linhas in lidas.items():
+                    alternativas[nome] = self._alternativas.setdefault(nome, tuple(linhas))
+                while len(self._alternativas) > 4 * self.tamanho_cache:
+                    self._alternativas.popitem(last=False)
+        return alternativas
+    
+    def balcao(self, balcao_id):
+        """Balcão pelo id, do cache ou montado a partir do banco (None se não existir)"""
+        with self._cache_lock:
+            balcao = self._cache.get(balcao_id)
+            if balcao is not None:
+                self._cache.move_to_end(balcao_id)
+                return balcao
+        montados = self._montar([balcao_id])
+        if not montados:
+            return None
+        with self._cache_lock:
+            # Em uma corrida, fica o primeiro objeto montado (conversas comparam por identidade)
+            balcao = self._cache.setdefault(balcao_id, montados[0])
+            while len(self._cache) > self.tamanho_cache:
+                self._cache.popitem(last=False)
+        return balcao
+    
+    def buscar_balcoes_por_tipo(self, tipo):
+        """Busca balcões por tipo (superior/inferior); a sequência é lida do banco sob demanda"""
+        return ListaBalcoesSQLite(self, tipo.lower())
+    
+    def _ids_referenciados(self, configuracoes):
+        """ids dos balcões citados (por id ou nome) nas configurações, na ordem do catálogo.
+
+        Mesmas regras de TabelaPrecos.resolver: texto com dígitos vale como
+        id e, se não houver esse id, como nome; um nome repetido fica com o
+        primeiro balcão da planilha.
+        """
+        numeros, nomes = set(), set()
+        for configuracao in configuracoes:
+            if not isinstance(configuracao, dict):
+                continue
+            referencia = configuracao.get('balcao')
+            if referencia is None:
+                referencia = configuracao.get('balcao_id')
+            if isinstance(referencia, str):
+                texto = referencia.strip()
+                if texto.isdigit():
+                    numeros.add(int(texto))
+                nomes.add(chave_nome(texto))
+            elif isinstance(referencia, (int, float)):
+                numeros.add(referencia)
+        
+        conn = self._conexao()
+        posicoes = {}  # id -> posição
+        for lote in em_lotes(sorted(numeros)):
+            marcadores = ','.join('?' * len(lote))
+            posicoes.update(
+                (balcao_id, posicao)
+                for balcao_id, posicao in conn.execute(f"SELECT id, posicao FROM balcoes WHERE id IN ({marcadores})", lote)
+            )
+        for lote in em_lotes(sorted(nomes)):
+            marcadores = ','.join('?' * len(lote))
+            # Com MIN(), o SQLite devolve o id da mesma linha da menor posição
+            posicoes.update(
+                (balcao_id, posicao)
+                for balcao_id, posicao in conn.execute(
+                    f"SELECT id, MIN(posicao) FROM balcoes WHERE nome_chave IN ({marcadores}) GROUP BY nome_chave", lote
+                )
+            )
+        return sorted(posicoes, key=posicoes.get)
+    
+    def tabela_precos(self, configuracoes=None):
+        """Arrays de preços só dos balcões citados em `configuracoes`, localizados por
+        consultas indexadas (sem `configuracoes`, do catálogo inteiro, montado do banco)"""
+        if configuracoes is None:
+            return super().tabela_precos()
+        return TabelaPrecos(self._montar(self._ids_referenciados(configuracoes)))
+    
+    def listar_todos_balcoes(self):
+        """Lista todos os balcões (montados a partir do banco, fora do cache)"""
+        return list(ListaBalcoesSQLite(self))
+    
+    def _pagina_listagem(self, tipo, limite, apos):
+        conn = self._conexao()
+        filtro, parametros = ("AND tipo_chave = ?", (tipo,)) if tipo else ("", ())
+        inicio = -1
+        if apos is not None:
+            linha = conn.execute(f"SELECT posicao FROM balcoes WHERE id = ? {filtro}", (apos,) + parametros).fetchone()
+            if linha is None:
+                raise ValueError(CURSOR_EXPIRADO)
+            inicio = linha[0]
+        linhas = conn.execute(
+            "SELECT id, nome, tipo, preco_base, descricao, preco_total, n_componentes FROM balcoes "
+            f"WHERE posicao > ? {filtro} ORDER BY posicao LIMIT ?",
+            (inicio,) + parametros + (-1 if limite is None else limite + 1,)
+        ).fetchall()
+        ultimo = None
+        if limite is not None and len(linhas) > limite:
+            linhas = linhas[:limite]
+            ultimo = linhas[-1][0]
+        itens = [dict(zip(CAMPOS_BALCAO, linha)) for linha in linhas]
+        return self.contagem(tipo), itens, ultimo
+    
+    def memoria_estimada(self):
+        """Bytes aproximados dos balcões em cache e das máscaras de tipo (o resto fica no arquivo)"""
+        with self._cache_lock:
+            em_cache = list(self._cache.values())
+            ocorrencias = sum(posicoes.nbytes + pesos.nbytes for posicoes, pesos in self._ocorrencias.values())
+        mascaras = sum(mascara.nbytes for mascara in self._mascaras.values() if mascara is not None)
+        return memoria_balcoes(em_cache, set()) + mascaras + ocorrencias
+
+def criar_catalogo(arquivo_excel=EXCEL_FILE, backend=CATALOGO_BACKEND, versao=None):
+    """Instancia o catálogo no motor configurado em CATALOGO_BACKEND"""
+    if backend == 'sqlite':
+        return CatalogoSQLite(arquivo_excel, versao=versao)
+    return SistemaBalcoes(arquivo_excel, versao=versao)
+
+def carregar_versao(versao, arquivo_excel=EXCEL_FILE, backend=CATALOGO_BACKEND):
+    """Abre uma versão do catálogo que não está carregada neste processo: pelo
+    banco/snapshot arquivado dela ou, se for a versão da planilha atual, pela
+    planilha. None se ela não puder mais ser reconstruída."""
+    if not re.fullmatch(r'[0-9a-f]{12}', str(versao)):
+        return None
+    if backend == 'sqlite':
+        arquivada = banco_catalogo_valido(caminho_banco_catalogo(arquivo_excel, versao))
+    else:
+        arquivada = os.path.exists(caminho_snapshot_versao(arquivo_excel, versao))
+    if not arquivada:
+        try:
+            if calcular_hash_arquivo(arquivo_excel)[:12] != versao:
+                return None
+        except OSError:
+            return None
+    catalogo = criar_catalogo(arquivo_excel, backend, versao=versao if arquivada else None)
+    # A planilha pode ter mudado entre o hash e a carga
+    return catalogo if catalogo.versao == versao else None
+
+# --- ATUALIZAÇÃO DA CLASSE CONVERSA ---
+def aplicar_alternativa(balcao, personalizacoes, componente_nome, alternativa_obj):
+    """Nova lista de personalizações com a alternativa aplicada ao componente,
+    ou None se o balcão não tiver esse componente com essa alternativa"""
+    for componente in balcao.componentes:
+        if componente.nome == componente_nome:
+            # Verificar se a alternativa existe para este componente
+            for alt in componente.alternativas:
+                if alt.marca_alternativa == alternativa_obj.marca_alternativa and alt.cor_alternativa == alternativa_obj.cor_alternativa:
+                    # Se já existe uma personalização para este componente, remove a antiga
+                    novas = [p for p in personalizacoes if p['componente'] != componente_nome]
+                    
+                    # Adiciona a nova (guardando o objeto do catálogo, chave dos trechos do resumo)
+                    novas.append({
+                        'componente': componente_nome,
+                        'alternativa': alt,
+                        'preco_adicional_total': alternativa_obj.preco_diferenca * componente.quantidade
+                    })
+                    return novas
+    return None
+
+def alternativa_por_nome(balcao, componente, marca, cor):
+    """(componente, alternativa) do balcão pelos nomes, sem diferenciar
+    maiúsculas e acentos; (None, None) se não existir"""
+    # Mesma escolha de TabelaPrecos: o primeiro componente do nome que tem a alternativa
+    chave = (chave_nome(marca), chave_nome(cor))
+    for comp in balcao.componentes:
+        if chave_nome(comp.nome) != chave_nome(componente):
+            continue
+        alt = next((a for a in comp.alternativas
+                    if (chave_nome(a.marca_alternativa), chave_nome(a.cor_alternativa)) == chave), None)
+        if alt is not None:
+            return comp, alt
+    return None, None
+
+class ConversaBalcao:
+    def __init__(self, catalogo=None):
+        # Versão do catálogo fixada para esta conversa (ver recarregar_catalogo)
+        self.catalogo = catalogo or sistema_balcoes
+        self.estado = ESTADOS['INICIO']
+        self.balcao_selecionado = None
+        self.tipo_selecionado = None  # 'superior' ou 'inferior'
+        self.personalizacoes = []  # Lista de alterações feitas no formato {'componente_nome': 'alternativa_escolhida'}
+        self.orcamento_final = None
+        self.pdf_chave = None  # chave do PDF no cache_pdf, após finalizar
+        self.projeto = None  # Projeto com vários balcões (independe do balcão em conversa)
+    
+    def reiniciar(self):
+        self.catalogo = sistema_balcoes
+        self.estado = ESTADOS['INICIO']
+        self.balcao_selecionado = None
+        self.tipo_selecionado = None
+        self.personalizacoes = []
+        self.orcamento_final = None
+        self.pdf_chave = None
+    
+    @metricas.cronometrar('architec_etapa_duracao_segundos', etapa='aplicar_personalizacao')
+    def aplicar_personalizacao(self, componente_nome, alternativa_obj):
+        """Aplica uma personalização ao balcão"""
+        if not self.balcao_selecionado:
+            return False
+        
+        personalizacoes = aplicar_alternativa(self.balcao_selecionado, self.personalizacoes, componente_nome, alternativa_obj)
+        if personalizacoes is None:
+            return False
+        self.personalizacoes = personalizacoes
+        return True
+    
+    def calcular_orcamento_final(self):
+        """Calcula o orçamento final com todas as personalizações"""
+        if not self.balcao_selecionado:
+            return 0
+        
+        total = self.balcao_selecionado.calcular_preco_total()
+        for personalizacao in self.personalizacoes:
+            total += personalizacao['preco_adicional_total']
+        
+        self.orcamento_final = total
+        return total
+    
+    def serializar(self):
+        """Representação compacta (JSON) da conversa para os armazéns de sessão"""
+        dados = {
+            'v': self.catalogo.versao,
+            'e': self.estado,
+            't': self.tipo_selecionado,
+            'b': self.balcao_selecionado.id if self.balcao_selecionado else None,
+            'p': [
+                [p['componente'], p['alternativa'].marca_alternativa, p['alternativa'].cor_alternativa]
+                for p in self.personalizacoes
+            ],
+            'o': self.orcamento_final,
+            'k': self.pdf_chave
+        }
+        if self.projeto is not None:
+            dados['j'] = self.projeto.serializar()
+        return json.dumps(dados, ensure_ascii=False, separators=(',', ':'))
+    
+    @classmethod
+    def desserializar(cls, texto):
+        """Reconstrói a conversa, religando-a aos objetos do catálogo"""
+        dados = json.loads(texto)
+        # A versão fixada precisa estar carregada: trocar de versão mudaria o preço do orçamento
+        conversa = cls(catalogo_da_versao(dados['v']))
+        conversa.estado = dados['e']
+        conversa.tipo_selecionado = dados['t']
+        conversa.orcamento_final = dados['o']
+        conversa.pdf_chave = dados.get('k')
+        if dados.get('j'):
+            conversa.projeto = Projeto.desserializar(dados['j'])
+        if dados['b'] is not None:
+            conversa.balcao_selecionado = conversa.catalogo.balcoes.get(dados['b'])
+            if conversa.balcao_selecionado is None:
+                # Balcão saiu do catálogo: recomeça a conversa
+                conversa.reiniciar()
+                return conversa
+            for componente_nome, marca, cor in dados['p']:
+                componente = next((c for c in conversa.balcao_selecionado.componentes if c.nome == componente_nome), None)
+                alternativa = componente and next(
+                    (a for a in componente.alternativas if a.marca_alternativa == marca and a.cor_alternativa == cor), None
+                )
+                if alternativa:
+                    conversa.aplicar_personalizacao(componente_nome, alternativa)
+        return conversa
+
+# --- PROJETOS (VÁRIOS BALCÕES) ---
+def centavos(valor):
+    """Valor em reais como inteiro de centavos (somas incrementais sem acumular erro de float)"""
+    return int(round(valor * 100))
+
+def quantidade_projeto(valor):
+    """Quantidade de unidades de uma linha do projeto; ValueError se inválida"""
+    if isinstance(valor, bool) or not isinstance(valor, (int, str)):
+        raise ValueError("Quantidade inválida: informe um inteiro positivo")
+    texto = str(valor).strip()
+    if not texto.isdigit() or int(texto) < 1:
+        raise ValueError("Quantidade inválida: informe um inteiro positivo")
+    return int(texto)
+
+class ItemProjeto:
+    """Uma linha do projeto: um balcão, quantas unidades e as personalizações de cada unidade"""
+    __slots__ = ('id', 'balcao', 'quantidade', 'personalizacoes', 'preco_unitario', 'centavos_unitario')
+
+    def __init__(self, item_id, balcao, quantidade, personalizacoes=()):
+        self.id = item_id
+        self.balcao = balcao
+        self.quantidade = quantidade
+        self.personalizacoes = list(personalizacoes)  # mesmo formato de ConversaBalcao.personalizacoes
+        self.precificar()
+
+    def precificar(self):
+        """Preço de uma unidade, na mesma ordem de soma de ConversaBalcao.calcular_orcamento_final"""
+        total = self.balcao.calcular_preco_total()
+        for personalizacao in self.personalizacoes:
+            total += personalizacao['preco_adicional_total']
+        self.preco_unitario = total
+        self.centavos_unitario = centavos(total)
+
+    @property
+    def centavos(self):
+        return self.centavos_unitario * self.quantidade
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "balcao_id": self.balcao.id,
+            "nome": self.balcao.nome,
+            "quantidade": self.quantidade,
+            "personalizacoes": [
+                {
+                    "componente": p['componente'],
+                    "marca": p['alternativa'].marca_alternativa,
+                    "cor": p['alternativa'].cor_alternativa,
+                    "preco_adicional": p['preco_adicional_total']
+                }
+                for p in self.personalizacoes
+            ],
+            "preco_unitario": self.preco_unitario,
+            "subtotal": self.centavos / 100
+        }
+
+class Projeto:
+    """Vários balcões de um mesmo ambiente (uma cozinha inteira), cada um com quantidade.
+
+    Os totais ficam em centavos e são ajustados a cada mudança: uma linha
+    sai do total com os valores antigos e volta com os novos, então
+    adicionar, alterar ou remover custa O(1) qualquer que seja o tamanho
+    do projeto. `recalcular_total` refaz a soma inteira, para conferência.
+    """
+
+    def __init__(self, catalogo=None):
+        # Versão do catálogo fixada para o projeto, como na conversa
+        self.catalogo = catalogo or sistema_balcoes
+        self.itens = OrderedDict()  # id -> ItemProjeto, na ordem de inclusão
+        # Segredo de quem criou o projeto: exigido pelas rotas /projeto (o session_id não basta)
+        self.token = secrets.token_urlsafe(16)
+        self.proximo_id = 1
+        self.total_centavos = 0
+        self.unidades = 0
+
+    @property
+    def total(self):
+        return self.total_centavos / 100
+
+    def _contabilizar(self, item, sinal):
+        self.total_centavos += sinal * item.centavos
+        self.unidades += sinal * item.quantidade
+
+    def balcao(self, referencia):
+        """Balcão por id ou nome; ValueError se não existir"""
+        configuracao = {'balcao': referencia}
+        tabela = self.catalogo.tabela_precos([configuracao])
+        linha, _ = tabela.resolver(configuracao)
+        return self.catalogo.balcoes[tabela.ids[linha]]
+
+    def resolver_personalizacoes(self, balcao, personalizacoes):
+        """Lista de personalizações (formato da conversa) a partir de [(componente, marca, cor)]; ValueError se alguma não existir"""
+        resultado = []
+        for componente, marca, cor in personalizacoes:
+            comp, alt = alternativa_por_nome(balcao, componente, marca, cor)
+            if alt is None:
+                raise ValueError(f"Alternativa '{marca} ({cor})' não encontrada para o componente '{componente}'")
+            resultado = aplicar_alternativa(balcao, resultado, comp.nome, alt)
+        return resultado
+
+    def adicionar(self, configuracao):
+        """Inclui uma linha a partir de uma configuração ({balcao, quantidade, personalizacoes}); ValueError se inválida"""
+        if len(self.itens) >= PROJETO_MAX_ITENS:
+            raise ValueError(f"O projeto já tem o máximo de {PROJETO_MAX_ITENS} itens")
+        balcao = self.balcao(configuracao.get('balcao', configuracao.get('balcao_id')))
+        quantidade = quantidade_projeto(configuracao.get('quantidade', 1))
+        personalizacoes = self.resolver_personalizacoes(balcao, personalizacoes_configuracao(configuracao))
+        item = ItemProjeto(self.proximo_id, balcao, quantidade, personalizacoes)
+        self.proximo_id += 1
+        self.itens[item.id] = item
+        self._contabilizar(item, 1)
+        return item
+
+    def alterar(self, item_id, quantidade=None, personalizacoes=None):
+        """Muda a quantidade e/ou substitui as personalizações de uma linha; KeyError se ela não existir"""
+        item = self.itens[item_id]
+        # Valida tudo antes de mexer na linha: um erro não deixa o total pela metade
+        if quantidade is not None:
+            quantidade = quantidade_projeto(quantidade)
+        if personalizacoes is not None:
+            personalizacoes = self.resolver_personalizacoes(
+                item.balcao, personalizacoes_configuracao({'personalizacoes': personalizacoes})
+            )
+        self._contabilizar(item, -1)
+        if quantidade is not None:
+            item.quantidade = quantidade
+        if personalizacoes is not None:
+            item.personalizacoes = personalizacoes
+            item.precificar()
+        self._contabilizar(item, 1)
+        return item
+
+    def remover(self, item_id):
+        """Tira uma linha do projeto; KeyError se ela não existir"""
+        item = self.itens.pop(item_id)
+        self._contabilizar(item, -1)
+        return item
+
+    def recalcular_total(self):
+        """(unidades, total em centavos) somando todas as linhas de novo"""
+        return (sum(item.quantidade for item in self.itens.values()),
+                sum(item.centavos for item in self.itens.values()))
+
+    def autorizado(self, token):
+        """True se `token` é o do projeto (comparação em tempo constante)"""
+        return hmac.compare_digest(str(token or '').encode('utf-8'), self.token.encode('utf-8'))
+
+    def _assinatura(self, session_id, expira):
+        return hmac.new(self.token.encode('utf-8'), f"pdf:{session_id}:{expira}".encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def link_pdf(self, session_id, validade=PROJETO_LINK_PDF_TTL):
+        """URL do PDF para o navegador abrir (sem cabeçalhos): assinada com o token e
+        válida por `validade` segundos, sem expor o token em logs, histórico ou Referer"""
+        expira = int(time.time()) + validade
+        return f"/projeto/{session_id}/pdf?expira={expira}&assinatura={self._assinatura(session_id, expira)}"
+
+    def link_valido(self, session_id, expira, assinatura):
+        """True se (expira, assinatura) vêm de um `link_pdf` desta sessão ainda no prazo"""
+        try:
+            expira = int(expira)
+        except (TypeError, ValueError):
+            return False
+        return expira >= time.time() and hmac.compare_digest(
+            str(assinatura or '').encode('utf-8'), self._assinatura(session_id, expira).encode('utf-8')
+        )
+
+    def resumo(self):
+        """Totais do projeto, sem as linhas"""
+        return {"itens": len(self.itens), "unidades": self.unidades, "total": self.total}
+
+    def to_dict(self):
+        return dict(self.resumo(), versao=self.catalogo.versao, linhas=[item.to_dict() for item in self.itens.values()])
+
+    def serializar(self):
+        """Estrutura compacta guardada junto da conversa (chave 'j')"""
+        return {
+            'v': self.catalogo.versao,
+            't': self.token,
+            'n': self.proximo_id,
+            'i': [
+                [item.id, item.balcao.id, item.quantidade, [
+                    [p['componente'], p['alternativa'].marca_alternativa, p['alternativa'].cor_alternativa]
+                    for p in item.personalizacoes
+                ]]
+                for item in self.itens.values()
+            ]
+        }
+
+    @classmethod
+    def desserializar(cls, dados):
+        """Reconstrói o projeto; linhas cujo balcão saiu do catálogo são descartadas"""
+        projeto = cls(catalogo_da_versao(dados['v']))
+        projeto.token = dados['t']
+        projeto.proximo_id = dados['n']
+        for item_id, balcao_id, quantidade, personalizacoes in dados['i']:
+            balcao = projeto.catalogo.balcoes.get(balcao_id)
+            if balcao is None:
+                continue
+            aplicadas = []
+            for componente_nome, marca, cor in personalizacoes:
+                componente = next((c for c in balcao.componentes if c.nome == componente_nome), None)
+                alternativa = componente and next(
+                    (a for a in componente.alternativas if a.marca_alternativa == marca and a.cor_alternativa == cor), None
+                )
+                if alternativa:
+                    aplicadas = aplicar_alternativa(balcao, aplicadas, componente_nome, alternativa)
+            item = ItemProjeto(item_id, balcao, quantidade, aplicadas)
+            projeto.itens[item_id] = item
+            projeto._contabilizar(item, 1)
+        return projeto
+
+# --- ARMAZENAMENTO DE SESSÕES ---
+class ArmazemSessoes:
+    """Interface comum dos armazéns de conversas (session_id -> ConversaBalcao)"""
+    
+    def obter(self, session_id):
+        raise NotImplementedError
+    
+    def salvar(self, session_id, conversa):
+        raise NotImplementedError
+    
+    def remover(self, session_id):
+        raise NotImplementedError
+    
+    def __len__(self):
+        raise NotImplementedError
+    
+    def contagem(self):
+        """Número de sessões vivas sem consultar o armazenamento (para /metrics; pode vir atrasado)"""
+        raise NotImplementedError
+    
+    def finalizadas(self, desde):
+        """ids das sessões com orçamento finalizado e atualizadas desde `desde` (epoch)"""
+        raise NotImplementedError
+    
+    def versoes_em_uso(self):
+        """Versões do catálogo fixadas por sessões (e projetos) ainda vivos"""
+        raise NotImplementedError
+    
+    def __contains__(self, session_id):
+        return self.obter(session_id) is not None
+
+class ArmazemSessoesMemoria(ArmazemSessoes):
+    """Sessões em memória, limitadas por quantidade (LRU) e por inatividade (TTL)"""
+    
+    def __init__(self, max_sessoes=SESSOES_MAX, ttl=SESSOES_TTL):
+        self.max_sessoes = max_sessoes
+        self.ttl = ttl
+        self._sessoes = OrderedDict()  # session_id -> (conversa, expira_em)
+        self._lock = threading.Lock()
+    
+    def obter(self, session_id):
+        with self._lock:
+            item = self._sessoes.get(session_id)
+            if item is None:
+                return None
+            conversa, expira_em = item
+            if expira_em < time.monotonic():
+                del self._sessoes[session_id]
+                return None
+            self._sessoes.move_to_end(session_id)
+            return conversa
+    
+    def salvar(self, session_id, conversa):
+        with self._lock:
+            self._sessoes[session_id] = (conversa, time.monotonic() + self.ttl)
+            self._sessoes.move_to_end(session_id)
+            while len(self._sessoes) > self.max_sessoes:
+                self._sessoes.popitem(last=False)
+    
+    def remover(self, session_id):
+        with self._lock:
+            self._sessoes.pop(session_id, None)
+    
+    def __len__(self):
+        return len(self._sessoes)
+    
+    def contagem(self):
+        return len(self._sessoes)
+    
+    def versoes_em_uso(self):
+        with self._lock:
+            conversas = [conversa for conversa, _ in self._sessoes.values()]
+        return ({conversa.catalogo.versao for conversa in conversas}
+                | {conversa.projeto.catalogo.versao for conversa in conversas if conversa.projeto is not None})
+    
+    def finalizadas(self, desde):
+        with self._lock:
+            itens = list(self._sessoes.items())
+        # expira_em é monotônico: convertido para o relógio de parede para comparar com `desde`
+        agora_monotonico, agora = time.monotonic(), time.time()
+        return [
+            session_id for session_id, (conversa, expira_em) in itens
+            if expira_em >= agora_monotonico
+            and conversa.estado == ESTADOS['ORCAMENTO_FINALIZADO']
+            and agora - (agora_monotonico - (expira_em - self.ttl)) >= desde
+        ]
+
+class ArmazemSessoesSQLite(ArmazemSessoes):
+    """Sessões em SQLite, compartilhadas entre workers, com escrita em lote (write-behind).
+
+    `salvar` só enfileira a conversa serializada; uma thread grava os
+    pendentes em uma única transação a cada `intervalo` segundos ou quando
+    o lote enche. Leituras consultam primeiro os pendentes deste processo.
+    """
+    
+    def __init__(self, caminho=SESSOES_DB_FILE, ttl=SESSOES_TTL, intervalo=0.2, tamanho_lote=200, intervalo_contagem=5):
+        self.caminho = caminho
+        self.ttl = ttl
+        self.intervalo = intervalo
+        self.tamanho_lote = tamanho_lote
+        self.intervalo_contagem = intervalo_contagem
+        self._contagem = 0  # última contagem de sessões vivas, refeita pela thread de gravação
+        self._proxima_contagem = 0.0
+        self._local = threading.local()
+        self._pendentes = {}  # session_id -> (dados, atualizado_em); None em dados = remoção
+        # A linha guarda só o número da versão do catálogo: as referências fortes ficam aqui,
+        # até nenhuma sessão viva usar a versão (versão -> (catálogo, fixado_em))
+        self._catalogos = {}
+        self._proxima_liberacao = 0.0
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._pid_gravador = None
+        
+        with self._conexao() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessoes (
+                    session_id TEXT PRIMARY KEY,
+                    dados TEXT NOT NULL,
+                    atualizado_em REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessoes_atualizado_em ON sessoes (atualizado_em)")
+        atexit.register(self.gravar_pendentes)
+    
+    def _conexao(self):
+        """Uma conexão por thread (e por processo, para ser seguro após fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.caminho, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+    
+    def _garantir_gravador(self):
+        if self._pid_gravador != os.getpid():
+            self._pid_gravador = os.getpid()
+            threading.Thread(target=self._loop_gravacao, daemon=True).start()
+    
+    def _loop_gravacao(self):
+        while True:
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+            try:
+                inicio = time.time()
+                self.gravar_pendentes()
+                self._liberar_catalogos(inicio)
+                self._contar(inicio)
+            except Exception as e:
+                print(f"✗ Erro ao gravar sessões: {e}")
+    
+    def gravar_pendentes(self):
+        """Grava todas as sessões pendentes em uma única transação"""
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, {}
+        if not pendentes:
+            return
+        conn = self._conexao()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO sessoes (session_id, dados, atualizado_em) VALUES (?, ?, ?)",
+                [(sid, dados, ts) for sid, (dados, ts) in pendentes.items() if dados is not None]
+            )
+            conn.executemany(
+                "DELETE FROM sessoes WHERE session_id = ?",
+                [(sid,) for sid, (dados, _) in pendentes.items() if dados is None]
+            )
+            conn.execute("DELETE FROM sessoes WHERE atualizado_em < ?", (time.time() - self.ttl,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            with self._lock:
+                # Devolve à fila o que não foi sobrescrito nesse meio tempo
+                for sid, item in pendentes.items():
+                    self._pendentes.setdefault(sid, item)
+            raise
+    
+    def obter(self, session_id):
+        with self._lock:
+            item = self._pendentes.get(session_id)
+        if item is not None:
+            dados, atualizado_em = item
+        else:
+            linha = self._conexao().execute(
+                "SELECT dados, atualizado_em FROM sessoes WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if linha is None:
+                return None
+            dados, atualizado_em = linha
+        if dados is None or atualizado_em < time.time() - self.ttl:
+            return None
+        return ConversaBalcao.desserializar(dados)
+    
+    def salvar(self, session_id, conversa):
+        catalogos = [conversa.catalogo] + ([conversa.projeto.catalogo] if conversa.projeto is not None else [])
+        self._enfileirar(session_id, conversa.serializar(), catalogos)
+    
+    def remover(self, session_id):
+        self._enfileirar(session_id, None)
+    
+    def _enfileirar(self, session_id, dados, catalogos=()):
+        self._garantir_gravador()
+        with self._lock:
+            agora = time.time()
+            for catalogo in catalogos:
+                self._catalogos[catalogo.versao] = (catalogo, agora)
+            self._pendentes[session_id] = (dados, agora)
+            cheio = len(self._pendentes) >= self.tamanho_lote
+        if cheio:
+            self._acordar.set()
+    
+    def _liberar_catalogos(self, gravado_ate, intervalo=60):
+        """Solta (no máximo a cada `intervalo` s) as versões que nenhuma sessão viva usa.
+
+        `gravado_ate` é o instante anterior à última gravação: o que foi
+        fixado antes dele já está na tabela; o que veio depois é mantido.
+        """
+        if not self._catalogos or gravado_ate < self._proxima_liberacao:
+            return
+        self._proxima_liberacao = gravado_ate + intervalo
+        em_uso = self._versoes_gravadas()
+        with self._lock:
+            for versao, (_, fixado_em) in list(self._catalogos.items()):
+                if versao not in em_uso and fixado_em < gravado_ate:
+                    del self._catalogos[versao]
+    
+    def _versoes_gravadas(self):
+        """Versões do catálogo (da conversa e do projeto) das sessões vivas na tabela"""
+        limite = time.time() - self.ttl
+        return {linha[0] for linha in self._conexao().execute(
+            "SELECT json_extract(dados, '$.v') FROM sessoes WHERE atualizado_em >= ? "
+            "UNION SELECT json_extract(dados, '$.j.v') FROM sessoes WHERE atualizado_em >= ?",
+            (limite, limite)
+        )}
+    
+    def versoes_em_uso(self):
+        with self._lock:
+            fixadas = set(self._catalogos)  # inclui as de sessões ainda pendentes de gravação
+        return fixadas | self._versoes_gravadas()
+    
+    def __len__(self):
+        self.gravar_pendentes()
+        return self._conexao().execute(
+            "SELECT COUNT(*) FROM sessoes WHERE atualizado_em >= ?", (time.time() - self.ttl,)
+        ).fetchone()[0]
+    
+    def _contar(self, agora):
+        """Refaz a contagem de contagem() no máximo a cada `intervalo_contagem` s (na thread de gravação)"""
+        if agora < self._proxima_contagem:
+            return
+        self._proxima_contagem = agora + self.intervalo_contagem
+        self._contagem = self._conexao().execute(
+            "SELECT COUNT(*) FROM sessoes WHERE atualizado_em >= ?", (agora - self.ttl,)
+        ).fetchone()[0]
+    
+    def contagem(self):
+        self._garantir_gravador()  # workers que só leem também mantêm a contagem em dia
+        return self._contagem
+    
+    def finalizadas(self, desde):
+        self.gravar_pendentes()
+        return [linha[0] for linha in self._conexao().execute(
+            "SELECT session_id FROM sessoes WHERE atualizado_em >= ? AND json_extract(dados, '$.e') = ? "
+            "ORDER BY atualizado_em",
+            (max(desde, time.time() - self.ttl), ESTADOS['ORCAMENTO_FINALIZADO'])
+        )]
+
+def criar_armazem_sessoes(backend=SESSOES_BACKEND):
+    """Instancia o armazém de sessões configurado em SESSOES_BACKEND"""
+    if backend == 'sqlite':
+        print(f"✓ Sessões em SQLite ({SESSOES_DB_FILE})")
+        return ArmazemSessoesSQLite()
+    return ArmazemSessoesMemoria()
+
+# --- FUNÇÕES DE PROMPT E GERAÇÃO DE RESPOSTA ---
+RODAPE_SEM_PERSONALIZACAO = (
+    "🤔 *Deseja personalizar algum componente? Me diga qual e para qual opção!*\n"
+    "Ex: 'Trocar a dobradiça para Hafele' ou 'Mudar a cor da frente para Madeira'.\n"
+)
+RODAPE_COM_PERSONALIZACAO = (
+    "✅ *Personalização aplicada! Deseja alterar mais algo ou finalizar o orçamento?*\n"
+    "Digite 'finalizar' para concluir e gerar o PDF."
+)
+
+class FragmentosResumo:
+    """Trechos do resumo de um balcão, formatados uma vez por versão do catálogo.
+
+    Cabeçalho e linhas padrão (com o bloco de alternativas) são montados na
+    criação; a linha de um componente personalizado é montada na primeira vez
+    que aquela alternativa aparece e reaproveitada nos turnos seguintes.
+    """
+    __slots__ = ('cabecalho', 'linhas_padrao', 'linhas_personalizadas', 'componentes')
+
+    def __init__(self, balcao):
+        self.cabecalho = (
+            f" *Orçamento para: {balcao.nome}*\n\n"
+            f" *Preço Base da Estrutura:* R$ {balcao.preco_base:.2f}\n\n"
+            " *Componentes Incluídos (Configuração Padrão):*\n"
+        )
+        self.componentes = balcao.componentes
+        self.linhas_padrao = [self._linha_padrao(comp) for comp in balcao.componentes]
+        self.linhas_personalizadas = {}  # (posição do componente, alternativa) -> linha
+
+    @staticmethod
+    def _linha(comp, preco_unitario, descricao_alt):
+        subtotal = preco_unitario * comp.quantidade
+        return (
+            f"  • *{comp.nome}* (x{comp.quantidade}) - {comp.marca_padrao} ({comp.cor_padrao}){descricao_alt}\n"
+            f"    💵 Unitário: R$ {preco_unitario:.2f} | Subtotal: R$ {subtotal:.2f}\n"
+        )
+
+    def _linha_padrao(self, comp):
+        partes = [self._linha(comp, comp.preco_unitario, "")]
+        if comp.alternativas:
+            partes.append("    ✨ *Opções de personalização disponíveis:*\n")
+            for alt in comp.alternativas:
+                novo_preco = comp.preco_unitario + alt.preco_diferenca
+                partes.append(
+                    f"      - Trocar para {alt.marca_alternativa} ({alt.cor_alternativa}) "
+                    f"por R$ {novo_preco:.2f}/unid (dif. +R$ {alt.preco_diferenca:.2f})\n"
+                )
+        partes.append("\n")
+        return "".join(partes)
+
+    def linha_personalizada(self, posicao, alt):
+        """Linha do componente na `posicao` trocado para `alt` (sem o bloco de alternativas)"""
+        chave = (posicao, alt)
+        linha = self.linhas_personalizadas.get(chave)
+        if linha is None:
+            comp = self.componentes[posicao]
+            linha = self._linha(
+                comp, comp.preco_unitario + alt.preco_diferenca,
+                f" (Personalizado: {alt.marca_alternativa} - {alt.cor_alternativa})"
+            ) + "\n"
+            self.linhas_personalizadas[chave] = linha
+        return linha
+
+def gerar_resumo_balcao_partes(balcao, personalizacoes_ativas=[]):
+    """Gera o resumo do balcão em trechos (cabeçalho, um por componente e rodapé)"""
+    if not balcao:
+        yield "Nenhum balcão selecionado."
+        return
+
+    inicio = time.perf_counter()
+    fragmentos = balcao.fragmentos_resumo
+    yield fragmentos.cabecalho
+
+    # Personalização ativa por nome de componente (vale a primeira, como antes)
+    ativas = {}
+    for p in personalizacoes_ativas:
+        ativas.setdefault(p['componente'], p)
+
+    for posicao, comp in enumerate(balcao.componentes):
+        personalizacao_ativa = ativas.get(comp.nome)
+        if personalizacao_ativa:
+            yield fragmentos.linha_personalizada(posicao, personalizacao_ativa['alternativa'])
+        else:
+            yield fragmentos.linhas_padrao[posicao]
+    
+    total_final = balcao.calcular_preco_total() + sum(p['preco_adicional_total'] for p in personalizacoes_ativas)
+    rodape = RODAPE_COM_PERSONALIZACAO if personalizacoes_ativas else RODAPE_SEM_PERSONALIZACAO
+    metricas.observar('architec_etapa_duracao_segundos', time.perf_counter() - inicio, etapa='gerar_resumo')
+    yield f"💰 *VALOR TOTAL DO ORÇAMENTO:* R$ {total_final:.2f}\n\n" + rodape
+
+def gerar_resumo_balcao(balcao, personalizacoes_ativas=[]):
+    """Gera uma string formatada com o resumo do balcão e seus componentes"""
+    return "".join(gerar_resumo_balcao_partes(balcao, personalizacoes_ativas))
+
+def juntar_resposta(resposta):
+    """Converte a resposta da máquina de estados (texto ou trechos) em uma única string"""
+    return resposta if isinstance(resposta, str) else "".join(resposta)
+
+# --- FUNÇÕES AUXILIARES (PDF, etc.) ---
+def componentes_pdf(balcao, personalizacoes):
+    """[(nome, marca, cor, quantidade, preço unitário)] dos componentes, já com as personalizações"""
+    componentes = []
+    for comp in balcao.componentes:
+        # Verifica se foi personalizado
+        personalizacao = next((p for p in personalizacoes if p['componente'] == comp.nome), None)
+        if personalizacao:
+            alt = personalizacao['alternativa']
+            marca, cor = alt.marca_alternativa, alt.cor_alternativa
+            preco = comp.preco_unitario + alt.preco_diferenca
+        else:
+            marca, cor = comp.marca_padrao, comp.cor_padrao
+            preco = comp.preco_unitario
+        componentes.append((comp.nome, marca, cor, comp.quantidade, preco))
+    return componentes
+
+def dados_pdf(conversa, data=None):
+    """Extrai da conversa tudo o que o PDF precisa, em estruturas simples (serializáveis)"""
+    balcao = conversa.balcao_selecionado
+    return {
+        'nome': balcao.nome,
+        'tipo': balcao.tipo,
+        'preco_base': balcao.preco_base,
+        'data': data or datetime.now().strftime('%d/%m/%Y'),
+        'componentes': componentes_pdf(balcao, conversa.personalizacoes),
+        'personalizacoes': [
+            (p['componente'], p['alternativa'].marca_alternativa, p['alternativa'].cor_alternativa, p['preco_adicional_total'])
+            for p in conversa.personalizacoes
+        ],
+        'subtotal_padrao': balcao.calcular_preco_total(),
+        'total_personalizacoes': sum(p['preco_adicional_total'] for p in conversa.personalizacoes),
+        'total_final': conversa.calcular_orcamento_final()
+    }
+
+# Incremente ao mudar o layout: invalida os PDFs já guardados no cache
+PDF_TEMPLATE_VERSAO = 1
+
+def chave_pdf(conversa, data):
+    """Hash que identifica o conteúdo do PDF (balcão, personalizações, catálogo, layout, data).
+
+    Só o dia entra na chave, e por isso o PDF mostra só a data do orçamento
+    (antes do cache trazia também a hora da geração): o mesmo orçamento pedido
+    de novo no mesmo dia é servido do cache.
+    """
+    personalizacoes = sorted(
+        (p['componente'], p['alternativa'].marca_alternativa, p['alternativa'].cor_alternativa)
+        for p in conversa.personalizacoes
+    )
+    identidade = json.dumps(
+        [conversa.balcao_selecionado.id, personalizacoes, conversa.catalogo.versao, PDF_TEMPLATE_VERSAO, data],
+        ensure_ascii=False, separators=(',', ':')
+    )
+    return hashlib.sha256(identidade.encode('utf-8')).hexdigest()
+
+@metricas.cronometrar('architec_etapa_duracao_segundos', etapa='pdf_render')
+def renderizar_pdf(dados):
+    """Desenha o PDF do orçamento a partir de `dados_pdf` e devolve os bytes"""
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.lib.colors import HexColor
+
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=letter)
+    width, height = letter
+
+    # Cabeçalho
+    p.setFillColor(HexColor('#2E86AB'))
+    p.rect(0, height - 100, width, 100, fill=True, stroke=False)
+    
+    p.setFillColorRGB(1, 1, 1)
+    p.setFont("Helvetica-Bold", 20)
+    p.drawString(inch, height - 1.5 * inch, f"ORÇAMENTO - {dados['nome']}")
+    
+    p.setFont("Helvetica", 12)
+    p.drawString(inch, height - 1.8 * inch, f"Data: {dados['data']}")
+    p.drawString(inch, height - 2 * inch, f"Tipo: {dados['tipo'].capitalize()}")
+
+    # Componentes
+    y = height - 2.5 * inch
+    p.setFillColorRGB(0, 0, 0)
+    p.setFont("Helvetica-Bold", 12)
+    p.drawString(inch, y, "ESTRUTURA E COMPONENTES:")
+    y -= 0.3 * inch
+    p.setFont("Helvetica", 10)
+    
+    # Preço base
+    p.drawString(inch, y, f"Preço Base da Estrutura: R$ {dados['preco_base']:.2f}")
+    y -= 0.25 * inch
+
+    for nome, marca, cor, quantidade, preco in dados['componentes']:
+        p.drawString(inch, y, f"• {nome}:")
+        y -= 0.2 * inch
+        p.drawString(1.5 * inch, y, f"Marca/Cor: {marca} ({cor}) | Qtd: {quantidade} | Unitário: R$ {preco:.2f}")
+        y -= 0.2 * inch
+        p.drawString(1.5 * inch, y, f"Subtotal: R$ {preco * quantidade:.2f}")
+        y -= 0.3 * inch
+
+        if y < 150: # Adiciona nova página se estiver acabando o espaço
+            p.showPage()
+            y = height - inch
+
+    # Personalizações Aplicadas
+    if dados['personalizacoes']:
+        y -= 0.2 * inch
         p.setFont("Helvetica-Bold", 12)
-        p.drawString(inch, y, "RESUMO FINANCEIRO:")
+        p.drawString(inch, y, "PERSONALIZAÇÕES APLICADAS:")
         y -= 0.3 * inch
         p.setFont("Helvetica", 10)
         
-        subtotal_padrao = conversa.balcao_selecionado.calcular_preco_total()
-        p.drawString(inch, y, f"Subtotal Padrão: R$ {subtotal_padrao:.2f}")
-        y -= 0.2 * inch
+        for componente, marca, cor, adicional in dados['personalizacoes']:
+            p.drawString(inch, y, f"• {componente}: Alterado para {marca} ({cor})")
+            y -= 0.2 * inch
+            p.drawString(1.5 * inch, y, f"  Adicional no total: +R$ {adicional:.2f}")
+            y -= 0.3 * inch
+    
+    # Totais
+    y -= 0.2 * inch
+    p.setFont("Helvetica-Bold", 12)
+    p.drawString(inch, y, "RESUMO FINANCEIRO:")
+    y -= 0.3 * inch
+    p.setFont("Helvetica", 10)
+    
+    p.drawString(inch, y, f"Subtotal Padrão: R$ {dados['subtotal_padrao']:.2f}")
+    y -= 0.2 * inch
+    
+    if dados['personalizacoes']:
+        p.drawString(inch, y, f"Adicional Personalizações: +R$ {dados['total_personalizacoes']:.2f}")
+        y -= 0.2 * inch
+    
+    y -= 0.1 * inch
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(inch, y, f"VALOR TOTAL FINAL: R$ {dados['total_final']:.2f}")
+
+    p.save()
+    return buffer.getvalue()
+
+def gerar_pdf_balcao_final(conversa):
+    """Gera PDF com orçamento final do balcão"""
+    try:
+        return io.BytesIO(renderizar_pdf(dados_pdf(conversa)))
+    except Exception as e:
+        print(f"Erro ao gerar PDF: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+def dados_pdf_projeto(projeto, data=None):
+    """Extrai do projeto tudo o que o PDF precisa, em estruturas simples (retrato do momento do pedido)"""
+    linhas = []
+    for item in projeto.itens.values():
+        linhas.append({
+            'nome': item.balcao.nome,
+            'tipo': item.balcao.tipo,
+            'quantidade': item.quantidade,
+            'preco_base': item.balcao.preco_base,
+            'componentes': componentes_pdf(item.balcao, item.personalizacoes),
+            'personalizacoes': [
+                (p['componente'], p['alternativa'].marca_alternativa, p['alternativa'].cor_alternativa, p['preco_adicional_total'])
+                for p in item.personalizacoes
+            ],
+            'preco_unitario': item.preco_unitario,
+            'subtotal': item.centavos / 100
+        })
+    return {
+        'data': data or datetime.now().strftime('%d/%m/%Y'),
+        'linhas': linhas,
+        'unidades': projeto.unidades,
+        'total': projeto.total
+    }
+
+def chave_pdf_projeto(projeto, data):
+    """Hash que identifica o conteúdo do PDF do projeto (linhas em ordem, catálogo, layout, data)"""
+    identidade = json.dumps(
+        ['projeto', [
+            [item.balcao.id, item.quantidade, [
+                [p['componente'], p['alternativa'].marca_alternativa, p['alternativa'].cor_alternativa]
+                for p in item.personalizacoes
+            ]]
+            for item in projeto.itens.values()
+        ], projeto.catalogo.versao, PDF_TEMPLATE_VERSAO, data],
+        ensure_ascii=False, separators=(',', ':')
+    )
+    return hashlib.sha256(identidade.encode('utf-8')).hexdigest()
+
+@metricas.cronometrar('architec_etapa_duracao_segundos', etapa='pdf_render_projeto')
+def renderizar_pdf_projeto(dados, destino):
+    """Desenha o PDF do projeto a partir de `dados_pdf_projeto` no arquivo `destino`; devolve o nº de páginas.
+
+    O documento é montado página a página direto no canvas: os flowables
+    de cada linha do projeto (título + tabela dos seus componentes) só são
+    criados quando ela vai ser desenhada e são descartados em seguida, então
+    o tempo por página não cresce com o tamanho do projeto. Do documento, o
+    ReportLab só guarda o texto de cada página pronta (uns 9 KB) até gravá-lo
+    em `destino`, o que PROJETO_MAX_ITENS limita a poucos MB.
+    """
+    from reportlab.pdfgen import canvas as pdfcanvas
+    from reportlab.platypus import Paragraph, Table, TableStyle
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.lib.colors import HexColor
+    from xml.sax.saxutils import escape
+
+    width, height = letter
+    margem = 0.75 * inch
+    largura = width - 2 * margem
+    topo, base = height - 90, 0.75 * inch
+    espaco = 10  # entre os blocos de duas linhas do projeto
+
+    estilos = getSampleStyleSheet()
+    titulo_item = ParagraphStyle('TituloItem', parent=estilos['Heading4'], spaceBefore=0, spaceAfter=4)
+    texto = ParagraphStyle('Texto', parent=estilos['Normal'], fontSize=9, leading=11)
+    estilo_tabela = TableStyle([
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('BACKGROUND', (0, 0), (-1, 0), HexColor('#E8F1F6')),
+        ('LINEBELOW', (0, 0), (-1, 0), 0.5, HexColor('#2E86AB')),
+        ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('TOPPADDING', (0, 0), (-1, -1), 2),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+    ])
+    # Larguras fixas: o platypus não precisa medir o conteúdo para montar cada tabela
+    colunas = [2.1 * inch, 2.4 * inch, 0.5 * inch, 0.9 * inch, 1.0 * inch]
+
+    def blocos():
+        """Flowables de cada linha do projeto, criados sob demanda, e o resumo final"""
+        for n, linha in enumerate(dados['linhas'], 1):
+            linhas = [['Componente', 'Marca/Cor', 'Qtd', 'Unitário', 'Subtotal'],
+                      ['Estrutura (preço base)', '', '1', f"R$ {linha['preco_base']:.2f}", f"R$ {linha['preco_base']:.2f}"]]
+            for nome, marca, cor, quantidade, preco in linha['componentes']:
+                linhas.append([nome[:40], f"{marca} ({cor})"[:46], str(quantidade), f"R$ {preco:.2f}", f"R$ {preco * quantidade:.2f}"])
+            bloco = [
+                Paragraph(f"{n}. {escape(linha['nome'])} ({escape(linha['tipo'])}) — {linha['quantidade']} × "
+                          f"R$ {linha['preco_unitario']:.2f} = R$ {linha['subtotal']:.2f}", titulo_item),
+                Table(linhas, colWidths=colunas, repeatRows=1, style=estilo_tabela)
+            ]
+            if linha['personalizacoes']:
+                bloco.append(Paragraph("Personalizações por unidade: " + "; ".join(
+                    f"{escape(componente)} → {escape(marca)} ({escape(cor)}) +R$ {adicional:.2f}"
+                    for componente, marca, cor, adicional in linha['personalizacoes']
+                ), texto))
+            yield bloco
+        yield [
+            Paragraph(f"<b>RESUMO DO PROJETO:</b> {len(dados['linhas'])} itens, {dados['unidades']} unidades", estilos['Normal']),
+            Paragraph(f"<b>VALOR TOTAL DO PROJETO: R$ {dados['total']:.2f}</b>", estilos['Heading3'])
+        ]
+
+    c = pdfcanvas.Canvas(destino, pagesize=letter)
+    c.setTitle("Orçamento do projeto")
+    c.setAuthor("ArchiTec")
+    paginas = 0
+    y = None
+
+    def nova_pagina():
+        nonlocal paginas, y
+        if paginas:
+            c.showPage()
+        paginas += 1
+        c.saveState()
+        c.setFillColor(HexColor('#2E86AB'))
+        c.rect(0, height - 70, width, 70, fill=True, stroke=False)
+        c.setFillColorRGB(1, 1, 1)
+        c.setFont("Helvetica-Bold", 16)
+        c.drawString(margem, height - 40, "ORÇAMENTO DO PROJETO")
+        c.setFont("Helvetica", 10)
+        c.drawString(margem, height - 58, f"Data: {dados['data']} | {len(dados['linhas'])} itens, {dados['unidades']} unidades")
+        c.setFillColorRGB(0, 0, 0)
+        c.setFont("Helvetica", 8)
+        c.drawRightString(width - margem, 0.5 * inch, f"Página {paginas}")
+        c.restoreState()
+        y = topo
+
+    def desenhar(flowable):
+        """Desenha na posição atual, dividindo entre páginas o que não couber"""
+        nonlocal y
+        pendentes = [flowable]
+        while pendentes:
+            atual = pendentes.pop(0)
+            _, altura = atual.wrapOn(c, largura, y - base)
+            if altura <= y - base:
+                atual.drawOn(c, margem, y - altura)
+                y -= altura
+                continue
+            partes = atual.split(largura, y - base) if y - base > 0 else []
+            if len(partes) > 1:
+                pendentes[:0] = partes
+            elif y < topo:
+                nova_pagina()
+                pendentes.insert(0, atual)
+            else:
+                # Não cabe nem em uma página vazia e não se divide: desenha o que couber
+                atual.drawOn(c, margem, y - altura)
+                nova_pagina()
+
+    nova_pagina()
+    for bloco in blocos():
+        altura = sum(flowable.wrapOn(c, largura, topo - base)[1] for flowable in bloco)
+        # Um bloco que não cabe no resto da página começa na seguinte (e se divide se for maior que ela)
+        if y < topo and altura > y - base:
+            nova_pagina()
+        for flowable in bloco:
+            desenhar(flowable)
+        y -= espaco
+    c.save()
+    return paginas
+
+class CachePDF:
+    """Cache de PDFs por chave de conteúdo, em duas camadas com LRU e limite de bytes.
+
+    A camada de memória guarda os mais recentes; a de disco (um arquivo
+    por chave em `diretorio`) sobrevive a restarts e é compartilhada
+    entre workers.
+    """
+
+    def __init__(self, diretorio=PDF_CACHE_DIR, max_memoria=int(PDF_CACHE_MEMORIA_MB * 1024 * 1024),
+                 max_disco=int(PDF_CACHE_DISCO_MB * 1024 * 1024)):
+        self.diretorio = diretorio
+        self.max_memoria = max_memoria
+        self.max_disco = max_disco
+        self._memoria = OrderedDict()  # chave -> bytes
+        self._bytes_memoria = 0
+        self._disco = None  # chave -> tamanho, do menos para o mais recente
+        self._bytes_disco = 0
+        self._lock = threading.Lock()
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, f"{chave}.pdf")
+
+    def _indice_disco(self):
+        """Indexa os arquivos já existentes na primeira utilização"""
+        if self._disco is None:
+            os.makedirs(self.diretorio, exist_ok=True)
+            arquivos = []
+            for entrada in os.scandir(self.diretorio):
+                if entrada.name.endswith('.pdf'):
+                    stat = entrada.stat()
+                    arquivos.append((stat.st_mtime, entrada.name[:-4], stat.st_size))
+            self._disco = OrderedDict((chave, tamanho) for _, chave, tamanho in sorted(arquivos))
+            self._bytes_disco = sum(self._disco.values())
+        return self._disco
+
+    def obter(self, chave):
+        """Devolve ('memoria', bytes), ('disco', caminho) ou None"""
+        with self._lock:
+            conteudo = self._memoria.get(chave)
+            if conteudo is not None:
+                self._memoria.move_to_end(chave)
+                metricas.incrementar('architec_cache_total', cache='pdf', resultado='acerto_memoria')
+                return ('memoria', conteudo)
+            disco = self._indice_disco()
+        caminho = self._caminho(chave)
+        try:
+            os.utime(caminho)  # mtime marca o uso para o LRU entre restarts
+        except FileNotFoundError:
+            with self._lock:
+                if chave in disco:
+                    self._bytes_disco -= disco.pop(chave)
+            metricas.incrementar('architec_cache_total', cache='pdf', resultado='falta')
+            return None
+        with self._lock:
+            if chave in disco:
+                disco.move_to_end(chave)
+            else:
+                # Gravado por outro worker
+                disco[chave] = os.path.getsize(caminho)
+                self._bytes_disco += disco[chave]
+        metricas.incrementar('architec_cache_total', cache='pdf', resultado='acerto_disco')
+        return ('disco', caminho)
+
+    @metricas.cronometrar('architec_etapa_duracao_segundos', etapa='pdf_gravacao')
+    def guardar(self, chave, conteudo):
+        """Guarda o PDF nas duas camadas, removendo os menos usados se preciso"""
+        with self._lock:
+            disco = self._indice_disco()
+            if chave not in self._memoria and len(conteudo) <= self.max_memoria:
+                self._memoria[chave] = conteudo
+                self._bytes_memoria += len(conteudo)
+                while self._bytes_memoria > self.max_memoria:
+                    _, antigo = self._memoria.popitem(last=False)
+                    self._bytes_memoria -= len(antigo)
+        self._gravar_disco(chave, lambda f: f.write(conteudo))
+
+    def guardar_arquivo(self, chave, escrever):
+        """Como `guardar`, mas `escrever(arquivo)` grava o PDF direto no disco.
+
+        Para PDFs grandes, que não precisam passar inteiros pela memória:
+        ficam só na camada de disco e são enviados de lá em blocos.
+        """
+        with self._lock:
+            self._indice_disco()
+        self._gravar_disco(chave, escrever)
+
+    def _gravar_disco(self, chave, escrever):
+        caminho = self._caminho(chave)
+        temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporario, 'wb') as f:
+                escrever(f)
+                tamanho = f.tell()
+            os.replace(temporario, caminho)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+
+        removidos = []
+        with self._lock:
+            disco = self._disco
+            if chave in disco:
+                self._bytes_disco -= disco.pop(chave)
+            disco[chave] = tamanho
+            self._bytes_disco += tamanho
+            while self._bytes_disco > self.max_disco and len(disco) > 1:
+                antigo, tamanho = disco.popitem(last=False)
+                self._bytes_disco -= tamanho
+                removidos.append(antigo)
+        for antigo in removidos:
+            try:
+                os.remove(self._caminho(antigo))
+            except FileNotFoundError:
+                pass
+
+    def ocupacao(self):
+        """Bytes ocupados em cada camada"""
+        with self._lock:
+            return {'memoria': self._bytes_memoria, 'disco': self._bytes_disco}
+
+cache_pdf = CachePDF()
+
+# --- GERAÇÃO DE PDF EM SEGUNDO PLANO ---
+class GerenciadorPDF:
+    """Fila limitada de geração de PDFs executada por um pool de threads.
+
+    O /chat só enfileira o trabalho e responde; o download espera o job
+    (ou informa o andamento) em vez de prender o worker do chat.
+    """
+    MAX_JOBS_GUARDADOS = 1000
+
+    def __init__(self, max_workers=PDF_WORKERS, max_pendentes=PDF_MAX_PENDENTES):
+        self.max_workers = max_workers
+        self._vagas = threading.BoundedSemaphore(max_pendentes)
+        self._executor = None
+        self._pid = None
+        self._jobs = OrderedDict()  # job_id -> job
+        self._por_sessao = {}  # (session_id, tipo) -> job_id
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Criado sob demanda e recriado após fork (threads não sobrevivem ao fork)
+        if self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='pdf')
+            self._pid = os.getpid()
+        return self._executor
+
+    def enviar(self, session_id, conversa):
+        """Enfileira o PDF da conversa; devolve o job ou None se a fila estiver cheia"""
+        if not self._vagas.acquire(blocking=False):
+            return None
+        data = datetime.now().strftime('%d/%m/%Y')
+        chave = chave_pdf(conversa, data)
+        conversa.pdf_chave = chave
+        return self._enfileirar(
+            session_id, 'orcamento', chave, f"/download/pdf/{session_id}",
+            lambda dados: cache_pdf.guardar(chave, renderizar_pdf(dados)), lambda: dados_pdf(conversa, data)
+        )
+
+    def enviar_projeto(self, session_id, projeto):
+        """Enfileira o PDF do projeto da sessão; devolve o job ou None se a fila estiver cheia.
+
+        Um job do mesmo conteúdo ainda em andamento (ou concluído) é reaproveitado.
+        """
+        data = datetime.now().strftime('%d/%m/%Y')
+        chave = chave_pdf_projeto(projeto, data)
+        anterior = self.job_da_sessao(session_id, 'projeto')
+        if anterior is not None and anterior['chave'] == chave and anterior['status'] in ('na_fila', 'gerando'):
+            return anterior
+        if not self._vagas.acquire(blocking=False):
+            return None
+        return self._enfileirar(
+            session_id, 'projeto', chave, projeto.link_pdf(session_id),
+            # Gravado direto no disco do cache, página a página, e enviado de lá
+            lambda dados: cache_pdf.guardar_arquivo(chave, lambda arquivo: renderizar_pdf_projeto(dados, arquivo)),
+            lambda: dados_pdf_projeto(projeto, data)
+        )
+
+    def _enfileirar(self, session_id, tipo, chave, pdf_url, gerar, obter_dados):
+        """Registra o job (a vaga já foi reservada) e o envia ao pool, a menos que o PDF já esteja no cache"""
+        job = {
+            'id': uuid.uuid4().hex,
+            'session_id': session_id,
+            'tipo': tipo,
+            'chave': chave,
+            'pdf_url': pdf_url,
+            'status': 'na_fila',
+            'criado_em': time.time(),
+            'erro': None,
+            'future': None
+        }
+        try:
+            with self._lock:
+                self._jobs[job['id']] = job
+                self._por_sessao[(session_id, tipo)] = job['id']
+                while len(self._jobs) > self.MAX_JOBS_GUARDADOS:
+                    _, antigo = self._jobs.popitem(last=False)
+                    if self._por_sessao.get((antigo['session_id'], antigo['tipo'])) == antigo['id']:
+                        del self._por_sessao[(antigo['session_id'], antigo['tipo'])]
+            if cache_pdf.obter(job['chave']):
+                # Configuração idêntica já renderizada: nada a fazer
+                job['status'] = 'concluido'
+                job['future'] = Future()
+                job['future'].set_result(None)
+                self._vagas.release()
+            else:
+                # Os dados são extraídos agora: mudanças posteriores na sessão não entram neste PDF
+                job['future'] = self._pool().submit(self._executar, job, gerar, obter_dados())
+        except Exception:
+            self._vagas.release()
+            raise
+        return job
+
+    def _executar(self, job, gerar, dados):
+        try:
+            job['status'] = 'gerando'
+            gerar(dados)  # renderiza e guarda no cache_pdf sob job['chave']
+            job['status'] = 'concluido'
+        except Exception as e:
+            print(f"Erro ao gerar PDF: {e}")
+            job['status'] = 'erro'
+            job['erro'] = str(e)
+        finally:
+            self._vagas.release()
+
+    def obter(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def contagem_por_status(self):
+        """{status: quantidade} dos jobs guardados"""
+        contagem = defaultdict(int)
+        with self._lock:
+            for job in self._jobs.values():
+                contagem[job['status']] += 1
+        return dict(contagem)
+
+    def job_da_sessao(self, session_id, tipo='orcamento'):
+        with self._lock:
+            return self._jobs.get(self._por_sessao.get((session_id, tipo)))
+
+    def aguardar(self, job, timeout):
+        """Espera o job terminar (até `timeout` segundos); devolve True se terminou"""
+        try:
+            job['future'].result(timeout=timeout)
+        except FuturesTimeoutError:
+            return False
+        return True
+
+    def posicao_na_fila(self, job):
+        with self._lock:
+            return sum(
+                1 for j in self._jobs.values()
+                if j['status'] == 'na_fila' and j['criado_em'] < job['criado_em']
+            )
+
+    def status(self, job):
+        """Resumo do job para o cliente"""
+        resposta = {
+            "job_id": job['id'],
+            "status": job['status'],
+            "pdf_url": job['pdf_url']
+        }
+        if job['status'] == 'na_fila':
+            resposta["posicao_na_fila"] = self.posicao_na_fila(job)
+        if job['erro']:
+            resposta["erro"] = job['erro']
+        return resposta
+
+gerenciador_pdf = GerenciadorPDF()
+
+# --- EXPORTAÇÃO DE PDFS EM LOTE ---
+def conversa_da_configuracao(configuracao, catalogo):
+    """ConversaBalcao finalizada com o balcão e as personalizações de uma
+    configuração (formato de /quotes/batch); ValueError se inválida"""
+    tabela = catalogo.tabela_precos([configuracao])
+    linha, _ = tabela.resolver(configuracao)
+    conversa = ConversaBalcao(catalogo)
+    conversa.balcao_selecionado = catalogo.balcoes[tabela.ids[linha]]
+    for componente, marca, cor in personalizacoes_configuracao(configuracao):
+        comp, alt = alternativa_por_nome(conversa.balcao_selecionado, componente, marca, cor)
+        if alt is not None:
+            conversa.aplicar_personalizacao(comp.nome, alt)
+    conversa.estado = ESTADOS['ORCAMENTO_FINALIZADO']
+    conversa.calcular_orcamento_final()
+    return conversa
+
+def nome_arquivo_zip(texto, vistos):
+    """Nome seguro e único (dentro do ZIP) para o PDF de uma sessão/configuração"""
+    base = re.sub(r'[^A-Za-z0-9_.-]+', '_', str(texto)).strip('._')[:80] or 'orcamento'
+    nome, n = f"orcamento_{base}.pdf", 1
+    while nome in vistos:
+        n += 1
+        nome = f"orcamento_{base}_{n}.pdf"
+    vistos.add(nome)
+    return nome
+
+def itens_lote_pdf(sessoes=(), configuracoes=(), catalogo=None):
+    """([(nome do arquivo, conversa)], [(referência, erro)]) de um pedido de exportação"""
+    catalogo = catalogo or sistema_balcoes
+    itens, erros, vistos = [], [], set()
+    for session_id in sessoes:
+        try:
+            conversa = conversas.obter(str(session_id))
+        except CatalogoIndisponivel as e:
+            erros.append((session_id, str(e)))
+            continue
+        if conversa is None or conversa.balcao_selecionado is None:
+            erros.append((session_id, "Sessão não encontrada"))
+        elif conversa.estado != ESTADOS['ORCAMENTO_FINALIZADO']:
+            erros.append((session_id, "Orçamento não finalizado"))
+        else:
+            itens.append((nome_arquivo_zip(session_id, vistos), conversa))
+    for n, configuracao in enumerate(configuracoes, 1):
+        referencia = configuracao.get('referencia') if isinstance(configuracao, dict) else None
+        referencia = n if referencia in (None, '') else referencia
+        try:
+            itens.append((nome_arquivo_zip(referencia, vistos), conversa_da_configuracao(configuracao, catalogo)))
+        except (ValueError, TypeError, AttributeError) as e:
+            erros.append((referencia, str(e) if isinstance(e, ValueError) else "Configuração inválida"))
+    return itens, erros
+
+def renderizar_pdfs_processo(lista_dados):
+    """renderizar_pdf num processo do pool, para um grupo de PDFs; devolve [(bytes, segundos)]"""
+    resultados = []
+    for dados in lista_dados:
+        inicio = time.perf_counter()
+        conteudo = renderizar_pdf(dados)
+        resultados.append((conteudo, time.perf_counter() - inicio))
+    return resultados
+
+class SaidaZip:
+    """Destino sem seek do ZipFile: guarda os bytes escritos até o gerador retirá-los"""
+    def __init__(self):
+        self._partes = []
+    
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+    
+    def flush(self):
+        pass
+    
+    def retirar(self):
+        dados = b''.join(self._partes)
+        self._partes.clear()
+        return dados
+
+class ExportadorPDF:
+    """Renderiza muitos PDFs em um pool de processos e os entrega em um ZIP em streaming.
+
+    O ReportLab é CPU puro e segura o GIL, então só processos escalam com
+    os núcleos. Cada tarefa leva `por_tarefa` PDFs (menos idas e voltas
+    entre processos) e seus PDFs entram no ZIP assim que ela termina, fora
+    de ordem; no máximo duas tarefas por processo ficam em memória. Os que
+    já estão no CachePDF não são renderizados de novo. Os processos partem
+    do forkserver (ou spawn), sem herdar as threads do worker web.
+    """
+    
+    def __init__(self, processos=PDF_LOTE_PROCESSOS, por_tarefa=4):
+        self.processos = processos or os.cpu_count() or 1
+        self.por_tarefa = por_tarefa
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+    
+    def _pool(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                metodos = multiprocessing.get_all_start_methods()
+                contexto = multiprocessing.get_context('forkserver' if 'forkserver' in metodos else 'spawn')
+                self._executor = ProcessPoolExecutor(self.processos, mp_context=contexto)
+                self._pid = os.getpid()
+            return self._executor
+    
+    def _descartar_pool(self):
+        # Um processo que morreu quebra o pool inteiro: o próximo lote cria outro
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._pid = None
+    
+    def zip(self, itens, erros=()):
+        """Gera os pedaços do ZIP: um PDF por (nome, conversa) e, se houver falhas, um erros.csv"""
+        data = datetime.now().strftime('%d/%m/%Y')
+        erros = list(erros)
+        pendentes = {}  # future -> nomes dos arquivos da tarefa
+        grupo_nomes, grupo_dados = [], []
+        fila = iter(itens)
+        saida = SaidaZip()
+        pool = self._pool()
+        try:
+            # PDFs já são comprimidos: ZIP_STORED só empacota
+            with zipfile.ZipFile(saida, 'w', compression=zipfile.ZIP_STORED) as arquivo_zip:
+                while True:
+                    while len(pendentes) < 2 * self.processos:
+                        item = next(fila, None)
+                        if item is not None:
+                            nome, conversa = item
+                            encontrado = cache_pdf.obter(chave_pdf(conversa, data))
+                            if encontrado is not None:
+                                camada, conteudo = encontrado
+                                if camada == 'disco':
+                                    arquivo_zip.write(conteudo, nome)
+                                else:
+                                    arquivo_zip.writestr(nome, conteudo)
+                                yield saida.retirar()
+                                continue
+                            grupo_nomes.append(nome)
+                            grupo_dados.append(dados_pdf(conversa, data))
+                        if grupo_nomes and (item is None or len(grupo_nomes) == self.por_tarefa):
+                            pendentes[pool.submit(renderizar_pdfs_processo, grupo_dados)] = grupo_nomes
+                            grupo_nomes, grupo_dados = [], []
+                        if item is None:
+                            break
+                    if not pendentes:
+                        break
+                    prontos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+                    for future in prontos:
+                        nomes = pendentes.pop(future)
+                        try:
+                            resultados = future.result()
+                        except Exception as e:
+                            print(f"Erro ao gerar PDFs em lote ({', '.join(nomes)}): {e}")
+                            erros.extend((nome, str(e) or type(e).__name__) for nome in nomes)
+                            if isinstance(e, BrokenExecutor) and pool is self._executor:
+                                self._descartar_pool()
+                                pool = self._pool()
+                            continue
+                        for nome, (conteudo, duracao) in zip(nomes, resultados):
+                            metricas.observar('architec_etapa_duracao_segundos', duracao, etapa='pdf_render')
+                            arquivo_zip.writestr(nome, conteudo)
+                    yield saida.retirar()
+                if erros:
+                    texto = io.StringIO()
+                    escritor = csv.writer(texto)
+                    escritor.writerow(['referencia', 'erro'])
+                    escritor.writerows(erros)
+                    arquivo_zip.writestr('erros.csv', texto.getvalue())
+            yield saida.retirar()
+        except Exception:
+            self._descartar_pool()
+            raise
+        finally:
+            # Cliente desconectou no meio: não renderiza o resto
+            for future in pendentes:
+                future.cancel()
+
+exportador_pdf = ExportadorPDF()
+
+# --- INTERPRETAÇÃO COM IA (GLM) ---
+class ErroLLM(Exception):
+    """Falha ao obter resposta do GLM (timeout, rede, HTTP ou circuito aberto)"""
+
+class LLMNaoConfigurado(ErroLLM):
+    """GLM_API_KEY não definida: nenhuma chamada é feita e o disjuntor não é afetado"""
+
+class CircuitoAberto(ErroLLM):
+    """O disjuntor está aberto: o GLM falhou demais recentemente"""
+
+class DisjuntorLLM:
+    """Circuit breaker: após N falhas seguidas, recusa chamadas por um tempo.
+
+    Passado esse tempo, deixa uma chamada de teste passar (meio-aberto);
+    se ela funcionar o circuito fecha, senão volta a abrir.
+    """
+
+    def __init__(self, falhas_para_abrir=GLM_FALHAS_PARA_ABRIR, tempo_aberto=GLM_TEMPO_CIRCUITO_ABERTO):
+        self.falhas_para_abrir = falhas_para_abrir
+        self.tempo_aberto = tempo_aberto
+        self.falhas = 0
+        self.aberto_ate = 0.0
+        self._teste_em_andamento = False
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self):
+        if self.falhas < self.falhas_para_abrir:
+            return 'fechado'
+        return 'aberto' if time.monotonic() < self.aberto_ate else 'meio_aberto'
+
+    def permitir(self):
+        """Indica se uma chamada pode ser feita agora"""
+        with self._lock:
+            estado = self.estado
+            if estado == 'fechado':
+                return True
+            if estado == 'meio_aberto' and not self._teste_em_andamento:
+                self._teste_em_andamento = True
+                return True
+            return False
+
+    def disponivel(self):
+        """Como `permitir`, mas sem consumir a chamada de teste"""
+        return self.estado != 'aberto'
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self.falhas = 0
+            self._teste_em_andamento = False
+
+    def registrar_falha(self):
+        with self._lock:
+            self.falhas += 1
+            self._teste_em_andamento = False
+            if self.falhas >= self.falhas_para_abrir:
+                self.aberto_ate = time.monotonic() + self.tempo_aberto
+
+def motivo_falha_llm(erro):
+    """Categoria da falha do GLM para as métricas"""
+    if isinstance(erro, asyncio.TimeoutError):
+        return 'prazo'
+    if isinstance(erro, httpx.HTTPStatusError):
+        return f"http_{erro.response.status_code}"
+    if isinstance(erro, httpx.HTTPError):
+        return 'conexao'
+    return 'resposta_invalida'
+
+def registrar_uso_tokens(finalidade, uso, duracao):
+    """Loga e contabiliza os tokens de prompt e de resposta informados pelo GLM"""
+    prompt = uso.get("prompt_tokens")
+    resposta = uso.get("completion_tokens")
+    if prompt is not None:
+        metricas.incrementar('architec_llm_tokens_total', prompt, finalidade=finalidade, tipo='prompt')
+    if resposta is not None:
+        metricas.incrementar('architec_llm_tokens_total', resposta, finalidade=finalidade, tipo='resposta')
+    print(f"🧮 GLM ({finalidade}): {prompt if prompt is not None else '?'} tokens de prompt, "
+          f"{resposta if resposta is not None else '?'} de resposta em {duracao * 1000:.0f} ms")
+
+class GatewayLLM:
+    """Cliente assíncrono do GLM com pool de conexões HTTP, prazo por chamada,
+    limite de concorrência e disjuntor.
+
+    Views assíncronas (ou um deploy ASGI) usam `await completar(...)`; as
+    views síncronas do Flask usam `completar_sync`, que roda a corrotina no
+    event loop próprio do gateway sem ocupar o worker além do prazo.
+    """
+
+    def __init__(self, api_key=GLM_API_KEY, base_url=GLM_BASE_URL, timeout=GLM_TIMEOUT,
+                 max_concorrencia=GLM_MAX_CONCORRENCIA, disjuntor=None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_concorrencia = max_concorrencia
+        self.disjuntor = disjuntor or DisjuntorLLM()
+        self._recursos = weakref.WeakKeyDictionary()  # event loop -> (cliente httpx, semáforo)
+        self._loop = None
+        self._pid_loop = None
+        self._lock = threading.Lock()
+
+    def configurado(self):
+        return bool(self.api_key)
+
+    def disponivel(self):
+        """Há chave configurada e o circuito não está aberto"""
+        return self.configurado() and self.disjuntor.disponivel()
+
+    def _recursos_do_loop(self):
+        loop = asyncio.get_running_loop()
+        recursos = self._recursos.get(loop)
+        if recursos is None:
+            cliente = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concorrencia,
+                    max_keepalive_connections=self.max_concorrencia
+                )
+            )
+            recursos = (cliente, asyncio.Semaphore(self.max_concorrencia))
+            self._recursos[loop] = recursos
+        return recursos
+
+    async def _postar(self, corpo):
+        cliente, semaforo = self._recursos_do_loop()
+        async with semaforo:
+            return await cliente.post("/chat/completions", json=corpo)
+
+    async def completar(self, messages, model=GLM_MODELO, max_tokens=150, temperature=0.1, timeout=None,
+                        formato_json=False, finalidade='outro'):
+        """Chama /chat/completions; devolve {'conteudo': str, 'uso': dict}
+
+        `formato_json` pede saída estruturada (response_format json_object);
+        `finalidade` rotula o log e as métricas de tokens da chamada.
+        """
+        if not self.configurado():
+            raise LLMNaoConfigurado("GLM_API_KEY não configurada")
+        if not self.disjuntor.permitir():
+            metricas.incrementar('architec_llm_chamadas_total', resultado='recusada')
+            metricas.incrementar('architec_llm_falhas_total', motivo='circuito_aberto')
+            raise CircuitoAberto("GLM temporariamente indisponível")
+
+        corpo = {
+            "model": model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature
+        }
+        if formato_json:
+            corpo["response_format"] = {"type": "json_object"}
+        inicio = time.perf_counter()
+        try:
+            # O prazo inclui a espera por uma vaga no semáforo
+            resposta = await asyncio.wait_for(self._postar(corpo), timeout or self.timeout)
+            resposta.raise_for_status()
+            dados = resposta.json()
+            conteudo = dados["choices"][0]["message"]["content"]
+            uso = dados.get("usage") or {}
+        except (asyncio.TimeoutError, httpx.HTTPError, KeyError, IndexError, ValueError) as e:
+            self.disjuntor.registrar_falha()
+            metricas.observar('architec_etapa_duracao_segundos', time.perf_counter() - inicio, etapa='llm')
+            metricas.incrementar('architec_llm_chamadas_total', resultado='falha')
+            metricas.incrementar('architec_llm_falhas_total', motivo=motivo_falha_llm(e))
+            raise ErroLLM(f"{type(e).__name__}: {e}") from e
+        self.disjuntor.registrar_sucesso()
+        duracao = time.perf_counter() - inicio
+        metricas.observar('architec_etapa_duracao_segundos', duracao, etapa='llm')
+        metricas.incrementar('architec_llm_chamadas_total', resultado='sucesso')
+        registrar_uso_tokens(finalidade, uso, duracao)
+        return {"conteudo": conteudo, "uso": uso}
+
+    def _event_loop(self):
+        """Event loop dedicado do gateway, em uma thread (recriado após fork)"""
+        with self._lock:
+            if self._pid_loop != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._pid_loop = os.getpid()
+                threading.Thread(target=self._loop.run_forever, name='glm-gateway', daemon=True).start()
+            return self._loop
+
+    def completar_sync(self, messages, **kwargs):
+        """Versão bloqueante de `completar`, para views síncronas"""
+        if not self.configurado():
+            raise LLMNaoConfigurado("GLM_API_KEY não configurada")
+        if not self.disjuntor.disponivel():
+            raise CircuitoAberto("GLM temporariamente indisponível")
+        future = asyncio.run_coroutine_threadsafe(self.completar(messages, **kwargs), self._event_loop())
+        prazo = kwargs.get('timeout') or self.timeout
+        try:
+            return future.result(timeout=prazo + 1)
+        except FuturesTimeoutError:
+            future.cancel()
+            raise ErroLLM("Tempo esgotado aguardando o GLM")
+
+gateway_llm = GatewayLLM()
+if gateway_llm.configurado():
+    print(f" Gateway GLM configurado ({GLM_BASE_URL})")
+else:
+    print(" GLM_API_KEY não definida: personalizações só serão interpretadas localmente")
+
+# Muda quando o formato da resposta muda, para não reaproveitar respostas antigas do cache
+FORMATO_PROMPT_PERSONALIZACAO = 2
+SISTEMA_PERSONALIZACAO = "Você identifica pedidos de personalização de móveis e responde apenas com JSON."
+
+def numerado(itens, numero):
+    """Item de numeração 1..n (None se o número não existir)"""
+    try:
+        numero = int(numero)
+    except (TypeError, ValueError):
+        return None
+    return itens[numero - 1] if 1 <= numero <= len(itens) else None
+
+class EsquemaPersonalizacao:
+    """Opções de personalização de um balcão, numeradas, e o prompt já montado.
+
+    O GLM escolhe números ({"c": 2, "a": 1}) em vez de escrever marca e cor,
+    que antes precisavam casar exatamente com o catálogo. Componentes sem
+    alternativas ficam de fora e marca/cor repetidas aparecem uma vez só.
+    Criado uma vez por balcão, ou seja, por versão do catálogo.
+    """
+    def __init__(self, balcao):
+        self.opcoes = []  # [(componente, [alternativas])], na ordem numerada
+        vistos = set()
+        for comp in balcao.componentes:
+            if not comp.alternativas or comp.nome in vistos:
+                continue  # personalizações valem por nome de componente
+            vistos.add(comp.nome)
+            alternativas = {}
+            for alt in comp.alternativas:
+                alternativas.setdefault((alt.marca_alternativa.strip().lower(), alt.cor_alternativa.strip().lower()), alt)
+            self.opcoes.append((comp, list(alternativas.values())))
+
+        linhas = [
+            f"{c} {comp.nome}: " + "; ".join(
+                f"{a}={alt.marca_alternativa.strip()}/{alt.cor_alternativa.strip()}" for a, alt in enumerate(alternativas, 1)
+            )
+            for c, (comp, alternativas) in enumerate(self.opcoes, 1)
+        ]
+        # Só o pedido do cliente muda entre chamadas, e ele vai no fim
+        self.prompt = (
+            f'Balcão "{balcao.nome}". Opções por componente (nº componente: nº opção=marca/cor):\n'
+            + "\n".join(linhas)
+            + '\nResponda {"c": nº do componente, "a": nº da opção}, ou {"c": null} se o pedido não corresponder a nenhuma opção.'
+        )
+
+    def resolver(self, escolha):
+        """(Componente, Alternativa) da resposta do GLM; None onde o número não existe"""
+        opcao = numerado(self.opcoes, escolha.get("c")) if isinstance(escolha, dict) else None
+        if opcao is None:
+            return None, None
+        componente, alternativas = opcao
+        return componente, numerado(alternativas, escolha.get("a"))
+
+def mensagens_personalizacao(balcao, user_message):
+    """Monta as mensagens do prompt de personalização"""
+    return [
+        {"role": "system", "content": SISTEMA_PERSONALIZACAO},
+        {"role": "user", "content": f'{balcao.esquema_personalizacao.prompt}\nPedido: "{user_message}"'}
+    ]
+
+@metricas.cronometrar('architec_etapa_duracao_segundos', etapa='extracao_json')
+def extrair_json_resposta(resposta_texto):
+    """Extrai o primeiro objeto JSON do texto devolvido pela IA (ou None)"""
+    print(f"Resposta da IA para personalização: {resposta_texto}")
+    json_match = re.search(r'\{.*\}', resposta_texto.strip(), re.DOTALL)
+    if json_match:
+        return json.loads(json_match.group())
+    return None
+
+# {"c": 12, "a": 3} cabe com folga
+MAX_TOKENS_PERSONALIZACAO = 24
+
+def interpretar_personalizacao_llm(balcao, user_message):
+    """Pede ao GLM a personalização desejada; devolve o JSON da resposta ({"c": .., "a": ..}) ou None"""
+    resultado = gateway_llm.completar_sync(
+        mensagens_personalizacao(balcao, user_message),
+        max_tokens=MAX_TOKENS_PERSONALIZACAO, formato_json=True, finalidade='personalizacao'
+    )
+    return extrair_json_resposta(resultado["conteudo"])
+
+def chave_cache_llm(balcao_id, versao_catalogo, mensagem):
+    """Chave do cache de respostas da IA: balcão, versão do catálogo e mensagem normalizada"""
+    mensagem_normalizada = ' '.join(re.findall(r'[a-z0-9]+', normalizar_texto(mensagem)))
+    return f"{balcao_id}|{versao_catalogo}|{mensagem_normalizada}"
+
+class CacheLLM:
+    """Cache LRU+TTL das respostas da IA, com camada SQLite opcional e coalescência.
+
+    Várias requisições simultâneas com a mesma chave disparam uma única
+    chamada: a primeira calcula e as demais esperam o mesmo resultado.
+    """
+
+    def __init__(self, max_itens=LLM_CACHE_MAX, ttl=LLM_CACHE_TTL, caminho_db=LLM_CACHE_DB):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self.caminho_db = caminho_db
+        self._itens = OrderedDict()  # chave -> (valor, expira_em)
+        self._em_andamento = {}  # chave -> Future
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.estatisticas = {'acertos': 0, 'acertos_sqlite': 0, 'faltas': 0, 'coalescidas': 0}
+        if caminho_db:
+            self._conexao().execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    chave TEXT PRIMARY KEY,
+                    valor TEXT NOT NULL,
+                    expira_em REAL NOT NULL
+                )
+            """)
+
+    def _conexao(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.caminho_db, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _ler_memoria(self, chave):
+        item = self._itens.get(chave)
+        if item is None:
+            return None
+        if item[1] < time.time():
+            del self._itens[chave]
+            return None
+        self._itens.move_to_end(chave)
+        return item
+
+    def _guardar_memoria(self, chave, valor, expira_em):
+        self._itens[chave] = (valor, expira_em)
+        self._itens.move_to_end(chave)
+        while len(self._itens) > self.max_itens:
+            self._itens.popitem(last=False)
+
+    def _ler_sqlite(self, chave):
+        if not self.caminho_db:
+            return None
+        linha = self._conexao().execute(
+            "SELECT valor, expira_em FROM llm_cache WHERE chave = ? AND expira_em >= ?", (chave, time.time())
+        ).fetchone()
+        return (json.loads(linha[0]), linha[1]) if linha else None
+
+    def _gravar_sqlite(self, chave, valor, expira_em):
+        if self.caminho_db:
+            self._conexao().execute(
+                "INSERT OR REPLACE INTO llm_cache (chave, valor, expira_em) VALUES (?, ?, ?)",
+                (chave, json.dumps(valor, ensure_ascii=False), expira_em)
+            )
+
+    def obter_ou_calcular(self, chave, calcular):
+        """Devolve o valor em cache ou executa `calcular()` uma única vez por chave"""
+        with self._lock:
+            item = self._ler_memoria(chave)
+            if item is not None:
+                self.estatisticas['acertos'] += 1
+                return item[0]
+            future = self._em_andamento.get(chave)
+            if future is not None:
+                self.estatisticas['coalescidas'] += 1
+                dono = False
+            else:
+                future = Future()
+                self._em_andamento[chave] = future
+                dono = True
+
+        if not dono:
+            return future.result()
+
+        try:
+            item = self._ler_sqlite(chave)
+            if item is not None:
+                valor, expira_em = item
+                with self._lock:
+                    self.estatisticas['acertos_sqlite'] += 1
+            else:
+                with self._lock:
+                    self.estatisticas['faltas'] += 1
+                valor = calcular()
+                expira_em = time.time() + self.ttl
+                self._gravar_sqlite(chave, valor, expira_em)
+            with self._lock:
+                self._guardar_memoria(chave, valor, expira_em)
+            future.set_result(valor)
+            return valor
+        except BaseException as e:
+            # Erros não ficam em cache; quem estava esperando recebe a mesma exceção
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._em_andamento.pop(chave, None)
+
+    def resumo(self):
+        with self._lock:
+            valores = dict(self.estatisticas)
+            valores['itens'] = len(self._itens)
+        consultas = valores['acertos'] + valores['acertos_sqlite'] + valores['faltas'] + valores['coalescidas']
+        valores['taxa_acerto'] = round((consultas - valores['faltas']) / consultas, 4) if consultas else None
+        return valores
+
+cache_llm = CacheLLM()
+
+# Armazenamento de conversas (usará a nova classe)
+conversas = criar_armazem_sessoes()
+
+# Catálogo publicado; carregado uma vez por processo em iniciar_catalogo()
+sistema_balcoes = None
+
+# --- EXTRAÇÃO DE VÁRIOS PRODUTOS ---
+NUMEROS_POR_EXTENSO = {
+    'um': 1, 'uma': 1, 'dois': 2, 'duas': 2, 'tres': 3, 'quatro': 4, 'cinco': 5,
+    'seis': 6, 'sete': 7, 'oito': 8, 'nove': 9, 'dez': 10, 'doze': 12, 'vinte': 20
+}
+# Palavras que indicam o início de um novo item (e não a continuação de uma personalização)
+PALAVRAS_ITEM = {'balcao', 'balcoes', 'inferior', 'inferiores', 'superior', 'superiores', 'armario', 'armarios', 'aereo'}
+# Componentes que podem abrir uma nova personalização ("... e dobradiça fgv")
+PALAVRAS_COMPONENTE = {
+    'porta', 'portas', 'frente', 'frentes', 'dobradica', 'dobradicas', 'puxador', 'puxadores', 'pegador', 'pegadores',
+    'prateleira', 'prateleiras', 'divisoria', 'divisorias', 'divisor', 'ripa', 'ripas', 'protetor', 'protetores',
+    'corredica', 'corredicas', 'trilho', 'gaveta', 'gavetas', 'rodizio', 'rodizios', 'rodinha', 'rodinhas'
+}
+# Vírgulas sempre separam; "e", "mais" e "também" só quando vem uma quantidade, um balcão ou um
+# componente ("puxador preto e branco" é uma cor só, não dois itens)
+SEPARADOR_ITENS = re.compile(
+    r'\s*(?:[,;\n+]|\b(?:e(?:\s+(?:mais|tambem))?|mais|tambem)\b(?=\s+(?:(?:o|a|os|as|com)\s+)?(?:\d|(?:'
+    + '|'.join(sorted(set(NUMEROS_POR_EXTENSO) | PALAVRAS_ITEM | PALAVRAS_COMPONENTE)) + r')\b)))\s*'
+)
+QUANTIDADE_INICIAL = re.compile(r'^(\d+|(?:' + '|'.join(NUMEROS_POR_EXTENSO) + r')\b)\s*(?:x\b|unidades?\b|de\b)?\s*(.*)$')
+EXTRACAO_MAX_CANDIDATOS = 5
+
+def quantidade_item(texto):
+    """Quantidade citada no início de um item, por extenso ou em algarismos"""
+    if texto in NUMEROS_POR_EXTENSO:
+        return NUMEROS_POR_EXTENSO[texto]
+    digitos = texto.lstrip('0')
+    # Números enormes nem são convertidos: basta saber que passam do máximo
+    return int(digitos or 0) if len(digitos) <= len(str(EXTRACAO_QUANTIDADE_MAX)) else EXTRACAO_QUANTIDADE_MAX + 1
+
+def quebrar_itens(mensagem):
+    """Divide a mensagem em itens: [{'trecho', 'quantidade', 'texto', 'personalizacoes'}].
+
+    Fragmentos sem quantidade e sem menção a balcão ("e puxador zen") são
+    tratados como personalizações do item anterior.
+    """
+    itens = []
+    for fragmento in SEPARADOR_ITENS.split(normalizar_texto(mensagem)):
+        fragmento = fragmento.strip(' .!?')
+        if not fragmento:
+            continue
+        quantidade = QUANTIDADE_INICIAL.match(fragmento)
+        palavras = set(re.findall(r'[a-z]+', fragmento))
+        if quantidade or palavras & PALAVRAS_ITEM or not itens:
+            texto = quantidade.group(2) if quantidade else fragmento
+            texto, _, personalizacao = texto.partition(' com ')
+            itens.append({
+                'trecho': fragmento,
+                'quantidade': max(1, quantidade_item(quantidade.group(1))) if quantidade else 1,
+                'texto': texto.strip(),
+                'personalizacoes': [personalizacao.strip()] if personalizacao.strip() else []
+            })
+        else:
+            itens[-1]['trecho'] += f", {fragmento}"
+            itens[-1]['personalizacoes'].append(fragmento)
+    return itens
+
+def resolver_item_local(item, catalogo):
+    """Tenta casar o item com o catálogo sem IA; devolve True se balcão e personalizações foram resolvidos"""
+    palavras = set(re.findall(r'[a-z]+', item['texto']))
+    tipo = 'inferior' if palavras & {'inferior', 'inferiores'} else 'superior' if palavras & {'superior', 'superiores', 'aereo'} else None
+    item['tipo'] = tipo
+    item['balcao'] = catalogo.buscar_balcao_destacado(item['texto'], tipo=tipo) if item['texto'] else None
+    if item['balcao'] is None and tipo:
+        opcoes = catalogo.buscar_balcoes_por_tipo(tipo)
+        item['balcao'] = opcoes[0] if len(opcoes) == 1 else None
+    item['escolhas'] = []
+    item['pendentes'] = list(item['personalizacoes'])
+    if item['balcao'] is None:
+        return False
+
+    interpretador = item['balcao'].interpretador
+    item['pendentes'] = []
+    for texto in item['personalizacoes']:
+        interpretacao = interpretador.interpretar(texto) if interpretador else None
+        if not interpretacao or interpretacao.confianca < LIMIAR_CONFIANCA_LOCAL:
+            item['pendentes'].append(texto)
+            continue
+        item['escolhas'].append((
+            interpretacao.componente.nome,
+            interpretacao.alternativa.marca_alternativa,
+            interpretacao.alternativa.cor_alternativa
+        ))
+    return not item['pendentes']
+
+def candidatos_item(item, catalogo):
+    """Balcões plausíveis para um item que a busca local não resolveu sozinha"""
+    if item.get('balcao') is not None:
+        return [item['balcao']]
+    candidatos = [b for b, _ in catalogo.buscar_balcoes(item['texto'] or item['trecho'], tipo=item['tipo'], limite=EXTRACAO_MAX_CANDIDATOS)]
+    if not candidatos and item['tipo']:
+        candidatos = catalogo.buscar_balcoes_por_tipo(item['tipo'])[:EXTRACAO_MAX_CANDIDATOS]
+    return candidatos
+
+def mensagens_extracao(itens):
+    """Prompt único para todos os itens que sobraram, com os candidatos de cada um"""
+    blocos = []
+    for numero, item in enumerate(itens, 1):
+        linhas = [f'Item {numero}: "{item["trecho"]}"']
+        for balcao in item['candidatos']:
+            linhas.append(f"  - balcao_id {balcao.id}: {balcao.nome} ({balcao.tipo})")
+            if item['personalizacoes']:
+                for comp in balcao.componentes:
+                    if comp.alternativas:
+                        opcoes = "; ".join(f"{a.marca_alternativa.strip()} / {a.cor_alternativa}" for a in comp.alternativas)
+                        linhas.append(f"      {comp.nome}: {opcoes}")
+        blocos.append("\n".join(linhas))
+
+    prompt_ia = f"""
+Identifique o balcão e as personalizações de cada item do pedido, escolhendo apenas entre os candidatos listados.
+
+{chr(10).join(blocos)}
+
+Retorne APENAS um JSON no formato:
+{{"itens": [{{"item": 1, "balcao_id": 3, "personalizacoes": [{{"componente": "puxador", "marca": "Zen", "cor": "dourado matte"}}]}}]}}
+Use "balcao_id": null quando nenhum candidato servir.
+"""
+    return [
+        {"role": "system", "content": "Você é um assistente que identifica móveis e personalizações em pedidos de orçamento."},
+        {"role": "user", "content": prompt_ia}
+    ]
+
+def resolver_itens_llm(itens, catalogo):
+    """Resolve todos os itens restantes com uma única chamada ao GLM"""
+    def calcular():
+        resultado = gateway_llm.completar_sync(
+            mensagens_extracao(itens),
+            max_tokens=min(1500, 60 + 80 * len(itens)),
+            finalidade='extracao'
+        )
+        return extrair_json_resposta(resultado["conteudo"])
+
+    chave = chave_cache_llm('extrair', catalogo.versao, " | ".join(item['trecho'] for item in itens))
+    resposta = cache_llm.obter_ou_calcular(chave, calcular) or {}
+    for entrada in resposta.get("itens") or []:
+        try:
+            item = itens[int(entrada.get("item")) - 1]
+            balcao = catalogo.balcoes.get(int(entrada["balcao_id"]))
+        except (TypeError, ValueError, KeyError, IndexError):
+            continue
+        if balcao is None or balcao not in item['candidatos']:
+            continue
+        item['balcao'] = balcao
+        item['escolhas'] = [
+            (p.get("componente"), p.get("marca"), p.get("cor"))
+            for p in entrada.get("personalizacoes") or [] if isinstance(p, dict)
+        ]
+        # Personalização que a IA não conseguiu casar continua pendente
+        item['pendentes'] = item['personalizacoes'] if len(item['escolhas']) < len(item['personalizacoes']) else []
+        item['origem'] = 'llm'
+
+def extrair_produtos(mensagem, catalogo=None):
+    """Extrai (balcão, quantidade, personalizações) de todos os itens da mensagem e os precifica.
+
+    A busca local resolve o que puder; o que sobrar vai em uma única chamada
+    ao GLM, qualquer que seja o número de itens. Itens com mais de
+    EXTRACAO_QUANTIDADE_MAX unidades não são precificados. Devolve (produtos,
+    não identificados).
+    """
+    catalogo = catalogo or sistema_balcoes
+    itens = quebrar_itens(mensagem)
+    excedentes = [item['trecho'] for item in itens if item['quantidade'] > EXTRACAO_QUANTIDADE_MAX]
+    itens = [item for item in itens if item['quantidade'] <= EXTRACAO_QUANTIDADE_MAX]
+    sobras = []
+    for item in itens:
+        item['origem'] = 'local'
+        if not resolver_item_local(item, catalogo):
+            item['candidatos'] = candidatos_item(item, catalogo)
+            if item['candidatos']:
+                sobras.append(item)
+
+    if sobras and gateway_llm.disponivel():
+        try:
+            resolver_itens_llm(sobras, catalogo)
+        except Exception as e:
+            print(f"Erro na IA ao extrair produtos: {e}")
+
+    resolvidos = [item for item in itens if item['balcao'] is not None]
+    configuracoes = [{'balcao': item['balcao'].id, 'personalizacoes': item['escolhas']} for item in resolvidos]
+    tabela = catalogo.tabela_precos(configuracoes)
+    precos = tabela.precificar(configuracoes)
+
+    produtos, nao_identificados = [], excedentes + [item['trecho'] for item in itens if item['balcao'] is None]
+    for item, preco in zip(resolvidos, precos):
+        if 'erro' in preco:
+            # Personalização inexistente: precifica o balcão na configuração padrão
+            item['pendentes'] = item['personalizacoes']
+            item['escolhas'] = []
+            preco = tabela.precificar([{'balcao': item['balcao'].id}])[0]
+        nao_identificados.extend(item['pendentes'])
+        nome = item['balcao'].nome
+        if item['escolhas']:
+            nome += " (" + ", ".join(f"{c}: {m.strip()} {cor}" for c, m, cor in item['escolhas']) + ")"
+        produtos.append({
+            'name': nome,
+            'quantity': item['quantidade'],
+            # Em centavos exatos, como nos projetos: o front multiplica pela quantidade
+            'price': centavos(preco['total']) / 100,
+            'balcao_id': item['balcao'].id,
+            'personalizacoes': [
+                {'componente': c, 'marca': m, 'cor': cor} for c, m, cor in item['escolhas']
+            ],
+            'origem': item['origem']
+        })
+    return produtos, nao_identificados
+
+# --- RECARGA A QUENTE DO CATÁLOGO ---
+# Versões ainda referenciadas (pela global ou por conversas em andamento)
+catalogos_ativos = weakref.WeakValueDictionary()
+_recarga_lock = threading.Lock()
+_versoes_lock = threading.Lock()  # uma carga sob demanda por vez
+_observador = {'thread': None, 'pid': None}
+_publicacao = {'verificada_em': 0.0, 'mtime_ns': None}
+
+class CatalogoIndisponivel(Exception):
+    """A versão do catálogo fixada por uma sessão não existe mais (nem arquivada)"""
+
+    def __init__(self, versao):
+        super().__init__(f"Versão {versao} do catálogo não está mais disponível")
+        self.versao = versao
+
+def catalogo_da_versao(versao):
+    """Catálogo com essa versão, carregado sob demanda se este processo ainda não
+    o tiver (sessão vinda de outro worker ou de antes de um restart).
+
+    CatalogoIndisponivel só quando a versão não pode mais ser reconstruída:
+    nunca cai em silêncio na versão publicada, que reprecificaria o orçamento.
+    """
+    catalogo = catalogos_ativos.get(versao)
+    if catalogo is None and sistema_balcoes is not None and sistema_balcoes.versao == versao:
+        catalogo = sistema_balcoes
+    if catalogo is None:
+        with _versoes_lock:
+            catalogo = catalogos_ativos.get(versao)
+            if catalogo is None:
+                arquivo_excel = sistema_balcoes.arquivo_excel if sistema_balcoes is not None else EXCEL_FILE
+                catalogo = carregar_versao(versao, arquivo_excel)
+                if catalogo is None:
+                    raise CatalogoIndisponivel(versao)
+                catalogos_ativos[versao] = catalogo
+                print(f"📂 Versão {versao} do catálogo carregada sob demanda")
+    return catalogo
+
+def caminho_publicacao(arquivo_excel):
+    """Marcador com a última versão publicada, lido pelos outros workers"""
+    return os.path.splitext(arquivo_excel)[0] + '.catalogo.publicado'
+
+def caminho_aposentadas(arquivo_excel):
+    """Registro ("versão instante" por linha) das versões substituídas por outra publicação"""
+    return os.path.splitext(arquivo_excel)[0] + '.catalogo.aposentadas'
+
+def versao_publicada(arquivo_excel):
+    """Versão gravada no marcador de publicação (None se não houver)"""
+    try:
+        with open(caminho_publicacao(arquivo_excel), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def marcar_publicacao(catalogo):
+    """Grava a versão publicada no marcador (troca atômica) e registra a que ela aposentou"""
+    caminho = caminho_publicacao(catalogo.arquivo_excel)
+    anterior = versao_publicada(catalogo.arquivo_excel)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    try:
+        if anterior and anterior != catalogo.versao:
+            with open(caminho_aposentadas(catalogo.arquivo_excel), 'a', encoding='utf-8') as f:
+                f.write(f"{anterior} {int(time.time())}\n")
+        with open(temporario, 'w', encoding='utf-8') as f:
+            f.write(catalogo.versao)
+        os.replace(temporario, caminho)
+    except OSError as e:
+        print(f"⚠️ Não foi possível marcar a versão publicada do catálogo: {e}")
+
+def arquivos_das_versoes(arquivo_excel):
+    """{versão: [caminhos]} dos bancos e snapshots arquivados de cada versão da planilha"""
+    diretorio, prefixo = os.path.split(os.path.splitext(arquivo_excel)[0])
+    padrao = re.compile(re.escape(prefixo) + r'\.([0-9a-f]{12})\.catalogo\.(?:db|pkl)')
+    arquivos = defaultdict(list)
+    for nome in os.listdir(diretorio or '.'):
+        encontrado = padrao.fullmatch(nome)
+        if encontrado:
+            arquivos[encontrado.group(1)].append(os.path.join(diretorio, nome))
+    return arquivos
+
+def podar_versoes_catalogo(arquivo_excel, ttl=SESSOES_TTL):
+    """Apaga o banco e o snapshot das versões aposentadas há mais de `ttl` segundos
+    que nenhuma sessão usa; devolve as versões removidas.
+
+    Até lá, sessões que fixaram a versão ainda podem reabri-la em qualquer
+    worker (catalogo_da_versao). Arquivos sem registro de aposentadoria
+    (anteriores ao registro) passam a contar a partir de agora.
+    """
+    registro = caminho_aposentadas(arquivo_excel)
+    aposentadas = {}
+    try:
+        with open(registro, encoding='utf-8') as f:
+            for linha in f:
+                versao, _, instante = linha.strip().partition(' ')
+                aposentadas[versao] = max(aposentadas.get(versao, 0.0), float(instante))
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Registro de versões aposentadas ilegível ({registro}): {e}")
+        return []
+    
+    publicada = versao_publicada(arquivo_excel)
+    em_uso = set(catalogos_ativos.keys()) | conversas.versoes_em_uso() | {publicada}
+    if sistema_balcoes is not None:
+        em_uso.add(sistema_balcoes.versao)
+    agora = time.time()
+    removidas, mantidas = [], {}
+    for versao, arquivos in arquivos_das_versoes(arquivo_excel).items():
+        aposentada_em = aposentadas.get(versao, agora)
+        if versao in em_uso or aposentada_em > agora - ttl:
+            if versao != publicada:
+                mantidas[versao] = aposentada_em
+            continue
+        try:
+            for caminho in arquivos:
+                os.remove(caminho)
+            removidas.append(versao)
+        except OSError as e:
+            print(f"⚠️ Não foi possível remover a versão {versao} do catálogo: {e}")
+            mantidas[versao] = aposentada_em
+    
+    temporario = f"{registro}.{os.getpid()}.tmp"
+    try:
+        with open(temporario, 'w', encoding='utf-8') as f:
+            f.writelines(f"{versao} {int(instante)}\n" for versao, instante in mantidas.items())
+        os.replace(temporario, registro)
+    except OSError as e:
+        print(f"⚠️ Não foi possível atualizar o registro de versões aposentadas: {e}")
+    if removidas:
+        print(f"🧹 Versões do catálogo removidas do disco: {', '.join(removidas)}")
+    return removidas
+
+def iniciar_catalogo():
+    """Carrega o catálogo se ainda não houver um publicado neste processo.
+
+    Com gunicorn --preload isso acontece uma única vez, no processo mestre,
+    e os workers herdam o catálogo pelo fork (páginas compartilhadas).
+    """
+    global sistema_balcoes
+    if sistema_balcoes is None:
+        sistema_balcoes = criar_catalogo()
+        if sistema_balcoes.versao:
+            catalogos_ativos[sistema_balcoes.versao] = sistema_balcoes
+            marcar_publicacao(sistema_balcoes)
+            podar_versoes_catalogo(sistema_balcoes.arquivo_excel)
+    return sistema_balcoes
+
+def recarregar_catalogo(forcar=False):
+    """Constrói uma nova versão do catálogo e a publica atomicamente.
+
+    Conversas já iniciadas continuam com a versão que tinham; só conversas
+    novas (ou reiniciadas) passam a usar a versão publicada. Os outros
+    workers a adotam pelo marcador de publicação (verificar_publicacao).
+    """
+    global sistema_balcoes
+    if not _recarga_lock.acquire(blocking=False):
+        return None  # já existe uma recarga em andamento
+    try:
+        novo = criar_catalogo(sistema_balcoes.arquivo_excel)
+        if not novo.balcoes:
+            print("✗ Recarga abortada: nenhum balcão carregado na nova versão")
+            return None
+        if novo.versao == sistema_balcoes.versao and not forcar:
+            return sistema_balcoes
+        catalogos_ativos[novo.versao] = novo
+        sistema_balcoes = novo  # atribuição de referência: troca atômica
+        marcar_publicacao(novo)
+        print(f"🔄 Catálogo atualizado para a versão {novo.versao}")
+        podar_versoes_catalogo(novo.arquivo_excel)
+        return novo
+    except Exception as e:
+        print(f"✗ Erro ao recarregar catálogo: {e}")
+        return None
+    finally:
+        _recarga_lock.release()
+
+def recarregar_catalogo_em_background(forcar=False):
+    """Dispara a recarga em uma thread, sem bloquear a requisição"""
+    thread = threading.Thread(target=recarregar_catalogo, args=(forcar,), daemon=True)
+    thread.start()
+    return thread
+
+def adotar_versao(versao):
+    """Publica neste processo a versão que outro worker publicou"""
+    global sistema_balcoes
+    if not _recarga_lock.acquire(blocking=False):
+        return None
+    try:
+        sistema_balcoes = catalogo_da_versao(versao)
+        print(f"🔄 Catálogo atualizado para a versão {versao} (publicada por outro worker)")
+        return sistema_balcoes
+    except CatalogoIndisponivel as e:
+        print(f"✗ {e}")
+        return None
+    finally:
+        _recarga_lock.release()
+
+def verificar_publicacao():
+    """Adota, em background, uma versão publicada por outro worker.
+
+    Custa um stat do marcador, no máximo uma vez a cada
+    CATALOGO_PUBLICACAO_INTERVALO segundos por processo.
+    """
+    agora = time.monotonic()
+    if sistema_balcoes is None or agora - _publicacao['verificada_em'] < CATALOGO_PUBLICACAO_INTERVALO:
+        return
+    _publicacao['verificada_em'] = agora
+    caminho = caminho_publicacao(sistema_balcoes.arquivo_excel)
+    try:
+        mtime_ns = os.stat(caminho).st_mtime_ns
+    except OSError:
+        return
+    if mtime_ns == _publicacao['mtime_ns'] or _recarga_lock.locked():
+        return
+    versao = versao_publicada(sistema_balcoes.arquivo_excel)
+    _publicacao['mtime_ns'] = mtime_ns
+    if versao and versao != sistema_balcoes.versao:
+        threading.Thread(target=adotar_versao, args=(versao,), daemon=True).start()
+
+def _observar_planilha(intervalo):
+    """Recarrega o catálogo sempre que o mtime/tamanho da planilha mudar"""
+    def assinatura():
+        try:
+            stat = os.stat(sistema_balcoes.arquivo_excel)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    ultima = assinatura()
+    while True:
+        time.sleep(intervalo)
+        atual = assinatura()
+        if atual and atual != ultima:
+            ultima = atual
+            recarregar_catalogo()
+
+def iniciar_observador_catalogo():
+    """Inicia o observador da planilha uma vez por processo (seguro após fork)"""
+    if CATALOGO_WATCH_INTERVAL <= 0 or _observador['pid'] == os.getpid():
+        return
+    _observador['pid'] = os.getpid()
+    _observador['thread'] = threading.Thread(
+        target=_observar_planilha, args=(CATALOGO_WATCH_INTERVAL,), daemon=True
+    )
+    _observador['thread'].start()
+
+# --- MÁQUINA DE ESTADOS DO CHAT ---
+def obter_ou_criar_conversa(session_id):
+    """Conversa da sessão, ou uma nova (contabilizada nas métricas)"""
+    conversa = conversas.obter(session_id)
+    if conversa is None:
+        conversa = ConversaBalcao()
+        metricas.incrementar('architec_sessoes_criadas_total')
+    return conversa
+
+def processar_mensagem(conversa, user_message, session_id):
+    """Avança a conversa com a mensagem do usuário e devolve o corpo da resposta.
+
+    `response` pode ser uma string ou um iterável de trechos (ex.: o resumo
+    do balcão), para que /chat/stream envie cada trecho assim que estiver
+    pronto.
+    """
+    # Lógica de estados
+    if conversa.estado == ESTADOS['INICIO']:
+        # Um novo orçamento sempre começa na versão mais recente do catálogo
+        conversa.catalogo = sistema_balcoes
+        user_lower = user_message.lower()
+        
+        # Detectar tipo de balcão solicitado
+        if any(palavra in user_lower for palavra in ['inferior', 'embaixo', 'baixo', 'gaveta']):
+            conversa.tipo_selecionado = 'inferior'
+            balcoes_opcao = conversa.catalogo.buscar_balcoes_por_tipo('inferior')
+            # Ex.: "balcão inferior basculante" já identifica o modelo
+            destaque = conversa.catalogo.buscar_balcao_citado(user_message, tipo='inferior')
+            if destaque:
+                balcoes_opcao = [destaque]
+            
+            if len(balcoes_opcao) > 1:
+                resposta = "🔍 *Encontrei múltiplas opções de balcão inferior. Por favor, escolha uma:*\n\n"
+                for i, balcao in enumerate(balcoes_opcao, 1):
+                    resposta += f"*{i}.* {balcao.nome} - R$ {balcao.calcular_preco_total():.2f}\n"
+                    resposta += f"   {balcao.descricao}\n\n"
+                resposta += "Digite o número da opção desejada."
+                conversa.estado = ESTADOS['TIPO_SELECIONADO']
+                return {"response": resposta, "pdf_url": None, "session_id": session_id}
+            elif len(balcoes_opcao) == 1:
+                conversa.balcao_selecionado = balcoes_opcao[0]
+                conversa.estado = ESTADOS['PRODUTO_SELECIONADO']
+                resposta = gerar_resumo_balcao_partes(conversa.balcao_selecionado, conversa.personalizacoes)
+                return {"response": resposta, "pdf_url": None, "session_id": session_id}
+            else:
+                return {"response": "❌ Nenhum balcão inferior encontrado.", "pdf_url": None, "session_id": session_id}
+
+        elif any(palavra in user_lower for palavra in ['superior', 'em cima', 'alto', 'armário']):
+            conversa.tipo_selecionado = 'superior'
+            balcoes_opcao = conversa.catalogo.buscar_balcoes_por_tipo('superior')
+            # Ex.: "balcão superior basculante" já identifica o modelo
+            destaque = conversa.catalogo.buscar_balcao_citado(user_message, tipo='superior')
+            if destaque:
+                balcoes_opcao = [destaque]
+
+            if len(balcoes_opcao) > 1:
+                resposta = "🔍 *Encontrei múltiplas opções de balcão superior. Por favor, escolha uma:*\n\n"
+                for i, balcao in enumerate(balcoes_opcao, 1):
+                    resposta += f"*{i}.* {balcao.nome} - R$ {balcao.calcular_preco_total():.2f}\n"
+                    resposta += f"   {balcao.descricao}\n\n"
+                resposta += "Digite o número da opção desejada."
+                conversa.estado = ESTADOS['TIPO_SELECIONADO']
+                return {"response": resposta, "pdf_url": None, "session_id": session_id}
+            elif len(balcoes_opcao) == 1:
+                conversa.balcao_selecionado = balcoes_opcao[0]
+                conversa.estado = ESTADOS['PRODUTO_SELECIONADO']
+                resposta = gerar_resumo_balcao_partes(conversa.balcao_selecionado, conversa.personalizacoes)
+                return {"response": resposta, "pdf_url": None, "session_id": session_id}
+            else:
+                return {"response": "❌ Nenhum balcão superior encontrado.", "pdf_url": None, "session_id": session_id}
+
+        else:
+            # Buscar por nome específico
+            balcao = conversa.catalogo.buscar_balcao_por_nome(user_message)
+            if balcao:
+                conversa.balcao_selecionado = balcao
+                conversa.estado = ESTADOS['PRODUTO_SELECIONADO']
+                resposta = gerar_resumo_balcao_partes(conversa.balcao_selecionado, conversa.personalizacoes)
+                return {"response": resposta, "pdf_url": None, "session_id": session_id}
+            else:
+                response_text = "🔍 Não encontrei um balcão com esse nome. Você quer um balcão **superior** ou **inferior**?"
+                return {"response": response_text, "pdf_url": None, "session_id": session_id}
+    
+    elif conversa.estado == ESTADOS['TIPO_SELECIONADO']:
+        # Usuário escolhendo entre opções de balcão
+        if user_message.isdigit():
+            opcao = int(user_message)
+            balcoes = conversa.catalogo.buscar_balcoes_por_tipo(conversa.tipo_selecionado)
+            
+            if 1 <= opcao <= len(balcoes):
+                conversa.balcao_selecionado = balcoes[opcao - 1]
+                conversa.estado = ESTADOS['PRODUTO_SELECIONADO']
+                resposta = gerar_resumo_balcao_partes(conversa.balcao_selecionado, conversa.personalizacoes)
+                return {"response": resposta, "pdf_url": None, "session_id": session_id}
+            else:
+                response_text = f"❌ Opção inválida. Digite um número de 1 a {len(balcoes)}."
+                return {"response": response_text, "pdf_url": None, "session_id": session_id}
+        else:
+            response_text = "❌ Por favor, digite apenas o número da opção desejada."
+            return {"response": response_text, "pdf_url": None, "session_id": session_id}
+    
+    elif conversa.estado == ESTADOS['PRODUTO_SELECIONADO']:
+        # Processar personalizações ou finalização
+        if user_message.lower() in ['finalizar', 'concluir', 'pronto', 'gerar pdf']:
+            conversa.estado = ESTADOS['ORCAMENTO_FINALIZADO']
+            total_final = conversa.calcular_orcamento_final()
+            
+            resumo_final = f"✅ *Orçamento Finalizado!*\n\n"
+            resumo_final += f"📋 *Produto:* {conversa.balcao_selecionado.nome}\n"
+            resumo_final += f"💰 *Valor Total:* R$ {total_final:.2f}\n\n"
+            resumo_final += "📄 PDF disponível para download abaixo."
+            
+            # O PDF é gerado em segundo plano; com a fila cheia, ele é gerado no download
+            job = gerenciador_pdf.enviar(session_id, conversa)
+            return {
+                "response": resumo_final,
+                "pdf_url": f"/download/pdf/{session_id}",
+                "status_url": f"/pdf/status/{job['id']}" if job else None,
+                "session_id": session_id
+            }
+
+        # Primeiro tenta entender a personalização localmente, sem chamar a IA
+        interpretador = conversa.balcao_selecionado.interpretador
+        interpretacao = interpretador.interpretar(user_message) if interpretador else None
+        if interpretacao and interpretacao.confianca >= LIMIAR_CONFIANCA_LOCAL:
+            contadores_interpretacao.registrar('local')
+            if conversa.aplicar_personalizacao(interpretacao.componente.nome, interpretacao.alternativa):
+                resposta = gerar_resumo_balcao_partes(conversa.balcao_selecionado, conversa.personalizacoes)
+                return {"response": resposta, "pdf_url": None, "session_id": session_id}
+            return {"response": "❌ Erro ao aplicar personalização.", "pdf_url": None, "session_id": session_id}
         
-        if conversa.personalizacoes:
-            total_personalizacoes = sum(p['preco_adicional_total'] for p in conversa.personalizacoes)
-            p.drawString(inch, y, f"Adicional Personalizações: +R$ {total_personalizacoes:.2f}")
-            y -= 0.2 * inch
+        balcao = conversa.balcao_selecionado
+        esquema = balcao.esquema_personalizacao
+        if not esquema.opcoes:
+            return {"response": "ℹ️ Este balcão não tem opções de personalização. Digite 'finalizar' para concluir.", "pdf_url": None, "session_id": session_id}
         
-        y -= 0.1 * inch
-        p.setFont("Helvetica-Bold", 14)
-        total_final = conversa.calcular_orcamento_final()
-        p.drawString(inch, y, f"VALOR TOTAL FINAL: R$ {total_final:.2f}")
-
-        p.save()
-        buffer.seek(0)
-        return buffer
+        # Tentar entender a personalização com IA (circuito aberto = resposta imediata)
+        if not gateway_llm.disponivel():
+            contadores_interpretacao.registrar('sem_ia')
+            # Fallback simples se a IA não estiver disponível
+            return {"response": "🤖 IA não disponível. Não consigo processar personalizações no momento. Digite 'finalizar' para concluir.", "pdf_url": None, "session_id": session_id}
         
-    except Exception as e:
-        print(f"Erro ao gerar PDF: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
+        contadores_interpretacao.registrar('llm')
+        try:
+            # Pedidos idênticos (mesmo balcão/versão) reaproveitam a resposta da IA
+            escolha = cache_llm.obter_ou_calcular(
+                chave_cache_llm(balcao.id, f"{conversa.catalogo.versao}/p{FORMATO_PROMPT_PERSONALIZACAO}", user_message),
+                lambda: interpretar_personalizacao_llm(balcao, user_message)
+            )
+            if escolha is not None:
+                # A IA responde com os números do esquema; não há nome para casar
+                componente_obj, alternativa_obj = esquema.resolver(escolha)
+                if componente_obj is None:
+                    return {"response": "🤔 Não entendi sua solicitação. Pode reformular? Ex: 'Trocar a dobradiça para Hafele'.", "pdf_url": None, "session_id": session_id}
+                if alternativa_obj is None:
+                    opcoes = ", ".join(f"{a.marca_alternativa.strip()} ({a.cor_alternativa})" for a in componente_obj.alternativas)
+                    return {"response": f"❌ Não encontrei essa opção para o componente '{componente_obj.nome}'. Opções disponíveis: {opcoes}.", "pdf_url": None, "session_id": session_id}
+                if conversa.aplicar_personalizacao(componente_obj.nome, alternativa_obj):
+                    resposta = gerar_resumo_balcao_partes(balcao, conversa.personalizacoes)
+                    return {"response": resposta, "pdf_url": None, "session_id": session_id}
+                return {"response": "❌ Erro ao aplicar personalização.", "pdf_url": None, "session_id": session_id}
+            else:
+                 return {"response": "🤖 Não consegui processar sua solicitação. Pode tentar de outra forma?", "pdf_url": None, "session_id": session_id}
 
-# Armazenamento de conversas (usará a nova classe)
-conversas = {}
+        except Exception as e:
+            print(f"Erro na IA ao processar personalização: {e}")
+            return {"response": "❌ Ocorreu um erro ao processar sua solicitação de personalização.", "pdf_url": None, "session_id": session_id}
+
+    # Fallback geral
+    return {"response": "🤔 Não entendi. Você pode reformular sua mensagem ou digitar 'finalizar' para concluir?", "pdf_url": None, "session_id": session_id}
 
-# Inicializa o sistema de balcões uma vez no início
-sistema_balcoes = SistemaBalcoes()
+# Linhas do projeto listadas na resposta do chat (o PDF traz todas)
+PROJETO_LINHAS_RESPOSTA = 20
+
+def orcamento_projeto(conversa, produtos, session_id):
+    """Botão "gerar orçamento" da lista de produtos: todos viram o projeto da sessão"""
+    projeto = Projeto()
+    ignorados = []
+    for produto in produtos if isinstance(produtos, list) else []:
+        try:
+            projeto.adicionar({
+                'balcao': produto.get('balcao_id', produto.get('name')),
+                'quantidade': produto.get('quantity', 1),
+                'personalizacoes': produto.get('personalizacoes')
+            })
+        except (ValueError, TypeError, AttributeError):
+            ignorados.append(produto.get('name') if isinstance(produto, dict) else produto)
+    if not projeto.itens:
+        return {"response": "❌ Nenhum dos produtos da lista foi encontrado no catálogo.", "pdf_url": None, "session_id": session_id}
+    if conversa.projeto is not None:
+        # Refazer o projeto não troca o token: quem já o tinha continua com acesso, e ninguém mais o recebe
+        projeto.token = conversa.projeto.token
+        novo_token = None
+    else:
+        novo_token = projeto.token
+    conversa.projeto = projeto
+    
+    resposta = "✅ *Orçamento do Projeto*\n\n"
+    for n, item in enumerate(projeto.itens.values()):
+        if n == PROJETO_LINHAS_RESPOSTA:
+            resposta += f"• ... e mais {len(projeto.itens) - n} itens\n"
+            break
+        resposta += f"• {item.quantidade}x {item.balcao.nome}: R$ {item.centavos / 100:.2f}\n"
+    if ignorados:
+        resposta += f"\n⚠️ Não encontrados no catálogo: {', '.join(map(str, ignorados))}\n"
+    resposta += f"\n📦 *Unidades:* {projeto.unidades}\n"
+    resposta += f"💰 *Valor Total:* R$ {projeto.total:.2f}\n\n"
+    resposta += "📄 PDF disponível para download abaixo."
+    
+    # Como no orçamento de um balcão: o PDF vai para a fila e, com ela cheia, é gerado no download
+    job = gerenciador_pdf.enviar_projeto(session_id, projeto)
+    resultado = {
+        "response": resposta,
+        "pdf_url": projeto.link_pdf(session_id),
+        "status_url": f"/pdf/status/{job['id']}" if job else None,
+        "session_id": session_id
+    }
+    if novo_token:
+        resultado["projeto_token"] = novo_token
+    return resultado
 
 # --- ENDPOINTS DA API ---
-@app.route('/')
+@rotas.before_app_request
+def garantir_observador_catalogo():
+    iniciar_observador_catalogo()
+    verificar_publicacao()
+
+@rotas.errorhandler(CatalogoIndisponivel)
+def catalogo_indisponivel(erro):
+    return jsonify({"error": f"{erro}. Comece um novo orçamento.", "versao": erro.versao}), 409
+
+def resposta_catalogo_indisponivel(session_id):
+    """Resposta do chat quando a versão do catálogo da sessão não existe mais nem
+    arquivada (catalogo_da_versao já tentou carregá-la): a sessão recomeça em
+    vez de reprecificar o orçamento com outra versão"""
+    conversas.remover(session_id)
+    return {
+        "response": "⚠️ O catálogo foi atualizado e a versão usada neste orçamento não está mais disponível. "
+                    "Para não mudar os preços sem aviso, ele foi encerrado: envie uma mensagem para começar um novo orçamento.",
+        "pdf_url": None,
+        "session_id": session_id
+    }
+
+@rotas.route('/')
 def index():
     """Serve the main chat interface"""
     return render_template('index.html')
 
-@app.route('/static/<path:filename>')
+@rotas.route('/static/<path:filename>')
 def static_files(filename):
     """Serve static files"""
     return send_from_directory('static', filename)
 
-@app.route('/balcoes', methods=['GET'])
+@rotas.route('/balcoes', methods=['GET'])
 def listar_balcoes():
-    """Lista todos os balcões disponíveis"""
+    """Lista os balcões: ?tipo=, ?campos=id,nome,... e paginação por ?limite= e ?cursor="""
     try:
-        balcoes = sistema_balcoes.listar_todos_balcoes()
+        tipo = request.args.get('tipo', '').strip().lower() or None
         
-        resultado = []
-        for balcao in balcoes:
-            resultado.append({
-                'id': balcao.id,
-                'nome': balcao.nome,
-                'tipo': balcao.tipo,
-                'preco_base': float(balcao.preco_base),
-                'descricao': balcao.descricao,
-                'preco_total': balcao.calcular_preco_total(),
-                'componentes': len(balcao.componentes)
-            })
+        campos = None
+        if request.args.get('campos'):
+            pedidos = {campo.strip() for campo in request.args['campos'].split(',') if campo.strip()}
+            desconhecidos = pedidos.difference(CAMPOS_BALCAO)
+            if desconhecidos:
+                return jsonify({"error": f"Campos desconhecidos: {', '.join(sorted(desconhecidos))}",
+                                "campos": list(CAMPOS_BALCAO)}), 400
+            campos = tuple(campo for campo in CAMPOS_BALCAO if campo in pedidos)
+        
+        limite = None
+        if request.args.get('limite'):
+            try:
+                limite = int(request.args['limite'])
+            except ValueError:
+                limite = 0
+            if not 1 <= limite <= BALCOES_LIMITE_MAX:
+                return jsonify({"error": f"limite deve estar entre 1 e {BALCOES_LIMITE_MAX}"}), 400
+        
+        try:
+            apos = decodificar_cursor(request.args['cursor']) if request.args.get('cursor') else None
+            pagina = sistema_balcoes.pagina_balcoes(tipo, campos, limite, apos)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        # Devolve 304 quando o If-None-Match do cliente/CDN bate com o ETag
+        return resposta_comprimida(pagina)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@rotas.route('/balcoes/<int:balcao_id>/configuracoes', methods=['GET'])
+def configuracoes_balcao(balcao_id):
+    """Faixa de preço e as ?k= configurações mais baratas (?ordem=menor) ou mais caras
+    (?ordem=maior) do balcão, opcionalmente só com a ?marca= e/ou a ?cor= pedidas"""
+    try:
+        ordem = request.args.get('ordem', 'menor').strip().lower()
+        if ordem not in ('menor', 'maior'):
+            return jsonify({"error": "ordem deve ser 'menor' ou 'maior'"}), 400
+        
+        try:
+            k = int(request.args.get('k', '5'))
+        except ValueError:
+            k = 0
+        if not 1 <= k <= CONFIGURACOES_K_MAX:
+            return jsonify({"error": f"k deve estar entre 1 e {CONFIGURACOES_K_MAX}"}), 400
+        
+        marca = request.args.get('marca', '').strip() or None
+        cor = request.args.get('cor', '').strip() or None
+        corpo = sistema_balcoes.configuracoes_balcao(balcao_id, ordem == 'maior', k, marca, cor)
+        if corpo is None:
+            return jsonify({"error": "Balcão não encontrado"}), 404
+        return resposta_comprimida(corpo)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@rotas.route('/quotes/batch', methods=['POST'])
+def precificar_lote_endpoint():
+    """Precifica várias configurações de uma vez (JSON ou CSV); ?formato=csv devolve CSV"""
+    try:
+        if 'arquivo' in request.files:
+            configuracoes = ler_configuracoes_csv(request.files['arquivo'].read().decode('utf-8-sig'))
+        elif request.mimetype == 'text/csv':
+            configuracoes = ler_configuracoes_csv(request.get_data(as_text=True))
+        else:
+            data = request.get_json(silent=True)
+            configuracoes = data.get('configuracoes') if isinstance(data, dict) else data
+            if not isinstance(configuracoes, list):
+                return jsonify({"error": "Envie uma lista em 'configuracoes' ou um CSV"}), 400
+        
+        if len(configuracoes) > LOTE_MAX_CONFIGURACOES:
+            return jsonify({"error": f"Máximo de {LOTE_MAX_CONFIGURACOES} configurações por requisição"}), 413
+        
+        catalogo = sistema_balcoes
+        resultados = precificar_lote(configuracoes, catalogo)
+        
+        if request.args.get('formato') == 'csv':
+            saida = io.StringIO()
+            escritor = csv.writer(saida)
+            escritor.writerow(['referencia', 'balcao_id', 'total', 'erro'])
+            for r in resultados:
+                total = r.get('total')
+                escritor.writerow([r['referencia'], r.get('balcao_id'), '' if total is None else f"{total:.2f}", r.get('erro', '')])
+            resposta = current_app.response_class(saida.getvalue(), mimetype='text/csv')
+            resposta.headers['X-Catalogo-Versao'] = catalogo.versao or ''
+            return resposta
         
         return jsonify({
-            "total": len(resultado),
-            "balcoes": resultado
+            "versao": catalogo.versao,
+            "total": len(resultados),
+            "erros": sum(1 for r in resultados if 'erro' in r),
+            "resultados": resultados
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/chat', methods=['POST', 'OPTIONS'])
+@rotas.route('/chat', methods=['POST', 'OPTIONS'])
 def chat():
     if request.method == 'OPTIONS':
         return '', 200
@@ -458,197 +4688,538 @@ def chat():
         print(f"📨 Mensagem: '{user_message}' (Sessão: {session_id})")
         
         # Verificar se é uma nova sessão
-        if session_id not in conversas:
-            conversas[session_id] = ConversaBalcao()
-        
-        conversa = conversas[session_id]
+        try:
+            conversa = obter_ou_criar_conversa(session_id)
+        except CatalogoIndisponivel:
+            return jsonify(resposta_catalogo_indisponivel(session_id))
         
-        # Lógica de estados
-        if conversa.estado == ESTADOS['INICIO']:
-            user_lower = user_message.lower()
-            
-            # Detectar tipo de balcão solicitado
-            if any(palavra in user_lower for palavra in ['inferior', 'embaixo', 'baixo', 'gaveta']):
-                conversa.tipo_selecionado = 'inferior'
-                balcoes_opcao = sistema_balcoes.buscar_balcoes_por_tipo('inferior')
-                
-                if len(balcoes_opcao) > 1:
-                    resposta = "🔍 *Encontrei múltiplas opções de balcão inferior. Por favor, escolha uma:*\n\n"
-                    for i, balcao in enumerate(balcoes_opcao, 1):
-                        resposta += f"*{i}.* {balcao.nome} - R$ {balcao.calcular_preco_total():.2f}\n"
-                        resposta += f"   {balcao.descricao}\n\n"
-                    resposta += "Digite o número da opção desejada."
-                    conversa.estado = ESTADOS['TIPO_SELECIONADO']
-                    return jsonify({"response": resposta, "pdf_url": None, "session_id": session_id})
-                elif len(balcoes_opcao) == 1:
-                    conversa.balcao_selecionado = balcoes_opcao[0]
-                    conversa.estado = ESTADOS['PRODUTO_SELECIONADO']
-                    resposta = gerar_resumo_balcao(conversa.balcao_selecionado, conversa.personalizacoes)
-                    return jsonify({"response": resposta, "pdf_url": None, "session_id": session_id})
-                else:
-                    return jsonify({"response": "❌ Nenhum balcão inferior encontrado.", "pdf_url": None, "session_id": session_id})
-
-            elif any(palavra in user_lower for palavra in ['superior', 'em cima', 'alto', 'armário']):
-                conversa.tipo_selecionado = 'superior'
-                balcoes_opcao = sistema_balcoes.buscar_balcoes_por_tipo('superior')
-
-                if len(balcoes_opcao) > 1:
-                    resposta = "🔍 *Encontrei múltiplas opções de balcão superior. Por favor, escolha uma:*\n\n"
-                    for i, balcao in enumerate(balcoes_opcao, 1):
-                        resposta += f"*{i}.* {balcao.nome} - R$ {balcao.calcular_preco_total():.2f}\n"
-                        resposta += f"   {balcao.descricao}\n\n"
-                    resposta += "Digite o número da opção desejada."
-                    conversa.estado = ESTADOS['TIPO_SELECIONADO']
-                    return jsonify({"response": resposta, "pdf_url": None, "session_id": session_id})
-                elif len(balcoes_opcao) == 1:
-                    conversa.balcao_selecionado = balcoes_opcao[0]
-                    conversa.estado = ESTADOS['PRODUTO_SELECIONADO']
-                    resposta = gerar_resumo_balcao(conversa.balcao_selecionado, conversa.personalizacoes)
-                    return jsonify({"response": resposta, "pdf_url": None, "session_id": session_id})
-                else:
-                    return jsonify({"response": "❌ Nenhum balcão superior encontrado.", "pdf_url": None, "session_id": session_id})
-
-            else:
-                # Buscar por nome específico
-                balcao = sistema_balcoes.buscar_balcao_por_nome(user_message)
-                if balcao:
-                    conversa.balcao_selecionado = balcao
-                    conversa.estado = ESTADOS['PRODUTO_SELECIONADO']
-                    resposta = gerar_resumo_balcao(conversa.balcao_selecionado, conversa.personalizacoes)
-                    return jsonify({"response": resposta, "pdf_url": None, "session_id": session_id})
-                else:
-                    response_text = "🔍 Não encontrei um balcão com esse nome. Você quer um balcão **superior** ou **inferior**?"
-                    return jsonify({"response": response_text, "pdf_url": None, "session_id": session_id})
+        @after_this_request
+        def salvar_conversa(resposta):
+            conversas.salvar(session_id, conversa)
+            return resposta
         
-        elif conversa.estado == ESTADOS['TIPO_SELECIONADO']:
-            # Usuário escolhendo entre opções de balcão
-            if user_message.isdigit():
-                opcao = int(user_message)
-                balcoes = sistema_balcoes.buscar_balcoes_por_tipo(conversa.tipo_selecionado)
-                
-                if 1 <= opcao <= len(balcoes):
-                    conversa.balcao_selecionado = balcoes[opcao - 1]
-                    conversa.estado = ESTADOS['PRODUTO_SELECIONADO']
-                    resposta = gerar_resumo_balcao(conversa.balcao_selecionado, conversa.personalizacoes)
-                    return jsonify({"response": resposta, "pdf_url": None, "session_id": session_id})
-                else:
-                    response_text = f"❌ Opção inválida. Digite um número de 1 a {len(balcoes)}."
-                    return jsonify({"response": response_text, "pdf_url": None, "session_id": session_id})
+        with metricas.medir('architec_chat_duracao_segundos', estado=conversa.estado, rota='chat'):
+            if user_message == 'generate_multiple_quote':
+                resultado = orcamento_projeto(conversa, data.get('products'), session_id)
             else:
-                response_text = "❌ Por favor, digite apenas o número da opção desejada."
-                return jsonify({"response": response_text, "pdf_url": None, "session_id": session_id})
-        
-        elif conversa.estado == ESTADOS['PRODUTO_SELECIONADO']:
-            # Processar personalizações ou finalização
-            if user_message.lower() in ['finalizar', 'concluir', 'pronto', 'gerar pdf']:
-                conversa.estado = ESTADOS['ORCAMENTO_FINALIZADO']
-                total_final = conversa.calcular_orcamento_final()
-                
-                resumo_final = f"✅ *Orçamento Finalizado!*\n\n"
-                resumo_final += f"📋 *Produto:* {conversa.balcao_selecionado.nome}\n"
-                resumo_final += f"💰 *Valor Total:* R$ {total_final:.2f}\n\n"
-                resumo_final += "📄 PDF disponível para download abaixo."
-                
-                pdf_buffer = gerar_pdf_balcao_final(conversa)
-                if pdf_buffer:
-                    pdf_path = f"orcamento_balcao_{session_id}.pdf"
-                    with open(pdf_path, "wb") as f:
-                        f.write(pdf_buffer.getvalue())
-                    
-                    return jsonify({
-                        "response": resumo_final,
-                        "pdf_url": f"/download/pdf/{session_id}",
-                        "session_id": session_id
-                    })
-                else:
-                    return jsonify({"response": "❌ Erro ao gerar o PDF.", "pdf_url": None, "session_id": session_id})
+                resultado = processar_mensagem(conversa, user_message, session_id)
+            resultado["response"] = juntar_resposta(resultado["response"])
+        return jsonify(resultado)
 
-            # Tentar entender a personalização com IA
-            if not client:
-                # Fallback simples se a IA não estiver disponível
-                return jsonify({"response": "🤖 IA não disponível. Não consigo processar personalizações no momento. Digite 'finalizar' para concluir.", "pdf_url": None, "session_id": session_id})
-            
+    except Exception as e:
+        metricas.incrementar('architec_http_erros_total', rota='/chat')
+        print(f" Erro no endpoint /chat: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": "Ocorreu um erro interno no servidor."}), 500
+
+def evento_sse(evento, dados):
+    """Formata um evento Server-Sent Events"""
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+class ExecutorStream:
+    """Pool limitado que processa as mensagens do /chat/stream.
+
+    Cada stream ocupa uma vaga até o produtor terminar; sem vaga, o
+    stream é recusado em vez de abrir mais uma thread.
+    """
+
+    def __init__(self, max_workers=CHAT_STREAM_WORKERS, max_pendentes=CHAT_STREAM_MAX_PENDENTES):
+        self.max_workers = max_workers
+        self._vagas = threading.BoundedSemaphore(max_pendentes)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Criado sob demanda e recriado após fork (threads não sobrevivem ao fork)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='chat-stream')
+                self._pid = os.getpid()
+            return self._executor
+
+    def enviar(self, funcao):
+        """Agenda `funcao` no pool; False se todas as vagas estiverem ocupadas"""
+        if not self._vagas.acquire(blocking=False):
+            return False
+        try:
+            future = self._pool().submit(funcao)
+        except BaseException:
+            self._vagas.release()
+            raise
+        future.add_done_callback(lambda _: self._vagas.release())
+        return True
+
+executor_stream = ExecutorStream()
+
+@rotas.route('/chat/stream', methods=['POST', 'OPTIONS'])
+def chat_stream():
+    """Mesma conversa do /chat, respondida em Server-Sent Events.
+
+    Eventos: `delta` (trechos da resposta), `fim` (pdf_url/status_url/session_id)
+    e `erro`. Os tokens do GLM não são repassados: a resposta dele é um JSON
+    curto ({"c": .., "a": ..}) que só vira texto depois de aplicado.
+    """
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "Dados JSON inválidos"}), 400
+
+    user_message = data.get('message', '').strip()
+    session_id = data.get('session_id', 'default')
+
+    if not user_message:
+        return jsonify({"error": "Mensagem não pode ser vazia."}), 400
+
+    print(f"📨 Mensagem (stream): '{user_message}' (Sessão: {session_id})")
+    fila = queue.Queue()
+    # Marcado quando o cliente desconecta: o produtor para de trabalhar e de enfileirar
+    cancelado = threading.Event()
+
+    def processar():
+        # Roda no executor_stream, fora do gerador: cada trecho vai para a fila assim que fica pronto
+        if cancelado.is_set():
+            return  # o cliente desistiu enquanto o stream esperava na fila
+        conversa = fim = None
+        try:
             try:
-                # Montar prompt para a IA
-                componentes_disponiveis = "\n".join([f"- {c.nome}" for c in conversa.balcao_selecionado.componentes])
-                
-                prompt_ia = f"""
-O cliente quer personalizar o balcão "{conversa.balcao_selecionado.nome}".
-Componentes disponíveis: {componentes_disponiveis}
-
-Mensagem do cliente: "{user_message}"
-
-Analise a mensagem e retorne APENAS um JSON com a personalização desejada. Se não entender, retorne {{"acao": "nao_entendido"}}.
-O JSON deve ter o seguinte formato:
-{{"acao": "personalizar", "componente": "nome_do_componente", "marca_alternativa": "marca", "cor_alternativa": "cor"}}
-Exemplo: Mensagem "trocar dobradiça para hafele preto" -> {{"acao": "personalizar", "componente": "dobradiça", "marca_alternativa": "Hafele", "cor_alternativa": "Preto"}}
-"""
-                response = client.chat.completions.create(
-                    model="glm-4",
-                    messages=[
-                        {"role": "system", "content": "Você é um assistente que entende pedidos de personalização de móveis."},
-                        {"role": "user", "content": prompt_ia}
-                    ],
-                    max_tokens=150,
-                    temperature=0.1
-                )
-                
-                resposta_texto = response.choices[0].message.content.strip()
-                print(f"Resposta da IA para personalização: {resposta_texto}")
-                
-                json_match = re.search(r'\{.*\}', resposta_texto, re.DOTALL)
-                if json_match:
-                    acao_data = json.loads(json_match.group())
-                    
-                    if acao_data.get("acao") == "personalizar":
-                        componente_nome = acao_data.get("componente")
-                        marca_alt = acao_data.get("marca_alternativa")
-                        cor_alt = acao_data.get("cor_alternativa")
-                        
-                        # Encontrar o objeto Alternativa correto
-                        componente_obj = next((c for c in conversa.balcao_selecionado.componentes if c.nome.lower() == componente_nome.lower()), None)
-                        if componente_obj:
-                            alternativa_obj = next((a for a in componente_obj.alternativas if a.marca_alternativa.lower() == marca_alt.lower() and a.cor_alternativa.lower() == cor_alt.lower()), None)
-                            
-                            if alternativa_obj:
-                                sucesso = conversa.aplicar_personalizacao(componente_obj.nome, alternativa_obj)
-                                if sucesso:
-                                    resposta = gerar_resumo_balcao(conversa.balcao_selecionado, conversa.personalizacoes)
-                                    return jsonify({"response": resposta, "pdf_url": None, "session_id": session_id})
-                                else:
-                                    return jsonify({"response": "❌ Erro ao aplicar personalização.", "pdf_url": None, "session_id": session_id})
-                            else:
-                                return jsonify({"response": f"❌ Não encontrei a alternativa '{marca_alt} ({cor_alt})' para o componente '{componente_nome}'. Verifique as opções disponíveis.", "pdf_url": None, "session_id": session_id})
-                        else:
-                            return jsonify({"response": f"❌ Componente '{componente_nome}' não encontrado neste balcão.", "pdf_url": None, "session_id": session_id})
-                    else:
-                        return jsonify({"response": "🤔 Não entendi sua solicitação. Pode reformular? Ex: 'Trocar a dobradiça para Hafele'.", "pdf_url": None, "session_id": session_id})
-                else:
-                     return jsonify({"response": "🤖 Não consegui processar sua solicitação. Pode tentar de outra forma?", "pdf_url": None, "session_id": session_id})
+                conversa = obter_ou_criar_conversa(session_id)
+            except CatalogoIndisponivel:
+                fim = resposta_catalogo_indisponivel(session_id)
+                fila.put(('delta', {"texto": fim.pop("response")}))
+                return
+            with metricas.medir('architec_chat_duracao_segundos', estado=conversa.estado, rota='stream'):
+                resultado = processar_mensagem(conversa, user_message, session_id)
+                resposta = resultado.pop("response")
+                for trecho in ([resposta] if isinstance(resposta, str) else resposta):
+                    if cancelado.is_set():
+                        break  # o cliente saiu: o resto da resposta nem é gerado
+                    fila.put(('delta', {"texto": trecho}))
+            fim = resultado
+        except Exception as e:
+            metricas.incrementar('architec_http_erros_total', rota='/chat/stream')
+            print(f" Erro no endpoint /chat/stream: {e}")
+            import traceback
+            traceback.print_exc()
+            fila.put(('erro', {"error": "Ocorreu um erro interno no servidor."}))
+        finally:
+            # A sessão é salva antes do `fim`, para a próxima mensagem já enxergar o novo estado
+            if conversa is not None:
+                conversas.salvar(session_id, conversa)
+            if fim is not None:
+                fila.put(('fim', fim))
+            fila.put(None)
 
-            except Exception as e:
-                print(f"Erro na IA ao processar personalização: {e}")
-                return jsonify({"response": "❌ Ocorreu um erro ao processar sua solicitação de personalização.", "pdf_url": None, "session_id": session_id})
+    if not executor_stream.enviar(processar):
+        return jsonify({"error": "Servidor ocupado. Tente novamente em instantes."}), 503
+
+    def eventos():
+        try:
+            yield ": stream aberto\n\n"
+            while True:
+                item = fila.get()
+                if item is None:
+                    break
+                yield evento_sse(*item)
+        finally:
+            # GeneratorExit quando o cliente desconecta: libera o produtor
+            cancelado.set()
 
-        # Fallback geral
-        return jsonify({"response": "🤔 Não entendi. Você pode reformular sua mensagem ou digitar 'finalizar' para concluir?", "pdf_url": None, "session_id": session_id})
+    resposta = current_app.response_class(eventos(), mimetype='text/event-stream')
+    resposta.headers['Cache-Control'] = 'no-cache'
+    # Impede o nginx/proxy de acumular o stream antes de repassá-lo
+    resposta.headers['X-Accel-Buffering'] = 'no'
+    return resposta
 
+@rotas.route('/extract-products', methods=['POST', 'OPTIONS'])
+def extract_products():
+    """Extrai e precifica todos os produtos citados em uma mensagem (modo de vários itens)"""
+    if request.method == 'OPTIONS':
+        return '', 200
+    
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "Dados JSON inválidos"}), 400
+    
+    user_message = data.get('message', '').strip()
+    session_id = data.get('session_id', 'default')
+    
+    if not user_message:
+        return jsonify({"error": "Mensagem não pode ser vazia."}), 400
+    
+    try:
+        print(f"📨 Extração de produtos: '{user_message}' (Sessão: {session_id})")
+        produtos, nao_identificados = extrair_produtos(user_message)
+        corpo = {"products": produtos, "nao_identificados": nao_identificados, "session_id": session_id}
+        if not produtos:
+            return jsonify(dict(corpo, error="Nenhum produto identificado na mensagem.")), 422
+        return jsonify(corpo)
+    
     except Exception as e:
-        print(f" Erro no endpoint /chat: {e}")
+        metricas.incrementar('architec_http_erros_total', rota='/extract-products')
+        print(f" Erro no endpoint /extract-products: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({"error": "Ocorreu um erro interno no servidor."}), 500
 
-@app.route('/download/pdf/<session_id>')
+def admin_autorizado():
+    """Valida o cabeçalho X-Admin-Token (endpoints de admin ficam desligados sem ADMIN_TOKEN)"""
+    return bool(ADMIN_TOKEN) and request.headers.get('X-Admin-Token') == ADMIN_TOKEN
+
+@rotas.route('/admin/catalogo', methods=['GET'])
+def status_catalogo():
+    """Informa a versão publicada do catálogo e as versões ainda em uso"""
+    if not admin_autorizado():
+        return jsonify({"error": "Não autorizado"}), 403
+    return jsonify({
+        "versao": sistema_balcoes.versao,
+        "carregado_em": sistema_balcoes.carregado_em.isoformat() if sistema_balcoes.carregado_em else None,
+        "balcoes": len(sistema_balcoes.balcoes),
+        "versoes_ativas": sorted(catalogos_ativos.keys()),
+        "recarregando": _recarga_lock.locked()
+    })
+
+@rotas.route('/admin/estatisticas', methods=['GET'])
+def estatisticas():
+    """Contadores de personalizações resolvidas localmente vs. pelo GLM"""
+    if not admin_autorizado():
+        return jsonify({"error": "Não autorizado"}), 403
+    return jsonify({
+        "interpretacao": contadores_interpretacao.resumo(),
+        "cache_llm": cache_llm.resumo()
+    })
+
+def memoria_processo():
+    """RSS atual do processo em bytes (Linux), ou None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+@metricas.registrar_coletor
+def coletar_metricas_estado():
+    """Gauges e contadores mantidos pelos próprios componentes, lidos na exportação"""
+    acertos = cache_llm.estatisticas
+    familias = [
+        ('architec_cache_total', 'counter', 'Consultas aos caches, por cache e resultado', [
+            ({'cache': 'llm', 'resultado': 'acerto_memoria'}, acertos['acertos']),
+            ({'cache': 'llm', 'resultado': 'acerto_sqlite'}, acertos['acertos_sqlite']),
+            ({'cache': 'llm', 'resultado': 'falta'}, acertos['faltas']),
+            ({'cache': 'llm', 'resultado': 'coalescida'}, acertos['coalescidas']),
+        ]),
+        ('architec_interpretacao_total', 'counter', 'Personalizações por origem da interpretação', [
+            ({'origem': origem}, valor) for origem, valor in contadores_interpretacao.resumo().items()
+            if origem != 'taxa_local'
+        ]),
+        ('architec_conversas_ativas', 'gauge', 'Conversas guardadas no armazém de sessões', [({}, conversas.contagem())]),
+        ('architec_catalogo_balcoes', 'gauge', 'Balcões na versão publicada do catálogo', [({}, len(sistema_balcoes.balcoes))]),
+        ('architec_catalogo_memoria_bytes', 'gauge', 'Memória estimada da versão publicada do catálogo', [
+            ({'versao': sistema_balcoes.versao}, sistema_balcoes.memoria_estimada())
+        ]),
+        ('architec_catalogo_versoes_carregadas', 'gauge', 'Versões do catálogo ainda em memória', [({}, len(catalogos_ativos))]),
+        ('architec_pdf_jobs', 'gauge', 'Jobs de PDF guardados, por status', [
+            ({'status': status}, n) for status, n in gerenciador_pdf.contagem_por_status().items()
+        ]),
+        ('architec_pdf_cache_bytes', 'gauge', 'Bytes no cache de PDFs, por camada', [
+            ({'camada': camada}, n) for camada, n in cache_pdf.ocupacao().items()
+        ]),
+        ('architec_llm_circuito_aberto', 'gauge', '1 se o disjuntor do GLM está aberto', [
+            ({}, 1 if gateway_llm.disjuntor.estado == 'aberto' else 0)
+        ]),
+    ]
+    rss = memoria_processo()
+    if rss is not None:
+        familias.append(('architec_processo_rss_bytes', 'gauge', 'Memória residente do worker', [({}, rss)]))
+    return familias
+
+@rotas.route('/metrics', methods=['GET'])
+def metrics():
+    """Métricas do processo no formato texto do Prometheus"""
+    return current_app.response_class(metricas.exportar(), mimetype='text/plain; version=0.0.4')
+
+@rotas.route('/admin/catalogo/recarregar', methods=['POST'])
+def recarregar_catalogo_endpoint():
+    """Recarrega a planilha em background e publica a nova versão"""
+    if not admin_autorizado():
+        return jsonify({"error": "Não autorizado"}), 403
+    forcar = request.args.get('forcar') == '1'
+    recarregar_catalogo_em_background(forcar=forcar)
+    return jsonify({"status": "recarregando", "versao_atual": sistema_balcoes.versao}), 202
+
+@rotas.route('/download/pdf/<session_id>')
 def download_pdf(session_id):
-    pdf_path = f"orcamento_balcao_{session_id}.pdf"
-    if os.path.exists(pdf_path):
-        return send_file(pdf_path, as_attachment=True, download_name=f"orcamento_{session_id}.pdf")
-    return jsonify({"error": "PDF não encontrado"}), 404
+    job = gerenciador_pdf.job_da_sessao(session_id)
+    chave = job['chave'] if job else None
+    if job is None:
+        conversa = conversas.obter(session_id)
+        if conversa and conversa.pdf_chave and cache_pdf.obter(conversa.pdf_chave):
+            chave = conversa.pdf_chave
+        elif conversa and conversa.estado == ESTADOS['ORCAMENTO_FINALIZADO']:
+            # Sessão finalizada em outro worker (ou antes de um restart): gera agora
+            job = gerenciador_pdf.enviar(session_id, conversa)
+            if job is None:
+                return jsonify({"error": "Fila de PDFs cheia. Tente novamente em instantes."}), 503
+            chave = job['chave']
+    
+    if job is not None:
+        aguardar = request.args.get('aguardar', '1') != '0'
+        if not gerenciador_pdf.aguardar(job, PDF_WAIT_TIMEOUT if aguardar else 0):
+            return resposta_pdf_pendente(job)
+        if job['status'] == 'erro':
+            return jsonify({"error": "Erro ao gerar o PDF."}), 500
+    
+    return resposta_pdf_cache(chave, f"orcamento_{session_id}.pdf")
+
+def resposta_pdf_pendente(job):
+    """202 com o andamento do job: o worker não fica preso esperando o PDF, o cliente tenta de novo"""
+    resposta = jsonify(gerenciador_pdf.status(job))
+    resposta.headers['Retry-After'] = str(PDF_RETRY_AFTER)
+    return resposta, 202
+
+def resposta_pdf_cache(chave, nome_arquivo):
+    """Envia o PDF guardado no cache_pdf sob `chave` (404 se não estiver lá)"""
+    encontrado = cache_pdf.obter(chave) if chave else None
+    if encontrado is None:
+        return jsonify({"error": "PDF não encontrado"}), 404
+    
+    camada, conteudo = encontrado
+    arquivo = io.BytesIO(conteudo) if camada == 'memoria' else conteudo
+    # ETag = chave de conteúdo; conditional=True habilita 304 e requisições Range
+    return send_file(
+        arquivo,
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=nome_arquivo,
+        etag=chave,
+        conditional=True
+    )
+
+@rotas.route('/pdf/lote', methods=['POST'])
+def exportar_pdfs_lote():
+    """ZIP (em streaming) com os PDFs de várias sessões ou configurações.
+
+    JSON: `sessoes` (lista de session_id), `finalizadas_desde` (AAAA-MM-DD:
+    todas as sessões finalizadas desde essa data) e/ou `configuracoes`
+    (como em /quotes/batch, que também aceita CSV). Itens inválidos vão
+    para o erros.csv dentro do ZIP. Exige X-Admin-Token, como /admin/*:
+    o ZIP expõe orçamentos de todos os clientes.
+    """
+    if not admin_autorizado():
+        return jsonify({"error": "Não autorizado"}), 403
+    try:
+        sessoes, configuracoes = [], []
+        if 'arquivo' in request.files:
+            configuracoes = ler_configuracoes_csv(request.files['arquivo'].read().decode('utf-8-sig'))
+        elif request.mimetype == 'text/csv':
+            configuracoes = ler_configuracoes_csv(request.get_data(as_text=True))
+        else:
+            data = request.get_json(silent=True)
+            if isinstance(data, list):
+                data = {'configuracoes': data}
+            if not isinstance(data, dict):
+                return jsonify({"error": "Envie 'sessoes', 'finalizadas_desde' ou 'configuracoes'"}), 400
+            sessoes = list(data.get('sessoes') or [])
+            configuracoes = data.get('configuracoes') or []
+            if data.get('finalizadas_desde'):
+                try:
+                    desde = datetime.strptime(str(data['finalizadas_desde']), '%Y-%m-%d').timestamp()
+                except ValueError:
+                    return jsonify({"error": "finalizadas_desde deve estar no formato AAAA-MM-DD"}), 400
+                sessoes += [s for s in conversas.finalizadas(desde) if s not in sessoes]
+            if not isinstance(configuracoes, list):
+                return jsonify({"error": "'configuracoes' deve ser uma lista"}), 400
+        
+        if not sessoes and not configuracoes:
+            return jsonify({"error": "Nenhum orçamento para exportar"}), 400
+        if len(sessoes) + len(configuracoes) > PDF_LOTE_MAX:
+            return jsonify({"error": f"Máximo de {PDF_LOTE_MAX} PDFs por exportação"}), 413
+        
+        itens, erros = itens_lote_pdf(sessoes, configuracoes)
+        print(f"📦 Exportando {len(itens)} PDFs em lote ({len(erros)} itens inválidos)")
+        resposta = current_app.response_class(exportador_pdf.zip(itens, erros), mimetype='application/zip')
+        resposta.headers['Content-Disposition'] = f"attachment; filename=orcamentos_{datetime.now():%Y%m%d_%H%M%S}.zip"
+        resposta.headers['X-Pdfs-Total'] = str(len(itens))
+        return resposta
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def conversa_do_projeto(session_id, link_assinado=False):
+    """(conversa, None) se a sessão tem um projeto e a requisição traz o token dele no
+    cabeçalho X-Projeto-Token (ou, com `link_assinado`, um `link_pdf` válido);
+    senão (None, resposta de erro). O token nunca é aceito na URL."""
+    conversa = conversas.obter(session_id)
+    if conversa is None or conversa.projeto is None:
+        return None, (jsonify({"error": "Projeto não encontrado"}), 404)
+    projeto = conversa.projeto
+    if not (projeto.autorizado(request.headers.get('X-Projeto-Token')) or (
+            link_assinado and projeto.link_valido(session_id, request.args.get('expira'), request.args.get('assinatura')))):
+        return None, (jsonify({"error": "Não autorizado"}), 403)
+    return conversa, None
+
+@rotas.route('/projeto/<session_id>', methods=['GET'])
+def obter_projeto(session_id):
+    """Projeto da sessão com todas as linhas, os totais e um link novo para o PDF"""
+    conversa, erro = conversa_do_projeto(session_id)
+    if erro:
+        return erro
+    return jsonify(dict(conversa.projeto.to_dict(), pdf_url=conversa.projeto.link_pdf(session_id)))
+
+@rotas.route('/projeto/<session_id>/itens', methods=['POST'])
+def adicionar_item_projeto(session_id):
+    """Inclui um balcão no projeto: {balcao (id ou nome), quantidade, personalizacoes}"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Envie o item como um objeto JSON"}), 400
+    conversa = conversas.obter(session_id)
+    novo = conversa is None
+    if novo:
+        # Só uma sessão nova é criada aqui: quem a cria recebe o token e passa a ser o dono do projeto
+        conversa = obter_ou_criar_conversa(session_id)
+        conversa.projeto = Projeto()
+    elif conversa.projeto is None:
+        return jsonify({"error": "Sessão já iniciada: use um novo session_id ou gere o projeto pelo chat"}), 403
+    elif not conversa.projeto.autorizado(request.headers.get('X-Projeto-Token')):
+        return jsonify({"error": "Não autorizado"}), 403
+    try:
+        item = conversa.projeto.adicionar(data)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e) if isinstance(e, ValueError) else "Item inválido"}), 400
+    conversas.salvar(session_id, conversa)
+    # Só a linha nova e os totais: o projeto inteiro está em GET /projeto/<session_id>
+    resposta = dict(conversa.projeto.resumo(), item=item.to_dict())
+    if novo:
+        # Única vez em que o token é devolvido: as próximas requisições precisam dele
+        resposta['token'] = conversa.projeto.token
+    return jsonify(resposta), 201
+
+@rotas.route('/projeto/<session_id>/itens/<int:item_id>', methods=['PATCH', 'DELETE'])
+def alterar_item_projeto(session_id, item_id):
+    """PATCH muda a quantidade e/ou as personalizações de uma linha; DELETE a remove"""
+    conversa, erro = conversa_do_projeto(session_id)
+    if erro:
+        return erro
+    if item_id not in conversa.projeto.itens:
+        return jsonify({"error": "Item não encontrado"}), 404
+    if request.method == 'DELETE':
+        conversa.projeto.remover(item_id)
+        conversas.salvar(session_id, conversa)
+        return jsonify(conversa.projeto.resumo())
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Envie 'quantidade' e/ou 'personalizacoes'"}), 400
+    try:
+        item = conversa.projeto.alterar(item_id, data.get('quantidade'), data.get('personalizacoes'))
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e) if isinstance(e, ValueError) else "Alteração inválida"}), 400
+    conversas.salvar(session_id, conversa)
+    return jsonify(dict(conversa.projeto.resumo(), item=item.to_dict()))
+
+@rotas.route('/projeto/<session_id>/pdf')
+def pdf_projeto(session_id):
+    """PDF do projeto, pela mesma fila e cache dos orçamentos de um balcão.
+
+    A chave de conteúdo cobre as linhas do projeto, então um projeto que
+    não mudou é servido do cache sem ser desenhado de novo. Aceita o
+    cabeçalho X-Projeto-Token ou o link assinado de `pdf_url` (que expira;
+    GET /projeto/<session_id> devolve um novo).
+    """
+    conversa, erro = conversa_do_projeto(session_id, link_assinado=True)
+    if erro:
+        return erro
+    if not conversa.projeto.itens:
+        return jsonify({"error": "Projeto vazio"}), 404
+    job = gerenciador_pdf.enviar_projeto(session_id, conversa.projeto)
+    if job is None:
+        return jsonify({"error": "Fila de PDFs cheia. Tente novamente em instantes."}), 503
+    
+    aguardar = request.args.get('aguardar', '1') != '0'
+    if not gerenciador_pdf.aguardar(job, PDF_WAIT_TIMEOUT if aguardar else 0):
+        return resposta_pdf_pendente(job)
+    if job['status'] == 'erro':
+        return jsonify({"error": "Erro ao gerar o PDF."}), 500
+    return resposta_pdf_cache(job['chave'], f"projeto_{session_id}.pdf")
+
+@rotas.route('/pdf/status/<job_id>')
+def status_pdf(job_id):
+    """Andamento da geração de um PDF"""
+    job = gerenciador_pdf.obter(job_id)
+    if job is None:
+        return jsonify({"error": "Job não encontrado"}), 404
+    return jsonify(gerenciador_pdf.status(job))
+
+# --- APLICAÇÃO ---
+def create_app():
+    """Cria a aplicação Flask com as rotas e o catálogo carregado.
+
+    Pensada para `gunicorn --preload "app:create_app()"`: o mestre importa o
+    módulo e monta o catálogo uma vez, e cada worker o herda já pronto.
+    """
+    aplicacao = Flask(__name__)
+    CORS(aplicacao)
+    aplicacao.register_blueprint(rotas)
+    iniciar_catalogo()
+    return aplicacao
+
+def __getattr__(nome):
+    # `app`/`application` (flask run, servidor padrão do Elastic Beanstalk) são criados na primeira referência
+    if nome in ('app', 'application'):
+        global app, application
+        app = application = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
+
+# --- COMANDOS DE LINHA DE COMANDO ---
+@rotas.cli.command('compilar-catalogo')
+def compilar_catalogo_cli():
+    """Compila a planilha em snapshot binário (flask --app app compilar-catalogo)"""
+    compilar_catalogo(EXCEL_FILE, forcar=True)
+    print(f"✅ Snapshot gravado em {caminho_snapshot(EXCEL_FILE)}")
+
+@rotas.cli.command('pdf-lote')
+@click.option('--saida', default=None, help='arquivo ZIP (padrão: orcamentos_<data>.zip)')
+@click.option('--configuracoes', 'arquivo_configuracoes', type=click.Path(exists=True, dir_okay=False),
+              help='CSV ou JSON de configurações, como em /quotes/batch')
+@click.option('--sessoes', default='', help='session_ids separados por vírgula')
+@click.option('--finalizadas-desde', default=None, help='AAAA-MM-DD: todas as sessões finalizadas desde essa data')
+@click.option('--processos', type=int, default=0, help='processos de renderização (padrão: PDF_LOTE_PROCESSOS ou um por núcleo)')
+def exportar_pdfs_lote_cli(saida, arquivo_configuracoes, sessoes, finalizadas_desde, processos):
+    """Gera um ZIP com os PDFs de várias sessões/configurações (flask --app app pdf-lote)"""
+    configuracoes = []
+    if arquivo_configuracoes:
+        with open(arquivo_configuracoes, encoding='utf-8-sig') as arquivo:
+            texto = arquivo.read()
+        if arquivo_configuracoes.lower().endswith('.json'):
+            configuracoes = json.loads(texto)
+            configuracoes = configuracoes.get('configuracoes', []) if isinstance(configuracoes, dict) else configuracoes
+        else:
+            configuracoes = ler_configuracoes_csv(texto)
+    lista_sessoes = [s.strip() for s in sessoes.split(',') if s.strip()]
+    if finalizadas_desde:
+        desde = datetime.strptime(finalizadas_desde, '%Y-%m-%d').timestamp()
+        lista_sessoes += [s for s in conversas.finalizadas(desde) if s not in lista_sessoes]
+    
+    itens, erros = itens_lote_pdf(lista_sessoes, configuracoes)
+    saida = saida or f"orcamentos_{datetime.now():%Y%m%d_%H%M%S}.zip"
+    exportador = ExportadorPDF(processos) if processos else exportador_pdf
+    inicio = time.perf_counter()
+    with open(saida, 'wb') as arquivo:
+        for pedaco in exportador.zip(itens, erros):
+            arquivo.write(pedaco)
+    duracao = time.perf_counter() - inicio
+    print(f"✅ {len(itens)} PDFs em {saida} ({duracao:.1f}s, {len(itens) / duracao if duracao else 0:.0f} PDFs/s, "
+          f"{exportador.processos} processos)")
+    if erros:
+        print(f"⚠️ {len(erros)} itens inválidos (ver erros.csv no ZIP)")
 
 if __name__ == '__main__':
     print("🚀 Iniciando servidor Flask com o novo sistema de orçamentos...")
     print(f"📁 Lendo do Excel: {EXCEL_FILE}")
+    app = create_app()
     
     if not sistema_balcoes.balcoes:
         print("❌ Nenhum balcão carregado. Verifique o arquivo Excel e as abas 'balcoes', 'componentes' e 'personalizacoes'.")
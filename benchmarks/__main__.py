@@ -0,0 +1,50 @@
+"""Suíte completa: micro-benchmarks + carga concorrente, gravadas em um único JSON.
+
+Roda offline (catálogo sintético e stub do GLM). Para comparar com uma
+execução anterior:
+    python -m benchmarks --saida novo.json
+    python -m benchmarks.comparar base.json novo.json
+"""
+import argparse
+import contextlib
+import io
+import random
+import tempfile
+
+from benchmarks import ambiente, carga, micro, resultados
+from benchmarks.stub_glm import ServidorGLMStub
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--balcoes', type=int, default=1000)
+    parser.add_argument('--repeticoes', type=int, default=100)
+    parser.add_argument('--clientes', type=int, default=8)
+    parser.add_argument('--duracao', type=float, default=10)
+    parser.add_argument('--latencia-glm', type=float, default=0.3)
+    parser.add_argument('--fracao-llm', type=float, default=0.2)
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', help='arquivo JSON (padrão: benchmarks/resultados/...)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio, ServidorGLMStub(latencia=args.latencia_glm) as stub:
+        app = ambiente.importar_app(stub, diretorio)
+        planilha = ambiente.planilha_sintetica(diretorio, args.balcoes)
+        ambiente.usar_catalogo(app, planilha)
+
+        medicoes = micro.executar(app, planilha, args.repeticoes, random.Random(args.semente))
+
+        servidor, url = carga.servir_em_thread(app)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                relatorio = carga.executar_carga(url, args.clientes, args.duracao, args.fracao_llm, args.semente)
+        finally:
+            servidor.shutdown()
+        relatorio['glm_chamadas'] = stub.chamadas
+        carga.imprimir(relatorio, args.clientes)
+
+    resultados.salvar('suite', vars(args), {'micro': medicoes, 'carga': relatorio}, args.saida)
+
+
+if __name__ == '__main__':
+    main()
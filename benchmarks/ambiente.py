@@ -0,0 +1,49 @@
+"""Prepara o app para rodar nos benchmarks: offline, com catálogo sintético e caches temporários"""
+import contextlib
+import importlib
+import io
+import os
+import sys
+import tempfile
+
+from benchmarks.catalogo_sintetico import gerar_planilha
+
+
+def configurar_ambiente(stub=None, diretorio=None):
+    """Variáveis de ambiente lidas pelo app na importação (chame antes de importar `app`)"""
+    diretorio = diretorio or tempfile.mkdtemp(prefix='bench-')
+    # GLM_API_KEY vazia impede que o .env aponte o app para a API real
+    os.environ['GLM_API_KEY'] = 'stub' if stub else ''
+    if stub:
+        os.environ['GLM_BASE_URL'] = stub.url
+    os.environ['PDF_CACHE_DIR'] = os.path.join(diretorio, 'pdf_cache')
+    os.environ['SESSOES_DB_FILE'] = os.path.join(diretorio, 'sessoes.db')
+    os.environ['LLM_CACHE_DB'] = ''
+    os.environ['CATALOGO_WATCH_INTERVAL'] = '0'
+    return diretorio
+
+
+def importar_app(stub=None, diretorio=None):
+    """Importa o módulo `app` com o ambiente dos benchmarks"""
+    if 'app' in sys.modules:
+        raise RuntimeError("o app já foi importado; configure o ambiente antes da primeira importação")
+    configurar_ambiente(stub, diretorio)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return importlib.import_module('app')
+
+
+def usar_catalogo(app, planilha):
+    """Carrega a planilha e a publica como catálogo atual do app"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        catalogo = app.SistemaBalcoes(planilha)
+    app.catalogos_ativos[catalogo.versao] = catalogo
+    app.sistema_balcoes = catalogo
+    return catalogo
+
+
+def planilha_sintetica(diretorio, balcoes):
+    """Gera (uma vez) a planilha sintética com `balcoes` balcões dentro de `diretorio`"""
+    caminho = os.path.join(diretorio, f'sintetico-{balcoes}.xlsx')
+    if not os.path.exists(caminho):
+        gerar_planilha(caminho, n_balcoes=balcoes)
+    return caminho
@@ -0,0 +1,66 @@
+"""Compara o tempo de inicialização do catálogo: Excel direto vs. snapshot compilado.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.bench_inicializacao
+    python -m benchmarks.bench_inicializacao --balcoes 2000
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import time
+
+import app
+from benchmarks.catalogo_sintetico import gerar_planilha
+
+
+def medir(funcao, repeticoes):
+    """Executa `funcao` várias vezes e devolve os tempos em milissegundos"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos
+
+
+def comparar(arquivo_excel, repeticoes):
+    snapshot = app.caminho_snapshot(arquivo_excel)
+    if os.path.exists(snapshot):
+        os.remove(snapshot)
+
+    excel = medir(lambda: app.SistemaBalcoes(arquivo_excel, usar_snapshot=False), repeticoes)
+    compilacao = medir(lambda: app.compilar_catalogo(arquivo_excel, forcar=True), 1)
+    quente = medir(lambda: app.SistemaBalcoes(arquivo_excel, usar_snapshot=True), repeticoes)
+
+    print(f"\n📁 {arquivo_excel}")
+    print(f"   Excel (pandas/openpyxl): mediana {statistics.median(excel):9.2f} ms")
+    print(f"   Compilação do snapshot:          {compilacao[0]:9.2f} ms")
+    print(f"   Snapshot compilado:      mediana {statistics.median(quente):9.2f} ms")
+    print(f"   Ganho: {statistics.median(excel) / statistics.median(quente):.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--balcoes', type=int, default=1000,
+                        help='tamanho da planilha sintética (0 desativa)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        # Copia a planilha real para não tocar no snapshot de produção
+        real = os.path.join(diretorio, os.path.basename(app.EXCEL_FILE))
+        with open(app.EXCEL_FILE, 'rb') as origem, open(real, 'wb') as destino:
+            destino.write(origem.read())
+        comparar(real, args.repeticoes)
+
+        if args.balcoes:
+            sintetica = gerar_planilha(os.path.join(diretorio, 'sintetico.xlsx'), n_balcoes=args.balcoes)
+            comparar(sintetica, args.repeticoes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Mede a memória ocupada pelo catálogo carregado (tracemalloc).
+
+Gera uma planilha sintética com ~50k SKUs (linhas de componentes), compila
+o snapshot e mede quanto a SistemaBalcoes retém depois de carregada, além
+do pico durante a carga e dos principais pontos de alocação.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.bench_memoria
+    python -m benchmarks.bench_memoria --skus 200000 --top 10
+"""
+import argparse
+import contextlib
+import gc
+import io
+import os
+import tempfile
+import tracemalloc
+
+import app
+from benchmarks.catalogo_sintetico import gerar_planilha
+
+
+def mb(valor):
+    return valor / (1024 * 1024)
+
+
+def medir_catalogo(planilha, top):
+    app.compilar_catalogo(planilha, forcar=True)
+    gc.collect()
+
+    tracemalloc.start(1)
+    antes = tracemalloc.take_snapshot()
+    with contextlib.redirect_stdout(io.StringIO()):
+        catalogo = app.SistemaBalcoes(planilha, usar_snapshot=True)
+    gc.collect()
+    depois = tracemalloc.take_snapshot()
+    atual, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    skus = sum(len(b.componentes) for b in catalogo.balcoes.values())
+    diferencas = depois.compare_to(antes, 'lineno')
+    retido = sum(d.size_diff for d in diferencas)
+
+    print(f"\n📦 {len(catalogo.balcoes)} balcões, {skus} SKUs")
+    print(f"   Memória retida pelo catálogo: {mb(retido):8.2f} MB  ({retido / max(skus, 1):,.0f} bytes/SKU)")
+    print(f"   Pico durante a carga:         {mb(pico):8.2f} MB")
+    print(f"   Principais pontos de alocação:")
+    for d in diferencas[:top]:
+        quadro = d.traceback[0]
+        print(f"     {mb(d.size_diff):7.2f} MB  {d.count_diff:>9,} objs  {os.path.basename(quadro.filename)}:{quadro.lineno}")
+
+    # Pior caso: todos os balcões já personalizados (interpretadores criados)
+    tracemalloc.start(1)
+    for balcao in catalogo.balcoes.values():
+        balcao.interpretador
+    gc.collect()
+    interpretadores = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"   + todos os interpretadores:   {mb(interpretadores):8.2f} MB")
+    return catalogo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--skus', type=int, default=50000)
+    parser.add_argument('--componentes', type=int, default=8, help='componentes por balcão')
+    parser.add_argument('--top', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        planilha = gerar_planilha(
+            os.path.join(diretorio, 'sintetico.xlsx'),
+            n_balcoes=max(1, args.skus // args.componentes),
+            componentes_por_balcao=args.componentes
+        )
+        medir_catalogo(planilha, args.top)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Mede a exportação de PDFs em lote (ExportadorPDF) contra a renderização serial.
+
+Gera configurações aleatórias sobre uma planilha sintética e produz o ZIP
+com 1, 2, 4... processos até o número de núcleos, conferindo que todos os
+PDFs chegaram. A linha "serial" é o caminho de um PDF por vez na thread da
+requisição (renderizar_pdf em laço).
+
+Uso (na raiz do repositório):
+    python -m benchmarks.bench_pdf_lote
+    python -m benchmarks.bench_pdf_lote --pdfs 2000 --processos 1,2,4,8
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+import zipfile
+
+from benchmarks import ambiente
+from benchmarks.catalogo_sintetico import gerar_planilha
+
+
+def contagens_processos(texto):
+    if texto:
+        return [int(n) for n in texto.split(',')]
+    contagens, n = [], 1
+    while n < (os.cpu_count() or 1):
+        contagens.append(n)
+        n *= 2
+    return contagens + [os.cpu_count() or 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--balcoes', type=int, default=500)
+    parser.add_argument('--pdfs', type=int, default=500)
+    parser.add_argument('--processos', default='', help='lista separada por vírgulas (padrão: 1, 2, 4... até os núcleos)')
+    parser.add_argument('--semente', type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        app = ambiente.importar_app(diretorio=diretorio)
+        from benchmarks.bench_precos_lote import gerar_configuracoes
+        planilha = gerar_planilha(os.path.join(diretorio, 'sintetico.xlsx'), n_balcoes=args.balcoes)
+        catalogo = ambiente.usar_catalogo(app, planilha)
+        configuracoes = gerar_configuracoes(catalogo, args.pdfs, 4, args.semente)
+        itens, erros = app.itens_lote_pdf(configuracoes=configuracoes, catalogo=catalogo)
+        assert not erros, erros
+
+        print(f"\n📄 {len(itens)} PDFs, {os.cpu_count()} núcleos")
+        inicio = time.perf_counter()
+        for _, conversa in itens:
+            app.renderizar_pdf(app.dados_pdf(conversa))
+        serial = time.perf_counter() - inicio
+        print(f"   serial:          {serial:7.2f} s  {len(itens) / serial:8.1f} PDFs/s")
+
+        for processos in contagens_processos(args.processos):
+            exportador = app.ExportadorPDF(processos)
+            # Sobe o pool antes de medir: o custo de iniciar os processos é pago uma vez por worker
+            list(exportador.zip(itens[:processos]))
+            inicio = time.perf_counter()
+            saida = io.BytesIO()
+            pedacos = maior = 0
+            for pedaco in exportador.zip(itens):
+                saida.write(pedaco)
+                pedacos += 1
+                maior = max(maior, len(pedaco))
+            duracao = time.perf_counter() - inicio
+            exportador._pool().shutdown()
+            pdfs = len(zipfile.ZipFile(saida).namelist())
+            assert pdfs == len(itens), (pdfs, len(itens))
+            print(f"   {processos:2d} processo(s):  {duracao:7.2f} s  {len(itens) / duracao:8.1f} PDFs/s  "
+                  f"{serial / duracao:5.2f}x  ({pedacos} pedaços, maior {maior / 1024:.0f} KB, ZIP {saida.tell() / 1e6:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
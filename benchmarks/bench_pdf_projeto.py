@@ -0,0 +1,74 @@
+"""Mede o PDF de projetos (vários balcões) conforme o número de linhas cresce.
+
+Monta projetos com 50, 200, 800... linhas sobre uma planilha sintética e
+desenha o PDF com renderizar_pdf_projeto, num arquivo temporário. Cada
+linha é um bloco pequeno, desenhado página a página, então o tempo por
+página e o pico de memória do desenho devem ficar estáveis em vez de
+crescer com o tamanho do projeto.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.bench_pdf_projeto
+    python -m benchmarks.bench_pdf_projeto --linhas 100,1000 --personalizacoes 3
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import ambiente
+from benchmarks.catalogo_sintetico import gerar_planilha
+
+
+def montar_projeto(app, catalogo, linhas, personalizacoes, semente):
+    aleatorio = random.Random(semente)
+    balcoes = catalogo.listar_todos_balcoes()
+    projeto = app.Projeto(catalogo)
+    for _ in range(linhas):
+        balcao = aleatorio.choice(balcoes)
+        escolhas = []
+        for componente in aleatorio.sample(balcao.componentes, min(personalizacoes, len(balcao.componentes))):
+            if componente.alternativas:
+                alternativa = aleatorio.choice(componente.alternativas)
+                escolhas.append([componente.nome, alternativa.marca_alternativa, alternativa.cor_alternativa])
+        projeto.adicionar({'balcao': balcao.id, 'quantidade': aleatorio.randint(1, 6), 'personalizacoes': escolhas})
+    return projeto
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--balcoes', type=int, default=500)
+    parser.add_argument('--linhas', default='50,200,800', help='tamanhos de projeto, separados por vírgulas')
+    parser.add_argument('--personalizacoes', type=int, default=2, help='personalizações por linha')
+    parser.add_argument('--semente', type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        app = ambiente.importar_app(diretorio=diretorio)
+        planilha = gerar_planilha(os.path.join(diretorio, 'sintetico.xlsx'), n_balcoes=args.balcoes)
+        catalogo = ambiente.usar_catalogo(app, planilha)
+        # Aquece importações e fontes do ReportLab fora da medição
+        with tempfile.TemporaryFile() as destino:
+            app.renderizar_pdf_projeto(app.dados_pdf_projeto(montar_projeto(app, catalogo, 5, args.personalizacoes, args.semente)), destino)
+
+        print(f"\n📄 PDF de projetos ({args.personalizacoes} personalizações por linha)")
+        for linhas in (int(n) for n in args.linhas.split(',')):
+            dados = app.dados_pdf_projeto(montar_projeto(app, catalogo, linhas, args.personalizacoes, args.semente))
+            with tempfile.TemporaryFile() as destino:
+                inicio = time.perf_counter()
+                paginas = app.renderizar_pdf_projeto(dados, destino)
+                duracao = time.perf_counter() - inicio
+                tamanho = destino.tell()
+            # Segunda passada só para o pico de memória (o tracemalloc deixa o desenho bem mais lento)
+            tracemalloc.start()
+            with tempfile.TemporaryFile() as destino:
+                app.renderizar_pdf_projeto(dados, destino)
+            _, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"   {linhas:5d} linhas: {paginas:5d} páginas  {duracao:6.2f} s  "
+                  f"{duracao / paginas * 1000:6.1f} ms/página  pico {pico / 1e6:5.1f} MB  PDF {tamanho / 1e6:5.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
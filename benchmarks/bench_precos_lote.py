@@ -0,0 +1,109 @@
+"""Compara a precificação escalar (ConversaBalcao) com a vetorizada (TabelaPrecos).
+
+Gera configurações aleatórias (balcão + personalizações) sobre uma planilha
+sintética, confere que os totais são idênticos e mede a vazão de cada caminho.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.bench_precos_lote
+    python -m benchmarks.bench_precos_lote --configuracoes 100000 --balcoes 5000
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+import app
+from benchmarks.catalogo_sintetico import gerar_planilha
+
+
+def gerar_configuracoes(catalogo, quantidade, max_personalizacoes, semente):
+    """Configurações aleatórias, no formato aceito por /quotes/batch"""
+    rnd = random.Random(semente)
+    balcoes = catalogo.listar_todos_balcoes()
+    configuracoes = []
+    for n in range(quantidade):
+        balcao = rnd.choice(balcoes)
+        personalizacoes = []
+        for _ in range(rnd.randint(0, max_personalizacoes)):
+            componente = rnd.choice(balcao.componentes)
+            if componente.alternativas:
+                alt = rnd.choice(componente.alternativas)
+                personalizacoes.append({
+                    'componente': componente.nome,
+                    'marca': alt.marca_alternativa,
+                    'cor': alt.cor_alternativa,
+                })
+        configuracoes.append({'referencia': n, 'balcao': balcao.id, 'personalizacoes': personalizacoes})
+    return configuracoes
+
+
+def precificar_escalar(catalogo, configuracoes):
+    """Caminho original: uma ConversaBalcao por configuração"""
+    totais = []
+    for configuracao in configuracoes:
+        conversa = app.ConversaBalcao(catalogo)
+        conversa.balcao_selecionado = catalogo.balcoes[configuracao['balcao']]
+        for p in configuracao['personalizacoes']:
+            componente = next(c for c in conversa.balcao_selecionado.componentes if c.nome == p['componente'])
+            alternativa = next(
+                a for a in componente.alternativas
+                if a.marca_alternativa == p['marca'] and a.cor_alternativa == p['cor']
+            )
+            conversa.aplicar_personalizacao(componente.nome, alternativa)
+        totais.append(conversa.calcular_orcamento_final())
+    return totais
+
+
+def cronometrar(funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    return resultado, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--balcoes', type=int, default=2000)
+    parser.add_argument('--configuracoes', type=int, default=20000)
+    parser.add_argument('--personalizacoes', type=int, default=4,
+                        help='máximo de personalizações por configuração')
+    parser.add_argument('--semente', type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        planilha = gerar_planilha(os.path.join(diretorio, 'sintetico.xlsx'), n_balcoes=args.balcoes)
+        with contextlib.redirect_stdout(io.StringIO()):
+            catalogo = app.SistemaBalcoes(planilha, usar_snapshot=False)
+
+    configuracoes = gerar_configuracoes(catalogo, args.configuracoes, args.personalizacoes, args.semente)
+
+    _, compilacao = cronometrar(catalogo.tabela_precos)
+    escalar, t_escalar = cronometrar(lambda: precificar_escalar(catalogo, configuracoes))
+    lote, t_lote = cronometrar(lambda: app.precificar_lote(configuracoes, catalogo))
+
+    # Só o núcleo vetorizado, com as configurações já resolvidas em índices
+    tabela = catalogo.tabela_precos()
+    resolvidas = [tabela.resolver(c) for c in configuracoes]
+    largura = max(len(indices) for _, indices in resolvidas)
+    linhas = np.array([linha for linha, _ in resolvidas], dtype=np.int64)
+    alternativas = np.array([indices + [-1] * (largura - len(indices)) for _, indices in resolvidas], dtype=np.int64)
+    nucleo, t_nucleo = cronometrar(lambda: tabela.precificar_indices(linhas, alternativas))
+
+    divergentes = sum(1 for a, b, c in zip(escalar, lote, nucleo.tolist()) if not a == b.get('total') == c)
+    print(f"\n📊 {args.configuracoes} configurações sobre {args.balcoes} balcões")
+    print(f"   Compilação dos arrays:   {compilacao * 1000:9.2f} ms")
+    print(f"   Escalar (ConversaBalcao): {t_escalar * 1000:9.2f} ms  ({len(configuracoes) / t_escalar:12,.0f} config/s)")
+    print(f"   Lote (resolução + preço): {t_lote * 1000:9.2f} ms  ({len(configuracoes) / t_lote:12,.0f} config/s)")
+    print(f"   Núcleo vetorizado:        {t_nucleo * 1000:9.2f} ms  ({len(configuracoes) / t_nucleo:12,.0f} config/s)")
+    print(f"   Ganho: {t_escalar / t_lote:.1f}x (lote), {t_escalar / t_nucleo:.0f}x (núcleo)")
+    print(f"   Totais divergentes: {divergentes}")
+    if divergentes:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
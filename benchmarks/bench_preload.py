@@ -0,0 +1,162 @@
+"""Mede o custo de subir o app: tempo de importação e memória por worker.
+
+1. Importação (processos novos): tempo de `import app`, de `create_app()` e
+   quais dependências pesadas ficaram carregadas.
+2. Workers: sobe o gunicorn com e sem preload sobre uma planilha sintética e
+   lê RSS e PSS de cada processo (/proc/<pid>/smaps_rollup). O PSS divide as
+   páginas compartilhadas entre os processos que as usam, então é ele que
+   mostra o ganho de herdar o catálogo pelo fork.
+
+Uso (na raiz do repositório, Linux com gunicorn instalado):
+    python -m benchmarks.bench_preload
+    python -m benchmarks.bench_preload --skus 200000 --workers 4
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from benchmarks import ambiente
+from benchmarks.catalogo_sintetico import gerar_planilha
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CODIGO_IMPORTACAO = """
+import json, sys, time
+inicio = time.perf_counter()
+import app
+importado = time.perf_counter()
+app.create_app()
+pronto = time.perf_counter()
+print(json.dumps({
+    'importacao_ms': (importado - inicio) * 1000,
+    'create_app_ms': (pronto - importado) * 1000,
+    'pandas': 'pandas' in sys.modules,
+    'reportlab': 'reportlab' in sys.modules,
+}))
+"""
+
+CODIGO_DEPENDENCIAS = """
+import time
+inicio = time.perf_counter()
+import pandas, reportlab.pdfgen.canvas
+print((time.perf_counter() - inicio) * 1000)
+"""
+
+
+def mb(valor):
+    return valor / (1024 * 1024)
+
+
+def executar_python(codigo):
+    saida = subprocess.run([sys.executable, '-c', codigo], cwd=RAIZ, capture_output=True, text=True, check=True)
+    return saida.stdout.strip().splitlines()[-1]
+
+
+def medir_importacao(repeticoes):
+    amostras = [json.loads(executar_python(CODIGO_IMPORTACAO)) for _ in range(repeticoes)]
+    dependencias = [float(executar_python(CODIGO_DEPENDENCIAS)) for _ in range(repeticoes)]
+    print("\n⏱️  Importação (mediana de processos novos)")
+    print(f"   import app:               {statistics.median(a['importacao_ms'] for a in amostras):8.1f} ms")
+    print(f"   create_app() (catálogo):  {statistics.median(a['create_app_ms'] for a in amostras):8.1f} ms")
+    print(f"   pandas carregado: {amostras[0]['pandas']}  reportlab carregado: {amostras[0]['reportlab']}")
+    print(f"   pandas + reportlab (adiados para o primeiro uso): {statistics.median(dependencias):8.1f} ms")
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def memoria(pid):
+    """(RSS, PSS) em bytes, lidos de /proc/<pid>/smaps_rollup"""
+    valores = {}
+    with open(f'/proc/{pid}/smaps_rollup') as arquivo:
+        for linha in arquivo:
+            partes = linha.split()
+            if partes[0] in ('Rss:', 'Pss:'):
+                valores[partes[0]] = int(partes[1]) * 1024
+    return valores['Rss:'], valores['Pss:']
+
+
+def filhos(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as arquivo:
+        return [int(p) for p in arquivo.read().split()]
+
+
+def medir_workers(preload, workers, requisicoes):
+    porta = porta_livre()
+    env = dict(os.environ, GUNICORN_PRELOAD='1' if preload else '0')
+    inicio = time.perf_counter()
+    mestre = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{porta}',
+         '--workers', str(workers), '--threads', '1', 'app:create_app()'],
+        cwd=RAIZ, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        url = f'http://127.0.0.1:{porta}/balcoes'
+        while True:
+            if mestre.poll() is not None:
+                raise RuntimeError("o gunicorn terminou antes de ficar pronto")
+            try:
+                urllib.request.urlopen(url, timeout=5).read()
+                break
+            except OSError:
+                time.sleep(0.05)
+        pronto = (time.perf_counter() - inicio) * 1000
+        while len(filhos(mestre.pid)) < workers:
+            time.sleep(0.05)
+        for _ in range(requisicoes):
+            urllib.request.urlopen(url, timeout=5).read()
+        time.sleep(1)
+
+        rss_mestre, pss_mestre = memoria(mestre.pid)
+        por_worker = [memoria(pid) for pid in filhos(mestre.pid)]
+    finally:
+        mestre.terminate()
+        mestre.wait()
+
+    total_pss = pss_mestre + sum(pss for _, pss in por_worker)
+    print(f"\n🧵 gunicorn {'com' if preload else 'sem'} preload, {workers} workers (primeira resposta em {pronto:.0f} ms)")
+    print(f"   mestre:  RSS {mb(rss_mestre):7.1f} MB  PSS {mb(pss_mestre):7.1f} MB")
+    for rss, pss in por_worker:
+        print(f"   worker:  RSS {mb(rss):7.1f} MB  PSS {mb(pss):7.1f} MB")
+    print(f"   PSS total: {mb(total_pss):7.1f} MB")
+    return total_pss
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--skus', type=int, default=50000)
+    parser.add_argument('--componentes', type=int, default=8, help='componentes por balcão')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requisicoes', type=int, default=50)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        ambiente.configurar_ambiente(diretorio=diretorio)
+        planilha = gerar_planilha(
+            os.path.join(diretorio, 'sintetico.xlsx'),
+            n_balcoes=max(1, args.skus // args.componentes),
+            componentes_por_balcao=args.componentes
+        )
+        os.environ['CATALOGO_PLANILHA'] = planilha
+        # Snapshot compilado antes, como em produção: nenhum processo lê o Excel
+        executar_python(f"import app; app.compilar_catalogo({planilha!r}, forcar=True); print()")
+
+        medir_importacao(args.repeticoes)
+        sem = medir_workers(False, args.workers, args.requisicoes)
+        com = medir_workers(True, args.workers, args.requisicoes)
+        print(f"\n📉 PSS total: {mb(sem):.1f} MB → {mb(com):.1f} MB ({(1 - com / sem) * 100:.0f}% menos)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""Gerador de carga concorrente contra o app Flask.
+
+Cada cliente virtual percorre o fluxo completo do /chat (INICIO ->
+TIPO_SELECIONADO -> PRODUTO_SELECIONADO -> personalização -> finalizar),
+baixa o PDF e consulta /balcoes. Reporta p50/p95/p99 por etapa e a vazão.
+
+Sem --url, sobe o app em uma thread (servidor threaded do werkzeug) com
+catálogo sintético e o stub do GLM; com --url, mede um servidor já no ar
+(ex.: gunicorn), que deve estar apontado para o stub.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.carga --clientes 16 --duracao 20
+    python -m benchmarks.carga --url http://127.0.0.1:8000 --clientes 32
+"""
+import argparse
+import contextlib
+import io
+import logging
+import random
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+from benchmarks import ambiente, resultados
+from benchmarks.stub_glm import ServidorGLMStub
+
+MENSAGENS_LOCAIS = ['trocar a dobradiça para fgv curva branco', 'quero o puxador zen dourado matte']
+
+
+class Coletor:
+    """Tempos por etapa e erros, compartilhados entre os clientes"""
+
+    def __init__(self):
+        self.tempos = defaultdict(list)
+        self.erros = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def registrar(self, etapa, inicio, ok):
+        duracao = (time.perf_counter() - inicio) * 1000
+        with self._lock:
+            self.tempos[etapa].append(duracao)
+            if not ok:
+                self.erros[etapa] += 1
+
+
+def sessao(cliente, coletor, rnd, fracao_llm):
+    """Uma conversa completa; devolve o número de requisições feitas"""
+    session_id = f"bench-{uuid.uuid4().hex}"
+
+    def chat(etapa, mensagem):
+        inicio = time.perf_counter()
+        try:
+            resposta = cliente.post('/chat', json={'message': mensagem, 'session_id': session_id})
+            coletor.registrar(etapa, inicio, resposta.status_code == 200)
+            return resposta.json() if resposta.status_code == 200 else {}
+        except httpx.HTTPError:
+            coletor.registrar(etapa, inicio, False)
+            return {}
+
+    resposta = chat('inicio', rnd.choice(['quero um balcão inferior', 'preciso de um balcão superior']))
+    if 'escolha' in resposta.get('response', ''):
+        chat('tipo_selecionado', '1')
+    if rnd.random() < fracao_llm:
+        # Texto que o interpretador local não resolve: vai ao GLM (único, para não cair no cache)
+        chat('personalizacao_llm', f"mudar aquele acessório da porta, pedido {rnd.random()}")
+    else:
+        chat('personalizacao_local', rnd.choice(MENSAGENS_LOCAIS))
+    final = chat('finalizar', 'finalizar')
+
+    requisicoes = 4
+    if final.get('pdf_url'):
+        inicio = time.perf_counter()
+        try:
+            pdf = cliente.get(final['pdf_url'])
+            coletor.registrar('download_pdf', inicio, pdf.status_code == 200)
+        except httpx.HTTPError:
+            coletor.registrar('download_pdf', inicio, False)
+        requisicoes += 1
+
+    inicio = time.perf_counter()
+    try:
+        coletor.registrar('balcoes', inicio, cliente.get('/balcoes').status_code == 200)
+    except httpx.HTTPError:
+        coletor.registrar('balcoes', inicio, False)
+    return requisicoes + 1
+
+
+def executar_carga(url, clientes, duracao, fracao_llm, semente):
+    coletor = Coletor()
+    contagem = {'sessoes': 0, 'requisicoes': 0}
+    lock = threading.Lock()
+    fim = time.monotonic() + duracao
+
+    def cliente_virtual(numero):
+        rnd = random.Random(semente + numero)
+        with httpx.Client(base_url=url, timeout=60) as cliente:
+            while time.monotonic() < fim:
+                requisicoes = sessao(cliente, coletor, rnd, fracao_llm)
+                with lock:
+                    contagem['sessoes'] += 1
+                    contagem['requisicoes'] += requisicoes
+
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=cliente_virtual, args=(n,)) for n in range(clientes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    decorrido = time.perf_counter() - inicio
+
+    etapas = {etapa: dict(resultados.resumir(tempos), erros=coletor.erros[etapa]) for etapa, tempos in coletor.tempos.items()}
+    todas = [t for tempos in coletor.tempos.values() for t in tempos]
+    return {
+        'etapas': etapas,
+        'geral': dict(
+            resultados.resumir(todas),
+            erros=sum(coletor.erros.values()),
+            requisicoes_por_segundo=round(contagem['requisicoes'] / decorrido, 2),
+            sessoes_por_segundo=round(contagem['sessoes'] / decorrido, 2),
+            duracao_s=round(decorrido, 2),
+        ),
+    }
+
+
+def imprimir(relatorio, clientes):
+    print(f"\n🚦 Carga com {clientes} clientes")
+    print(f"   {'etapa':<22}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'erros':>7}")
+    for etapa, r in sorted(relatorio['etapas'].items()):
+        print(f"   {etapa:<22}{r['n']:>7}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['erros']:>7}")
+    geral = relatorio['geral']
+    print(f"   Vazão: {geral['requisicoes_por_segundo']} req/s, {geral['sessoes_por_segundo']} sessões/s"
+          f" (p99 geral {geral['p99_ms']} ms, {geral['erros']} erros)")
+
+
+def servir_em_thread(app):
+    """Sobe o app Flask em uma thread, com o servidor threaded do werkzeug"""
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    servidor = make_server('127.0.0.1', 0, app.app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, name='bench-app', daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='servidor já em execução (padrão: sobe o app localmente)')
+    parser.add_argument('--clientes', type=int, default=8)
+    parser.add_argument('--duracao', type=float, default=10, help='segundos de carga')
+    parser.add_argument('--balcoes', type=int, default=1000)
+    parser.add_argument('--latencia-glm', type=float, default=0.3)
+    parser.add_argument('--fracao-llm', type=float, default=0.2, help='fração das personalizações que vão ao GLM')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', help='arquivo JSON (padrão: benchmarks/resultados/...)')
+    args = parser.parse_args()
+
+    if args.url:
+        relatorio = executar_carga(args.url, args.clientes, args.duracao, args.fracao_llm, args.semente)
+    else:
+        with tempfile.TemporaryDirectory() as diretorio, ServidorGLMStub(latencia=args.latencia_glm) as stub:
+            app = ambiente.importar_app(stub, diretorio)
+            ambiente.usar_catalogo(app, ambiente.planilha_sintetica(diretorio, args.balcoes))
+            servidor, url = servir_em_thread(app)
+            try:
+                # Os prints do app (um por mensagem) distorceriam a medição
+                with contextlib.redirect_stdout(io.StringIO()):
+                    relatorio = executar_carga(url, args.clientes, args.duracao, args.fracao_llm, args.semente)
+            finally:
+                servidor.shutdown()
+            relatorio['glm_chamadas'] = stub.chamadas
+
+    imprimir(relatorio, args.clientes)
+    resultados.salvar('carga', vars(args), {'carga': relatorio}, args.saida)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Gerador de planilhas sintéticas no mesmo formato de orcamento_final1.xlsx"""
+import argparse
+import random
+
+import pandas as pd
+
+TIPOS = ['Inferior', 'Superior']
+COMPONENTES = [
+    ('dobradiça', 'acessorio'), ('puxador', 'acessorio'), ('frente', 'frente'),
+    ('prateleira', 'movel'), ('divisoria', 'movel'), ('ripa', 'movel'),
+    ('protetor', 'acessorio'), ('corrediça', 'acessorio'), ('gaveta', 'frente'),
+    ('tampo', 'movel'),
+]
+MARCAS = ['FGV Reta', 'FGV Curva', 'Hafele', 'Blum', 'Zen', 'MDP', 'Stucco', 'Grass']
+CORES = ['branco', 'preto', 'cinza', 'dourado matte', 'madeira', 'inox']
+
+
+def gerar_dados(n_balcoes=1000, componentes_por_balcao=8, variantes_componente=5,
+                alternativas_por_componente=4, semente=42):
+    """Gera os DataFrames das três abas do catálogo"""
+    rnd = random.Random(semente)
+    nomes_componentes = [
+        (f"{nome} {i}" if i else nome, categoria)
+        for i in range(variantes_componente)
+        for nome, categoria in COMPONENTES
+    ]
+
+    balcoes = []
+    componentes = []
+    for balcao_id in range(1, n_balcoes + 1):
+        tipo = rnd.choice(TIPOS)
+        balcoes.append({
+            'id': balcao_id,
+            'nome': f"Balcao {tipo} {balcao_id} {rnd.randint(1, 4)} gavetas",
+            'tipo': tipo,
+            'preco_base': round(rnd.uniform(300, 2000), 2),
+            'descricao': f"Balcao {rnd.randint(1, 3)} portas MDP 18mm modelo {balcao_id}",
+        })
+        for nome, categoria in rnd.sample(nomes_componentes, min(componentes_por_balcao, len(nomes_componentes))):
+            componentes.append({
+                'balcao_id': balcao_id,
+                'componente': nome,
+                'categoria': categoria,
+                'quantidade': rnd.randint(1, 6),
+                'marca_padrao': rnd.choice(MARCAS),
+                'cor_padrao': rnd.choice(CORES),
+                'fornecedor_padrao': None,
+                'preco_unitario': round(rnd.uniform(10, 400), 2),
+                'nome': f"{nome.capitalize()} {rnd.choice(MARCAS)}",
+            })
+
+    personalizacoes = []
+    for nome, _ in nomes_componentes:
+        for _ in range(alternativas_por_componente):
+            personalizacoes.append({
+                'componente': nome,
+                'marca_alternativa': rnd.choice(MARCAS),
+                'cor_alternativa': rnd.choice(CORES),
+                'fornecedor_alternativo': None,
+                'preco_diferenca': round(rnd.uniform(0, 200), 2),
+            })
+
+    return (
+        pd.DataFrame(balcoes),
+        pd.DataFrame(componentes),
+        pd.DataFrame(personalizacoes),
+    )
+
+
+def gerar_planilha(caminho, **kwargs):
+    """Grava uma planilha sintética com as abas balcoes/componentes/personalizacoes"""
+    df_balcoes, df_componentes, df_personalizacoes = gerar_dados(**kwargs)
+    with pd.ExcelWriter(caminho, engine='openpyxl') as writer:
+        df_balcoes.to_excel(writer, sheet_name='balcoes', index=False)
+        df_componentes.to_excel(writer, sheet_name='componentes', index=False)
+        df_personalizacoes.to_excel(writer, sheet_name='personalizacoes', index=False)
+    return caminho
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('caminho')
+    parser.add_argument('--balcoes', type=int, default=1000)
+    parser.add_argument('--componentes', type=int, default=8)
+    args = parser.parse_args()
+    gerar_planilha(args.caminho, n_balcoes=args.balcoes, componentes_por_balcao=args.componentes)
+    print(f"✓ Planilha sintética gravada em {args.caminho}")
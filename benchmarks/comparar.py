@@ -0,0 +1,63 @@
+"""Compara dois arquivos de resultados e aponta regressões.
+
+Métricas terminadas em `_ms` são melhores quanto menores; as terminadas em
+`_por_segundo`, quanto maiores. Sai com código 1 se alguma piorar além da
+tolerância, para uso antes do deploy.
+
+Uso:
+    python -m benchmarks.comparar base.json novo.json
+    python -m benchmarks.comparar base.json novo.json --tolerancia 0.25 --metricas p50_ms p95_ms
+"""
+import argparse
+import sys
+
+from benchmarks.resultados import carregar
+
+
+def achatar(dados, prefixo=''):
+    """{'a': {'b': 1}} -> {'a.b': 1}, só com valores numéricos"""
+    planos = {}
+    for chave, valor in dados.items():
+        nome = f"{prefixo}.{chave}" if prefixo else chave
+        if isinstance(valor, dict):
+            planos.update(achatar(valor, nome))
+        elif isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            planos[nome] = valor
+    return planos
+
+
+def comparar(base, novo, tolerancia, metricas):
+    base, novo = achatar(base['resultados']), achatar(novo['resultados'])
+    regressoes = []
+    for nome in sorted(base.keys() & novo.keys()):
+        metrica = nome.rsplit('.', 1)[-1]
+        if metrica not in metricas or not base[nome]:
+            continue
+        variacao = (novo[nome] - base[nome]) / base[nome]
+        pior = variacao > tolerancia if metrica.endswith('_ms') else variacao < -tolerancia
+        marcador = '❌' if pior else ('✅' if abs(variacao) > tolerancia else '  ')
+        print(f"{marcador} {nome:<60}{base[nome]:>12.3f} → {novo[nome]:>12.3f}  ({variacao:+.1%})")
+        if pior:
+            regressoes.append(nome)
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base')
+    parser.add_argument('novo')
+    parser.add_argument('--tolerancia', type=float, default=0.15, help='variação aceita (0.15 = 15%%)')
+    parser.add_argument('--metricas', nargs='+', default=['p50_ms', 'p95_ms', 'p99_ms', 'requisicoes_por_segundo'])
+    args = parser.parse_args()
+
+    base, novo = carregar(args.base), carregar(args.novo)
+    print(f"Base: {base['meta']['commit']} ({base['meta']['data']})   Novo: {novo['meta']['commit']} ({novo['meta']['data']})\n")
+    regressoes = comparar(base, novo, args.tolerancia, set(args.metricas))
+    if regressoes:
+        print(f"\n❌ {len(regressoes)} regressões acima de {args.tolerancia:.0%}")
+        sys.exit(1)
+    print(f"\n✅ Nenhuma regressão acima de {args.tolerancia:.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Micro-benchmarks das funções dos caminhos quentes do app.
+
+Mede carga do catálogo (Excel e snapshot), /balcoes, busca, máquina de
+estados do chat, resumo, interpretação local, chamada ao GLM (stub), PDF e
+precificação em lote, sobre uma planilha sintética. Roda offline.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.micro
+    python -m benchmarks.micro --balcoes 5000 --latencia-glm 0.2 --saida micro.json
+"""
+import argparse
+import contextlib
+import io
+import random
+import tempfile
+
+from benchmarks import ambiente, resultados
+from benchmarks.stub_glm import ServidorGLMStub
+
+
+def silencioso(funcao):
+    def executar():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return funcao()
+    return executar
+
+
+def conversa_em_produto(app, balcao):
+    """Conversa já no estado PRODUTO_SELECIONADO com o balcão dado"""
+    conversa = app.ConversaBalcao()
+    conversa.balcao_selecionado = balcao
+    conversa.estado = app.ESTADOS['PRODUTO_SELECIONADO']
+    return conversa
+
+
+def fluxo_chat(app):
+    """INICIO -> TIPO_SELECIONADO -> PRODUTO_SELECIONADO, como no /chat"""
+    conversa = app.ConversaBalcao()
+    for mensagem in ('quero um balcão inferior', '1'):
+        resultado = app.processar_mensagem(conversa, mensagem, 'bench')
+        app.juntar_resposta(resultado['response'])
+    return conversa
+
+
+def executar(app, planilha, repeticoes, rnd):
+    catalogo = app.sistema_balcoes
+    balcoes = catalogo.listar_todos_balcoes()
+    cliente = app.app.test_client()
+    medicoes = {}
+
+    def medir(nome, funcao, n=repeticoes):
+        medicoes[nome] = resultados.cronometrar(silencioso(funcao), n)
+        print(f"   {nome:<34} p50 {medicoes[nome]['p50_ms']:9.3f} ms   p95 {medicoes[nome]['p95_ms']:9.3f} ms")
+
+    print(f"\n⏱️  Micro-benchmarks ({len(balcoes)} balcões)")
+    medir('carregar_dados_excel', lambda: app.SistemaBalcoes(planilha, usar_snapshot=False), max(3, repeticoes // 20))
+    medir('carregar_dados_snapshot', lambda: app.SistemaBalcoes(planilha, usar_snapshot=True), max(3, repeticoes // 10))
+
+    def payload_frio():
+        catalogo._paginas_balcoes.clear()
+        return catalogo.payload_balcoes()
+    medir('balcoes_payload_frio', payload_frio, max(5, repeticoes // 10))
+    medir('balcoes_get', lambda: cliente.get('/balcoes'))
+    medir('buscar_balcao_por_nome', lambda: catalogo.buscar_balcao_por_nome(rnd.choice(balcoes).nome))
+
+    medir('chat_inicio_ate_produto', lambda: fluxo_chat(app))
+
+    def personalizacao_local():
+        conversa = conversa_em_produto(app, balcoes[0])
+        return app.juntar_resposta(app.processar_mensagem(conversa, 'trocar a dobradiça para fgv curva branco', 'bench')['response'])
+    medir('chat_personalizacao_local', personalizacao_local)
+
+    if app.gateway_llm.configurado():
+        def chamada_glm():
+            # Mensagem única a cada repetição: mede o gateway, não o cache
+            return app.interpretar_personalizacao_llm(balcoes[0], f"mudar aquele acessório {rnd.random()}")
+        medir('glm_interpretar_personalizacao', chamada_glm, max(5, repeticoes // 10))
+
+    medir('gerar_resumo_balcao', lambda: app.gerar_resumo_balcao(rnd.choice(balcoes)))
+
+    def resumo_personalizado():
+        # Um turno de personalização: mesmo balcão, uma troca por vez
+        balcao = rnd.choice(balcoes)
+        trocaveis = [c for c in balcao.componentes if c.alternativas]
+        personalizacoes = []
+        if trocaveis:
+            comp = rnd.choice(trocaveis)
+            alt = rnd.choice(comp.alternativas)
+            personalizacoes.append({'componente': comp.nome, 'alternativa': alt,
+                                    'preco_adicional_total': alt.preco_diferenca * comp.quantidade})
+        return app.gerar_resumo_balcao(balcao, personalizacoes)
+    medir('gerar_resumo_personalizado', resumo_personalizado)
+    medir('interpretador_local', lambda: rnd.choice(balcoes).interpretador.interpretar('puxador zen dourado'))
+
+    conversa = conversa_em_produto(app, balcoes[0])
+    medir('gerar_pdf_balcao_final', lambda: app.gerar_pdf_balcao_final(conversa), max(5, repeticoes // 5))
+
+    configuracoes = [{'balcao': rnd.choice(balcoes).id} for _ in range(1000)]
+    medir('precificar_lote_1000', lambda: app.precificar_lote(configuracoes))
+    return medicoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--balcoes', type=int, default=1000)
+    parser.add_argument('--repeticoes', type=int, default=100)
+    parser.add_argument('--latencia-glm', type=float, default=0.05, help='latência do stub do GLM (s)')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', help='arquivo JSON (padrão: benchmarks/resultados/...)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio, ServidorGLMStub(latencia=args.latencia_glm) as stub:
+        app = ambiente.importar_app(stub, diretorio)
+        planilha = ambiente.planilha_sintetica(diretorio, args.balcoes)
+        ambiente.usar_catalogo(app, planilha)
+        medicoes = executar(app, planilha, args.repeticoes, random.Random(args.semente))
+
+    resultados.salvar('micro', vars(args), {'micro': medicoes}, args.saida)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Estatísticas e gravação dos resultados dos benchmarks em JSON"""
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime
+
+DIRETORIO_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resultados')
+
+
+def percentil(valores, p):
+    """Percentil `p` (0-100) com interpolação linear"""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    posicao = (len(ordenados) - 1) * p / 100
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicao - inferior)
+
+
+def resumir(tempos_ms):
+    """p50/p95/p99/média/máximo de uma lista de tempos em ms"""
+    if not tempos_ms:
+        return {'n': 0}
+    return {
+        'n': len(tempos_ms),
+        'p50_ms': round(percentil(tempos_ms, 50), 3),
+        'p95_ms': round(percentil(tempos_ms, 95), 3),
+        'p99_ms': round(percentil(tempos_ms, 99), 3),
+        'media_ms': round(sum(tempos_ms) / len(tempos_ms), 3),
+        'max_ms': round(max(tempos_ms), 3),
+    }
+
+
+def cronometrar(funcao, repeticoes, aquecimento=1):
+    """Executa `funcao` repetidas vezes e devolve o resumo dos tempos"""
+    for _ in range(aquecimento):
+        funcao()
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return resumir(tempos)
+
+
+def commit_atual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadados(parametros):
+    return {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit_atual(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'parametros': parametros,
+    }
+
+
+def salvar(nome, parametros, resultados, caminho=None):
+    """Grava {'meta', 'resultados'} em benchmarks/resultados/<data>-<commit>-<nome>.json"""
+    dados = {'meta': metadados(parametros), 'resultados': resultados}
+    if caminho is None:
+        os.makedirs(DIRETORIO_RESULTADOS, exist_ok=True)
+        carimbo = datetime.now().strftime('%Y%m%d-%H%M%S')
+        caminho = os.path.join(DIRETORIO_RESULTADOS, f"{carimbo}-{dados['meta']['commit'] or 'local'}-{nome}.json")
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(dados, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Resultados gravados em {caminho}")
+    return caminho
+
+
+def carregar(caminho):
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,149 @@
+"""Servidor local que imita a API do GLM (/chat/completions, compatível com OpenAI).
+
+Responde sem rede e com latência configurável, para que os benchmarks
+exercitem o gateway (pool HTTP, prazos, disjuntor, streaming) de forma
+reprodutível.
+
+Uso:
+    python -m benchmarks.stub_glm --porta 8765 --latencia 0.4
+    GLM_API_KEY=stub GLM_BASE_URL=http://127.0.0.1:8765 python app.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Personalização: componente e opção preferidos, quando o balcão os tem
+PREFERENCIA_PADRAO = ("dobradiça", "FGV Curva/branco")
+
+
+class ServidorGLMStub:
+    """Stub do GLM em uma thread; `latencia` (s) e `jitter` (s) valem por chamada"""
+
+    def __init__(self, porta=0, latencia=0.0, jitter=0.0, status=200, resposta=None, preferencia=PREFERENCIA_PADRAO):
+        self.latencia = latencia
+        self.jitter = jitter
+        self.status = status
+        self.resposta = resposta  # dict fixo para toda chamada de personalização (opcional)
+        self.preferencia = preferencia
+        self.chamadas = 0
+        self._lock = threading.Lock()
+        self._servidor = ThreadingHTTPServer(('127.0.0.1', porta), self._criar_handler())
+        self._servidor.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._servidor.server_port}"
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._servidor.serve_forever, name='stub-glm', daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+
+    def conteudo(self, prompt):
+        """Texto devolvido pelo modelo para um prompt"""
+        if '"itens"' in prompt:
+            # Extração de vários produtos: escolhe o primeiro candidato de cada item
+            itens = []
+            for bloco in re.split(r'\nItem ', prompt)[1:]:
+                ids = re.findall(r'balcao_id (\d+)', bloco)
+                itens.append({
+                    "item": int(bloco.split(':', 1)[0]),
+                    "balcao_id": int(ids[0]) if ids else None,
+                    "personalizacoes": []
+                })
+            return json.dumps({"itens": itens}, ensure_ascii=False)
+        if self.resposta is not None:
+            return json.dumps(self.resposta, ensure_ascii=False)
+        # Personalização: escolhe pelos números do esquema ("1 dobradiça: 1=Hafele/preto; 2=...")
+        opcoes = re.findall(r'^(\d+) (.+?): (.+)$', prompt, re.MULTILINE)
+        componente, alternativa = self.preferencia
+        for numero, nome, alternativas in opcoes:
+            if nome.lower() == componente.lower():
+                escolhas = dict((texto.lower(), n) for n, texto in re.findall(r'(\d+)=([^;]+)', alternativas))
+                return json.dumps({"c": int(numero), "a": int(escolhas.get(alternativa.lower(), 1))})
+        return json.dumps({"c": int(opcoes[0][0]), "a": 1} if opcoes else {"c": None})
+
+    def _criar_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True  # sem os ~40 ms do Nagle + ACK atrasado no keep-alive
+
+            def do_POST(self):
+                corpo = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                with stub._lock:
+                    stub.chamadas += 1
+                time.sleep(stub.latencia + random.uniform(0, stub.jitter))
+
+                if stub.status != 200:
+                    self._enviar(stub.status, b'{"error": "stub"}', 'application/json')
+                    return
+
+                texto = stub.conteudo(corpo["messages"][-1]["content"])
+                uso = {"prompt_tokens": len(json.dumps(corpo["messages"])) // 4, "completion_tokens": len(texto) // 4}
+                if corpo.get("stream"):
+                    self._enviar_stream(texto, uso)
+                else:
+                    resposta = {"choices": [{"message": {"role": "assistant", "content": texto}}], "usage": uso}
+                    self._enviar(200, json.dumps(resposta).encode(), 'application/json')
+
+            def _enviar(self, status, dados, tipo):
+                self.send_response(status)
+                self.send_header('Content-Type', tipo)
+                self.send_header('Content-Length', str(len(dados)))
+                self.end_headers()
+                self.wfile.write(dados)
+
+            def _enviar_stream(self, texto, uso):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                for i in range(0, len(texto), 8):
+                    evento = {"choices": [{"delta": {"content": texto[i:i + 8]}}]}
+                    self.wfile.write(f"data: {json.dumps(evento)}\n\n".encode())
+                self.wfile.write(f"data: {json.dumps({'choices': [], 'usage': uso})}\n\n".encode())
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--latencia', type=float, default=0.3, help='segundos por chamada')
+    parser.add_argument('--jitter', type=float, default=0.0, help='variação aleatória adicional (s)')
+    parser.add_argument('--status', type=int, default=200, help='status HTTP (ex.: 503 para testar o disjuntor)')
+    args = parser.parse_args()
+
+    stub = ServidorGLMStub(args.porta, args.latencia, args.jitter, args.status).iniciar()
+    print(f"✓ Stub do GLM em {stub.url} (latência {args.latencia}s)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.parar()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+"""Configuração do gunicorn usada no deploy (Procfile).
+
+O mestre importa o app e carrega o catálogo uma única vez (preload); os
+workers são criados por fork e compartilham essas páginas de memória
+(copy-on-write) em vez de cada um ler a planilha de novo.
+
+Local: gunicorn -c gunicorn.conf.py "app:create_app()"
+"""
+import gc
+import os
+
+wsgi_app = 'application:create_app()'
+bind = os.getenv('GUNICORN_BIND', '127.0.0.1:8000')
+workers = int(os.getenv('WEB_CONCURRENCY', '3'))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') != '0'
+
+
+def when_ready(server):
+    # Tudo o que o mestre carregou vai para a geração permanente do GC: as
+    # coletas dos workers deixam de escrever nesses objetos e as páginas
+    # continuam compartilhadas.
+    if preload_app:
+        gc.freeze()
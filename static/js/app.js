@@ -272,6 +272,9 @@ class ChatApp {
             this.showTypingIndicator();
             
             try {
+                // Stream the answer from /chat/stream; fall back to /chat when streaming is unavailable
+                if (await this.streamMessage(message)) return;
+                
                 const response = await fetch('/chat', {
                     method: 'POST',
                     headers: {
@@ -306,6 +309,86 @@ class ChatApp {
         }
     }
     
+    async streamMessage(message) {
+        if (!window.ReadableStream || !window.TextDecoder) return false;
+        
+        let response;
+        try {
+            response = await fetch('/chat/stream', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    message: message,
+                    session_id: this.sessionId,
+                    mode: this.mode
+                })
+            });
+        } catch (error) {
+            console.warn('Stream unavailable, falling back to /chat:', error);
+            return false;
+        }
+        
+        if (!response.ok || !response.body) {
+            if (response.status === 400) {
+                const data = await response.json();
+                this.showError(data.error || 'Ocorreu um erro ao processar sua mensagem');
+                return true;
+            }
+            return false;
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let text = '';
+        let content = null;
+        
+        const handleEvent = (event, data) => {
+            if (event === 'delta') {
+                // The summary is rendered progressively in a single bot message
+                text += data.texto;
+                if (!content) {
+                    this.hideTypingIndicator();
+                    content = this.addMessage(text, 'bot');
+                } else {
+                    content.innerHTML = this.formatMessage(text);
+                    this.scrollToBottom();
+                }
+            } else if (event === 'fim') {
+                if (data.pdf_url) {
+                    this.pdfUrl = data.pdf_url;
+                    this.showPDFDownload();
+                }
+            } else if (event === 'erro') {
+                this.showError(data.error || 'Ocorreu um erro ao processar sua mensagem');
+            }
+        };
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const block = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                
+                let event = 'message';
+                let data = '';
+                block.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) event = line.slice(6).trim();
+                    else if (line.startsWith('data:')) data += line.slice(5).trim();
+                });
+                if (data) handleEvent(event, JSON.parse(data));
+            }
+        }
+        
+        return true;
+    }
+    
     async addMultipleProducts(message) {
         this.messageInput.value = '';
         this.sendBtn.disabled = true;
@@ -465,6 +548,7 @@ class ChatApp {
         
         this.chatMessages.appendChild(messageDiv);
         this.scrollToBottom();
+        return content;
     }
     
     formatMessage(text) {
@@ -520,14 +604,34 @@ class ChatApp {
         this.scrollToBottom();
     }
     
-    downloadPDF() {
-        if (this.pdfUrl) {
+    async downloadPDF() {
+        if (!this.pdfUrl) return;
+        
+        try {
+            // PDF ainda na fila: o servidor responde 202 com Retry-After
+            let response = await fetch(this.pdfUrl);
+            while (response.status === 202) {
+                const segundos = parseInt(response.headers.get('Retry-After'), 10) || 1;
+                await new Promise(resolve => setTimeout(resolve, segundos * 1000));
+                response = await fetch(this.pdfUrl);
+            }
+            if (!response.ok) {
+                const data = await response.json().catch(() => ({}));
+                this.showError(data.error || 'Não foi possível gerar o PDF');
+                return;
+            }
+            
+            const url = URL.createObjectURL(await response.blob());
             const link = document.createElement('a');
-            link.href = this.pdfUrl;
+            link.href = url;
             link.download = `orcamento_${Date.now()}.pdf`;
             document.body.appendChild(link);
             link.click();
             document.body.removeChild(link);
+            URL.revokeObjectURL(url);
+        } catch (error) {
+            console.error('Error downloading PDF:', error);
+            this.showError('Erro de conexão. Verifique sua internet e tente novamente.');
         }
     }
     
@@ -0,0 +1,30 @@
+"""Fixtures dos testes: app importado offline e um catálogo sintético pequeno"""
+import contextlib
+import io
+
+import pytest
+
+from benchmarks.ambiente import importar_app
+from benchmarks.catalogo_sintetico import gerar_planilha
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """Módulo `app` importado com o ambiente dos benchmarks (sem GLM, caches temporários)"""
+    return importar_app(diretorio=str(tmp_path_factory.mktemp('app')))
+
+
+@pytest.fixture(scope='session')
+def catalogo(app, tmp_path_factory):
+    """Catálogo sintético com 300 balcões, lido direto da planilha"""
+    planilha = gerar_planilha(str(tmp_path_factory.mktemp('catalogo') / 'sintetico.xlsx'), n_balcoes=300)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return app.SistemaBalcoes(planilha, usar_snapshot=False)
+
+
+@pytest.fixture(scope='session')
+def cliente(app, catalogo):
+    """Cliente de teste do Flask, com o catálogo sintético publicado como atual"""
+    app.catalogos_ativos[catalogo.versao] = catalogo
+    app.sistema_balcoes = catalogo
+    return app.create_app().test_client()
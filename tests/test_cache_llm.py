@@ -0,0 +1,59 @@
+"""Cache das respostas da IA: coalescência, TTL, LRU, camada SQLite e erros fora do cache"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+
+def test_chamadas_simultaneas_coalescidas(app):
+    cache = app.CacheLLM()
+    liberar, chamadas = threading.Event(), []
+
+    def calcular():
+        chamadas.append(1)
+        liberar.wait(5)
+        return {'opcao': 2}
+
+    with ThreadPoolExecutor(8) as executor:
+        futuros = [executor.submit(cache.obter_ou_calcular, 'k', calcular) for _ in range(8)]
+        limite = time.time() + 5
+        while cache.estatisticas['coalescidas'] < 7 and time.time() < limite:
+            time.sleep(0.01)
+        liberar.set()
+        assert [f.result() for f in futuros] == [{'opcao': 2}] * 8
+    assert len(chamadas) == 1
+    assert (cache.estatisticas['faltas'], cache.estatisticas['coalescidas']) == (1, 7)
+
+
+def test_erro_repassado_e_nao_guardado(app):
+    cache = app.CacheLLM()
+
+    def falhar():
+        raise TimeoutError('GLM fora')
+    with pytest.raises(TimeoutError):
+        cache.obter_ou_calcular('k', falhar)
+    assert cache.obter_ou_calcular('k', lambda: 'ok') == 'ok'
+
+
+def test_ttl_e_lru(app):
+    cache = app.CacheLLM(max_itens=2, ttl=0.05)
+    for chave in 'abc':
+        cache.obter_ou_calcular(chave, lambda: chave)
+    assert cache.obter_ou_calcular('a', lambda: 'recalculado') == 'recalculado'  # saiu pelo LRU
+    assert cache.obter_ou_calcular('c', lambda: 'recalculado') == 'c'
+    time.sleep(0.1)
+    assert cache.obter_ou_calcular('c', lambda: 'expirado') == 'expirado'
+
+
+def test_camada_sqlite_compartilhada(app, tmp_path):
+    caminho = str(tmp_path / 'llm.db')
+    app.CacheLLM(caminho_db=caminho).obter_ou_calcular('k', lambda: {'opcao': 1})
+    outro_worker = app.CacheLLM(caminho_db=caminho)
+    assert outro_worker.obter_ou_calcular('k', lambda: {'opcao': 9}) == {'opcao': 1}
+    assert outro_worker.estatisticas['acertos_sqlite'] == 1
+
+
+def test_chave_normaliza_a_mensagem(app):
+    assert app.chave_cache_llm(3, 'v1', 'Trocar a DOBRADIÇA!') == app.chave_cache_llm(3, 'v1', 'trocar  a dobradica')
+    assert app.chave_cache_llm(3, 'v1', 'x') != app.chave_cache_llm(3, 'v2', 'x')
@@ -0,0 +1,83 @@
+"""CatalogoSQLite: mesmos resultados do catálogo em memória (com FTS5 ou sem), listagem por tipo e poda das versões"""
+import contextlib
+import io
+import os
+import random
+import shutil
+
+import pytest
+
+from benchmarks.catalogo_sintetico import gerar_planilha
+
+
+@pytest.fixture(scope='module')
+def planilha(tmp_path_factory):
+    caminho = str(tmp_path_factory.mktemp('sqlite') / 'catalogo.xlsx')
+    gerar_planilha(caminho, n_balcoes=400, componentes_por_balcao=5, semente=31)
+    return caminho
+
+
+def abrir(app, planilha, diretorio, monkeypatch, fts5):
+    """Catálogo em memória e SQLite da mesma planilha, com o índice de busca em FTS5 ou em tabelas"""
+    copia = os.path.join(diretorio, 'catalogo.xlsx')
+    shutil.copy(planilha, copia)
+    monkeypatch.setattr(app, 'fts5_disponivel', lambda: fts5)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return app.SistemaBalcoes(copia, usar_snapshot=False), app.CatalogoSQLite(copia, usar_snapshot=False)
+
+
+@pytest.mark.parametrize('fts5', [True, False], ids=['fts5', 'tabelas'])
+def test_busca_igual_ao_catalogo_em_memoria(app, planilha, tmp_path, monkeypatch, fts5):
+    if fts5 and not app.fts5_disponivel():
+        pytest.skip('SQLite sem FTS5')
+    memoria, sqlite = abrir(app, planilha, str(tmp_path), monkeypatch, fts5)
+    assert sqlite.busca == ('fts5' if fts5 else 'tabelas')
+    rnd = random.Random(4)
+    textos = [b.nome for b in memoria.listar_todos_balcoes()] + [b.descricao for b in memoria.listar_todos_balcoes()]
+    consultas = rnd.sample(textos, 60) + ['balcão inferior', 'balcao iferior gavetaz', '2 portas', 'xyz', 'modelo 17']
+    for consulta in consultas:
+        for tipo in (None, 'inferior', 'superior'):
+            esperado = [(b.id, round(p, 9)) for b, p in memoria.buscar_balcoes(consulta, tipo=tipo, limite=10)]
+            obtido = [(b.id, round(p, 9)) for b, p in sqlite.buscar_balcoes(consulta, tipo=tipo, limite=10)]
+            assert obtido == esperado, (consulta, tipo)
+
+
+def test_listagem_por_tipo_indexada(app, planilha, tmp_path, monkeypatch):
+    memoria, sqlite = abrir(app, planilha, str(tmp_path), monkeypatch, app.fts5_disponivel())
+    for tipo in ('inferior', 'superior'):
+        esperado = [b.id for b in memoria.buscar_balcoes_por_tipo(tipo)]
+        lista = sqlite.buscar_balcoes_por_tipo(tipo)
+        assert len(lista) == len(esperado)
+        for i in (0, 1, len(esperado) // 2, len(esperado) - 1, -1, -len(esperado)):
+            assert lista[i].id == esperado[i]
+        assert [b.id for b in lista[5:20:3]] == esperado[5:20:3]
+        with pytest.raises(IndexError):
+            lista[len(esperado)]
+        assert [b.id for b in lista] == esperado
+
+
+def test_poda_das_versoes_aposentadas(app, tmp_path, monkeypatch):
+    planilha = str(tmp_path / 'catalogo.xlsx')
+    versoes = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for semente in (1, 2):
+            gerar_planilha(planilha, n_balcoes=20, semente=semente)
+            catalogo = app.CatalogoSQLite(planilha)
+            app.marcar_publicacao(catalogo)
+            versoes.append(catalogo)
+    antigo, atual = versoes
+    monkeypatch.setattr(app, 'sistema_balcoes', atual)
+    monkeypatch.setattr(app, 'conversas', app.ArmazemSessoesMemoria())
+    assert set(app.arquivos_das_versoes(planilha)) == {antigo.versao, atual.versao}
+    # Aposentada há menos que o TTL: continua no disco
+    assert app.podar_versoes_catalogo(planilha, ttl=3600) == []
+    # Uma sessão ainda usa a versão antiga
+    app.conversas.salvar('s', app.ConversaBalcao(antigo))
+    assert app.podar_versoes_catalogo(planilha, ttl=0) == []
+    app.conversas.remover('s')
+    del catalogo, versoes
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert app.podar_versoes_catalogo(planilha, ttl=0) == [antigo.versao]
+    assert set(app.arquivos_das_versoes(planilha)) == {atual.versao}
+    assert app.carregar_versao(antigo.versao, planilha, 'sqlite') is None
+    assert app.carregar_versao(atual.versao, planilha, 'sqlite').versao == atual.versao
@@ -0,0 +1,82 @@
+"""Versões do catálogo: carga sob demanda das versões arquivadas e publicação entre workers"""
+import contextlib
+import gc
+import io
+import time
+
+import pytest
+
+from benchmarks.catalogo_sintetico import gerar_planilha
+
+
+def carregar(app, planilha, backend, semente):
+    """Grava a planilha com `semente` e a carrega (a versão anterior continua arquivada)"""
+    gerar_planilha(planilha, n_balcoes=30, semente=semente)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return app.criar_catalogo(planilha, backend)
+
+
+def precos(catalogo):
+    return {b.id: b.calcular_preco_total() for b in catalogo.listar_todos_balcoes()}
+
+
+@pytest.mark.parametrize('backend', ['memoria', 'sqlite'])
+def test_versao_arquivada_carregada_sob_demanda(app, tmp_path, monkeypatch, backend):
+    planilha = str(tmp_path / 'catalogo.xlsx')
+    antigo = carregar(app, planilha, backend, semente=1)
+    versao_antiga, precos_antigos = antigo.versao, precos(antigo)
+    novo = carregar(app, planilha, backend, semente=2)
+    assert novo.versao != versao_antiga
+    monkeypatch.setattr(app, 'sistema_balcoes', novo)
+    # Este processo não tem mais a versão antiga (como um worker que não a carregou)
+    del antigo
+    gc.collect()
+    assert versao_antiga not in app.catalogos_ativos
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        reaberto = app.catalogo_da_versao(versao_antiga)
+    assert reaberto.versao == versao_antiga and precos(reaberto) == precos_antigos
+    assert app.catalogo_da_versao(versao_antiga) is reaberto
+
+
+def test_sessao_de_outro_worker_mantem_a_versao(app, tmp_path, monkeypatch):
+    planilha = str(tmp_path / 'catalogo.xlsx')
+    antigo = carregar(app, planilha, 'memoria', semente=1)
+    conversa = app.ConversaBalcao(antigo)
+    conversa.balcao_selecionado = antigo.listar_todos_balcoes()[0]
+    dados, total = conversa.serializar(), conversa.calcular_orcamento_final()
+    novo = carregar(app, planilha, 'memoria', semente=2)
+    monkeypatch.setattr(app, 'sistema_balcoes', novo)
+    del antigo, conversa
+    gc.collect()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        restaurada = app.ConversaBalcao.desserializar(dados)
+    assert restaurada.catalogo is not novo and restaurada.calcular_orcamento_final() == total
+
+
+def test_versao_sem_arquivo_indisponivel(app, catalogo, monkeypatch):
+    monkeypatch.setattr(app, 'sistema_balcoes', catalogo)
+    for versao in ('0' * 12, '../../etc/pa'):
+        with pytest.raises(app.CatalogoIndisponivel):
+            app.catalogo_da_versao(versao)
+
+
+def test_worker_adota_versao_publicada(app, tmp_path, monkeypatch):
+    planilha = str(tmp_path / 'catalogo.xlsx')
+    antigo = carregar(app, planilha, 'memoria', semente=1)
+    novo = carregar(app, planilha, 'memoria', semente=2)
+    versao_nova = novo.versao
+    monkeypatch.setattr(app, 'sistema_balcoes', antigo)
+    monkeypatch.setitem(app._publicacao, 'verificada_em', 0.0)
+    # Outro worker recarregou e publicou a versão nova
+    app.marcar_publicacao(novo)
+    del novo
+    gc.collect()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        app.verificar_publicacao()
+        limite = time.monotonic() + 10
+        while app.sistema_balcoes.versao != versao_nova and time.monotonic() < limite:
+            time.sleep(0.05)
+    assert app.sistema_balcoes.versao == versao_nova
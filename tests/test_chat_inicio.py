@@ -0,0 +1,44 @@
+"""Primeira mensagem do chat: mensagens genéricas perguntam o tipo, nomes citados escolhem o balcão"""
+import pytest
+
+
+@pytest.fixture
+def iniciar(app, catalogo, monkeypatch):
+    monkeypatch.setattr(app, 'sistema_balcoes', catalogo)
+
+    def enviar(mensagem):
+        conversa = app.ConversaBalcao(catalogo)
+        resposta = app.processar_mensagem(conversa, mensagem, 'teste')
+        return conversa, resposta
+    return enviar
+
+
+@pytest.mark.parametrize('mensagem', ['quero um balcão', 'quero um com porta', 'oi', 'preciso de um orçamento'])
+def test_mensagem_generica_pergunta_o_tipo(app, iniciar, mensagem):
+    conversa, resposta = iniciar(mensagem)
+    assert conversa.balcao_selecionado is None
+    assert conversa.estado == app.ESTADOS['INICIO']
+    assert '**superior** ou **inferior**' in resposta['response']
+
+
+@pytest.mark.parametrize('mensagem', ['gaveta', 'quero um balcão inferior', 'balcão de baixo com porta'])
+def test_tipo_sem_modelo_lista_as_opcoes(app, iniciar, mensagem):
+    conversa, resposta = iniciar(mensagem)
+    assert conversa.balcao_selecionado is None
+    assert conversa.estado == app.ESTADOS['TIPO_SELECIONADO']
+    assert 'balcão inferior' in resposta['response']
+
+
+def test_modelo_citado_e_escolhido(app, iniciar, catalogo):
+    balcao = catalogo.listar_todos_balcoes()[16]
+    for mensagem in (balcao.nome, f'quero o balcão {balcao.id}', f'{balcao.tipo} {balcao.id}'):
+        conversa, _ = iniciar(mensagem)
+        assert conversa.balcao_selecionado is balcao
+        assert conversa.estado == app.ESTADOS['PRODUTO_SELECIONADO']
+
+
+def test_busca_citada_exige_palavra_do_nome(catalogo):
+    assert catalogo.buscar_balcao_por_nome('quero um balcão') is None
+    assert catalogo.buscar_balcao_citado('com porta', tipo='inferior') is None
+    balcao = catalogo.listar_todos_balcoes()[5]
+    assert catalogo.buscar_balcao_por_nome(f'balcao {balcao.id}') is balcao
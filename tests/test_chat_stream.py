@@ -0,0 +1,32 @@
+"""/chat/stream: mesmos textos do /chat, em eventos delta seguidos de um fim"""
+import json
+import uuid
+
+
+def eventos(resposta):
+    """[(evento, dados)] de um corpo text/event-stream"""
+    lidos = []
+    for bloco in resposta.get_data(as_text=True).split('\n\n'):
+        linhas = dict(linha.split(': ', 1) for linha in bloco.split('\n') if linha and not linha.startswith(':'))
+        if linhas:
+            lidos.append((linhas['event'], json.loads(linhas['data'])))
+    return lidos
+
+
+def test_stream_igual_ao_chat(cliente, catalogo):
+    balcao = catalogo.listar_todos_balcoes()[16]
+    sessao_chat, sessao_stream = uuid.uuid4().hex, uuid.uuid4().hex
+    for mensagem in ('oi', balcao.nome, 'trocar a dobradiça para hafele', 'finalizar'):
+        esperado = cliente.post('/chat', json={'message': mensagem, 'session_id': sessao_chat}).get_json()
+        lidos = eventos(cliente.post('/chat/stream', json={'message': mensagem, 'session_id': sessao_stream}))
+
+        nomes = [evento for evento, _ in lidos]
+        assert set(nomes) <= {'delta', 'fim'} and nomes[-1] == 'fim'
+        assert ''.join(dados['texto'] for evento, dados in lidos if evento == 'delta') == esperado['response']
+        assert (lidos[-1][1]['pdf_url'] is None) == (esperado['pdf_url'] is None)
+
+
+def test_resumo_em_varios_trechos(cliente, catalogo):
+    balcao = catalogo.listar_todos_balcoes()[16]
+    lidos = eventos(cliente.post('/chat/stream', json={'message': balcao.nome, 'session_id': uuid.uuid4().hex}))
+    assert sum(evento == 'delta' for evento, _ in lidos) > 1
@@ -0,0 +1,91 @@
+"""As k melhores configurações do heap são as mesmas da força bruta sobre todas as combinações"""
+import contextlib
+import io
+import itertools
+
+import pytest
+
+from benchmarks.catalogo_sintetico import gerar_planilha
+
+
+@pytest.fixture(scope='module')
+def catalogo_pequeno(app, tmp_path_factory):
+    """Poucos componentes por balcão, para que a força bruta caiba no teste (até 5^4 combinações)"""
+    planilha = gerar_planilha(str(tmp_path_factory.mktemp('pequeno') / 'pequeno.xlsx'),
+                              n_balcoes=40, componentes_por_balcao=4, semente=23)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return app.SistemaBalcoes(planilha, usar_snapshot=False)
+
+
+def opcoes_por_componente(balcao, cor=None):
+    """Para cada componente personalizável: o padrão (None) e cada marca/cor distinta"""
+    grupos = []
+    for comp in balcao.componentes:
+        if not comp.alternativas:
+            continue
+        opcoes, vistas = [None], set()
+        for alt in comp.alternativas:
+            chave = (alt.marca_alternativa.strip().lower(), alt.cor_alternativa.strip().lower())
+            if chave not in vistas:
+                vistas.add(chave)
+                opcoes.append(alt)
+        if cor:
+            restritas = [alt for alt in opcoes if (alt.cor_alternativa if alt else comp.cor_padrao) == cor]
+            opcoes = restritas or opcoes  # sem opção na cor pedida, o componente fica livre
+        grupos.append((comp, opcoes))
+    return grupos
+
+
+def forca_bruta(app, catalogo, balcao, cor=None):
+    """Total de cada combinação, calculado por uma ConversaBalcao"""
+    grupos = opcoes_por_componente(balcao, cor)
+    totais = []
+    for escolha in itertools.product(*(opcoes for _, opcoes in grupos)):
+        conversa = app.ConversaBalcao(catalogo)
+        conversa.balcao_selecionado = balcao
+        for (comp, _), alt in zip(grupos, escolha):
+            if alt is not None:
+                assert conversa.aplicar_personalizacao(comp.nome, alt)
+        totais.append(conversa.calcular_orcamento_final())
+    return totais
+
+
+def total_da_configuracao(app, catalogo, balcao, configuracao):
+    conversa = app.ConversaBalcao(catalogo)
+    conversa.balcao_selecionado = balcao
+    for p in configuracao['personalizacoes']:
+        comp = next(c for c in balcao.componentes if c.nome == p['componente'])
+        alt = next(a for a in comp.alternativas if a.marca_alternativa == p['marca'] and a.cor_alternativa == p['cor'])
+        assert conversa.aplicar_personalizacao(comp.nome, alt)
+    return conversa.calcular_orcamento_final()
+
+
+@pytest.mark.parametrize('cor', [None, 'preto'])
+def test_melhores_igual_forca_bruta(app, catalogo_pequeno, cor):
+    for balcao in catalogo_pequeno.listar_todos_balcoes():
+        totais = sorted(forca_bruta(app, catalogo_pequeno, balcao, cor))
+        opcoes = app.OpcoesConfiguracao(balcao, cor=cor)
+        for k in (1, 7, len(totais) // 2):
+            # Combinações de mesmo total em centavos podem diferir no último bit do float e
+            # sair em qualquer ordem entre si: a ordem é conferida ao centavo
+            assert [round(c['total'], 2) for c in opcoes.melhores(k)] == [round(t, 2) for t in totais[:k]]
+            assert [round(c['total'], 2) for c in opcoes.melhores(k, mais_caras=True)] == [round(t, 2) for t in totais[::-1][:k]]
+        # Pedindo mais que o total de combinações, vêm todas, cada uma uma vez e com o total exato do caminho escalar
+        todas = opcoes.melhores(len(totais) + 3)
+        assert sorted(c['total'] for c in todas) == totais
+        assert len({tuple((p['componente'], p['marca'], p['cor']) for p in c['personalizacoes']) for c in todas}) == len(totais)
+        for configuracao in todas[:7] + todas[-7:]:
+            assert configuracao['total'] == total_da_configuracao(app, catalogo_pequeno, balcao, configuracao)
+        menor, maior = opcoes.faixa()
+        assert (round(menor, 2), round(maior, 2)) == (round(totais[0], 2), round(totais[-1], 2))
+
+
+def test_melhores_sem_enumerar(app, catalogo):
+    """Balcões de 8 componentes (até 5^8 combinações): só k configurações, em ordem"""
+    for balcao in catalogo.listar_todos_balcoes()[:50]:
+        opcoes = app.OpcoesConfiguracao(balcao)
+        baratas = opcoes.melhores(20)
+        assert len(baratas) == 20
+        totais = [round(c['total'], 2) for c in baratas]
+        assert totais == sorted(totais) and baratas[0]['total'] == balcao.calcular_preco_total()
+        assert baratas[-1]['total'] == total_da_configuracao(app, catalogo, balcao, baratas[-1])
@@ -0,0 +1,48 @@
+"""Disjuntor do GLM: abre após falhas seguidas, deixa uma chamada de teste passar e fecha com sucesso"""
+import contextlib
+import io
+import time
+
+import pytest
+
+from benchmarks.stub_glm import ServidorGLMStub
+
+
+def test_transicoes_do_disjuntor(app):
+    disjuntor = app.DisjuntorLLM(falhas_para_abrir=2, tempo_aberto=0.1)
+    assert disjuntor.estado == 'fechado' and disjuntor.permitir()
+    disjuntor.registrar_falha()
+    assert disjuntor.estado == 'fechado'
+    disjuntor.registrar_falha()
+    assert disjuntor.estado == 'aberto' and not disjuntor.permitir() and not disjuntor.disponivel()
+
+    time.sleep(0.15)
+    assert disjuntor.estado == 'meio_aberto' and disjuntor.disponivel()
+    # Só uma chamada de teste por vez no meio-aberto
+    assert disjuntor.permitir() and not disjuntor.permitir()
+    disjuntor.registrar_falha()
+    assert disjuntor.estado == 'aberto'
+
+    time.sleep(0.15)
+    assert disjuntor.permitir()
+    disjuntor.registrar_sucesso()
+    assert disjuntor.estado == 'fechado' and disjuntor.falhas == 0
+
+
+def test_gateway_recusa_com_circuito_aberto(app):
+    mensagens = [{"role": "user", "content": "oi"}]
+    with ServidorGLMStub(status=500) as stub, contextlib.redirect_stdout(io.StringIO()):
+        gateway = app.GatewayLLM(api_key='stub', base_url=stub.url, timeout=2,
+                                 disjuntor=app.DisjuntorLLM(falhas_para_abrir=2, tempo_aberto=0.3))
+        for _ in range(2):
+            with pytest.raises(app.ErroLLM):
+                gateway.completar_sync(mensagens)
+        # Aberto: a chamada é recusada sem chegar ao GLM
+        with pytest.raises(app.CircuitoAberto):
+            gateway.completar_sync(mensagens)
+        assert stub.chamadas == 2 and not gateway.disponivel()
+
+        stub.status = 200
+        time.sleep(0.35)
+        assert gateway.completar_sync(mensagens)['conteudo']
+        assert gateway.disjuntor.estado == 'fechado' and stub.chamadas == 3
@@ -0,0 +1,34 @@
+"""Extração de vários produtos de uma mensagem (/extract-products)"""
+import pytest
+
+
+@pytest.mark.parametrize('mensagem, esperado', [
+    ('balcão inferior basculante com puxador preto e branco', [(1, 'balcao inferior basculante', ['puxador preto e branco'])]),
+    ('1 balcão inferior e 2 balcões superiores', [(1, 'balcao inferior', []), (2, 'balcoes superiores', [])]),
+    ('balcao basculante com puxador zen e dobradiça fgv', [(1, 'balcao basculante', ['puxador zen', 'dobradica fgv'])]),
+    ('dois balcões e também um aéreo', [(2, 'balcoes', []), (1, 'aereo', [])]),
+    ('balcão coplanar mais barato', [(1, 'balcao coplanar mais barato', [])]),
+])
+def test_quebra_em_itens(app, mensagem, esperado):
+    assert [(i['quantidade'], i['texto'], i['personalizacoes']) for i in app.quebrar_itens(mensagem)] == esperado
+
+
+def test_quantidades_acima_do_maximo(app):
+    assert app.quebrar_itens('999999999 balcões')[0]['quantidade'] > app.EXTRACAO_QUANTIDADE_MAX
+    # Sem converter o número inteiro (int() recusa textos com milhares de dígitos)
+    assert app.quebrar_itens('9' * 5000 + ' balcões')[0]['quantidade'] > app.EXTRACAO_QUANTIDADE_MAX
+
+
+def test_extrai_e_precifica_cada_item(app, catalogo):
+    primeiro, segundo = catalogo.listar_todos_balcoes()[:2]
+    produtos, nao_identificados = app.extrair_produtos(f"2 {primeiro.nome} e 1 {segundo.nome}", catalogo)
+    assert nao_identificados == []
+    assert [(p['balcao_id'], p['quantity'], p['origem']) for p in produtos] == [(primeiro.id, 2, 'local'), (segundo.id, 1, 'local')]
+    assert produtos[0]['price'] == app.centavos(primeiro.calcular_preco_total()) / 100
+
+
+def test_rota_recusa_quantidade_excessiva(app, catalogo, cliente):
+    balcao = catalogo.listar_todos_balcoes()[0]
+    resposta = cliente.post('/extract-products', json={'message': f"999999999 {balcao.nome}"})
+    assert resposta.status_code == 422
+    assert resposta.get_json()['nao_identificados'] == [f"999999999 {app.normalizar_texto(balcao.nome)}"]
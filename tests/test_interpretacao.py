@@ -0,0 +1,44 @@
+"""Interpretação local de personalizações e o cache de termos dos componentes"""
+import contextlib
+import gc
+import io
+
+from benchmarks.catalogo_sintetico import gerar_planilha
+
+
+def com_alternativas(catalogo):
+    for balcao in catalogo.listar_todos_balcoes():
+        for componente in balcao.componentes:
+            if len(componente.alternativas) > 1:
+                return balcao, componente
+
+
+def test_interpreta_pedido_com_nome_marca_e_cor(catalogo):
+    balcao, componente = com_alternativas(catalogo)
+    for alternativa in componente.alternativas:
+        pedido = f"trocar {componente.nome} para {alternativa.marca_alternativa} {alternativa.cor_alternativa}"
+        interpretacao = balcao.interpretador.interpretar(pedido)
+        mesmas = [a for a in componente.alternativas
+                  if (a.marca_alternativa, a.cor_alternativa) == (alternativa.marca_alternativa, alternativa.cor_alternativa)]
+        if len(mesmas) > 1:
+            continue
+        assert interpretacao is not None, pedido
+        assert interpretacao.componente.nome == componente.nome
+        assert interpretacao.alternativa is alternativa
+
+
+def test_pedido_sem_relacao_nao_casa(catalogo):
+    balcao, _ = com_alternativas(catalogo)
+    assert balcao.interpretador.interpretar('qual o prazo de entrega?') is None
+
+
+def test_cache_de_termos_esvaziado_com_a_versao(app, tmp_path):
+    planilha = gerar_planilha(str(tmp_path / 'catalogo.xlsx'), n_balcoes=30, semente=5)
+    with contextlib.redirect_stdout(io.StringIO()):
+        descartavel = app.SistemaBalcoes(planilha, usar_snapshot=False)
+    for balcao in descartavel.listar_todos_balcoes():
+        balcao.interpretador
+    assert app.termos_componente.cache_info().currsize > 0
+    del descartavel, balcao
+    gc.collect()
+    assert app.termos_componente.cache_info().currsize == 0
@@ -0,0 +1,58 @@
+"""/balcoes: paginação por cursor, seleção de campos, ETag e compressão"""
+import gzip
+import json
+
+import pytest
+
+
+def paginas(cliente, **parametros):
+    """Percorre a listagem seguindo proximo_cursor; devolve (totais, ids)"""
+    totais, ids, cursor = set(), [], None
+    while True:
+        resposta = cliente.get('/balcoes', query_string=dict(parametros, **({'cursor': cursor} if cursor else {})))
+        assert resposta.status_code == 200
+        dados = resposta.get_json()
+        totais.add(dados['total'])
+        ids.extend(balcao['id'] for balcao in dados['balcoes'])
+        cursor = dados['proximo_cursor']
+        if cursor is None:
+            return totais, ids
+
+
+@pytest.mark.parametrize('tipo', [None, 'inferior', 'superior'])
+def test_cursor_percorre_a_listagem_inteira(app, catalogo, cliente, tipo):
+    completa = [b.id for b in (catalogo.buscar_balcoes_por_tipo(tipo) if tipo else catalogo.listar_todos_balcoes())]
+    totais, ids = paginas(cliente, limite=7, **({'tipo': tipo} if tipo else {}))
+    assert ids == completa
+    assert totais == {len(completa)}
+
+
+def test_cursor_e_codificacao_ida_e_volta(app):
+    assert app.decodificar_cursor(app.codificar_cursor(123)) == 123
+    for invalido in ('', 'xyz', app.codificar_cursor('1')):
+        with pytest.raises(ValueError):
+            app.decodificar_cursor(invalido)
+
+
+def test_cursores_invalidos_recusados(app, catalogo, cliente):
+    assert cliente.get('/balcoes?limite=5&cursor=@@').status_code == 400
+    superior = catalogo.buscar_balcoes_por_tipo('superior')[0]
+    # Cursor de outra listagem (o balcão não está nesta)
+    resposta = cliente.get('/balcoes', query_string={'tipo': 'inferior', 'cursor': app.codificar_cursor(superior.id)})
+    assert resposta.status_code == 400
+
+
+def test_campos_selecionados(cliente):
+    dados = cliente.get('/balcoes?limite=3&campos=nome,id').get_json()
+    assert [sorted(balcao) for balcao in dados['balcoes']] == [['id', 'nome']] * 3
+    assert cliente.get('/balcoes?campos=id,senha').status_code == 400
+    assert cliente.get('/balcoes?limite=0').status_code == 400
+
+
+def test_etag_e_compressao(cliente):
+    resposta = cliente.get('/balcoes?limite=20')
+    assert cliente.get('/balcoes?limite=20', headers={'If-None-Match': resposta.headers['ETag']}).status_code == 304
+    comprimida = cliente.get('/balcoes?limite=20', headers={'Accept-Encoding': 'gzip'})
+    assert comprimida.headers['Content-Encoding'] == 'gzip'
+    assert comprimida.headers['ETag'] != resposta.headers['ETag']
+    assert json.loads(gzip.decompress(comprimida.data)) == resposta.get_json()
@@ -0,0 +1,35 @@
+"""/metrics: exportação no formato do Prometheus, sem consultar o armazém de sessões"""
+import time
+
+
+def valor(texto, serie):
+    for linha in texto.splitlines():
+        if linha.startswith(serie + ' '):
+            return float(linha.split()[-1])
+    raise AssertionError(f"{serie} ausente")
+
+
+def test_exporta_familias_descritas(cliente):
+    resposta = cliente.get('/metrics')
+    assert resposta.status_code == 200
+    texto = resposta.get_data(as_text=True)
+    assert '# TYPE architec_conversas_ativas gauge' in texto
+    assert '# TYPE architec_etapa_duracao_segundos histogram' in texto
+    assert valor(texto, 'architec_catalogo_versoes_carregadas') >= 1
+
+
+def test_conversas_ativas_sem_consultar_o_sqlite(app, catalogo, cliente, tmp_path, monkeypatch):
+    armazem = app.ArmazemSessoesSQLite(str(tmp_path / 'sessoes.db'), intervalo=0.02, intervalo_contagem=0)
+    monkeypatch.setattr(app, 'conversas', armazem)
+    for i in range(3):
+        armazem.salvar(f"s{i}", app.ConversaBalcao(catalogo))
+    # A thread de gravação grava e conta; o /metrics só lê a última contagem
+    limite = time.time() + 5
+    while armazem.contagem() != 3 and time.time() < limite:
+        time.sleep(0.02)
+
+    def proibido(*args):
+        raise AssertionError('o /metrics não deve contar sessões no banco')
+    monkeypatch.setattr(app.ArmazemSessoesSQLite, '__len__', proibido)
+    texto = cliente.get('/metrics').get_data(as_text=True)
+    assert valor(texto, 'architec_conversas_ativas') == 3
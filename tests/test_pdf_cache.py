@@ -0,0 +1,54 @@
+"""Cache de PDFs por conteúdo: chave por dia, reaproveitamento e LRU por bytes"""
+import base64
+import os
+import re
+import zlib
+
+
+def conversa_finalizada(app, catalogo, indice):
+    conversa = app.ConversaBalcao(catalogo)
+    conversa.balcao_selecionado = catalogo.listar_todos_balcoes()[indice]
+    conversa.estado = app.ESTADOS['ORCAMENTO_FINALIZADO']
+    return conversa
+
+
+def test_chave_muda_com_o_dia_e_o_conteudo(app, catalogo):
+    conversa = conversa_finalizada(app, catalogo, 0)
+    assert app.chave_pdf(conversa, '01/03/2026') == app.chave_pdf(conversa_finalizada(app, catalogo, 0), '01/03/2026')
+    assert app.chave_pdf(conversa, '01/03/2026') != app.chave_pdf(conversa, '02/03/2026')
+    assert app.chave_pdf(conversa, '01/03/2026') != app.chave_pdf(conversa_finalizada(app, catalogo, 1), '01/03/2026')
+
+
+def texto_pdf(conteudo):
+    """Streams do PDF descomprimidos (o ReportLab comprime as páginas)"""
+    streams = re.findall(rb'stream\r?\n(.*?)endstream', conteudo, re.S)
+    return b''.join(zlib.decompress(base64.a85decode(s.strip(), adobe=True)) for s in streams if s.strip().endswith(b'~>'))
+
+
+def test_pdf_mostra_a_data_do_orcamento(app, catalogo):
+    dados = app.dados_pdf(conversa_finalizada(app, catalogo, 0), '01/03/2026')
+    assert b'(Data: 01/03/2026)' in texto_pdf(app.renderizar_pdf(dados))
+
+
+def test_mesmo_orcamento_servido_do_cache(app, catalogo, tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'cache_pdf', app.CachePDF(diretorio=str(tmp_path)))
+    gerenciador = app.GerenciadorPDF(max_workers=1)
+    primeiro = gerenciador.enviar('a', conversa_finalizada(app, catalogo, 3))
+    assert gerenciador.aguardar(primeiro, 10) and primeiro['status'] == 'concluido'
+    renderizacoes = []
+    monkeypatch.setattr(app, 'renderizar_pdf', lambda dados: renderizacoes.append(dados))
+    segundo = gerenciador.enviar('b', conversa_finalizada(app, catalogo, 3))
+    assert segundo['chave'] == primeiro['chave']
+    assert segundo['status'] == 'concluido' and renderizacoes == []
+
+
+def test_lru_por_bytes_nas_duas_camadas(app, tmp_path):
+    cache = app.CachePDF(diretorio=str(tmp_path), max_memoria=10, max_disco=20)
+    for chave in 'abc':
+        cache.guardar(chave, chave.encode() * 8)
+    assert cache.obter('c') == ('memoria', b'c' * 8)
+    assert cache.obter('b') == ('disco', os.path.join(str(tmp_path), 'b.pdf'))  # só cabe um na memória
+    assert cache.obter('a') is None  # o mais antigo saiu do disco
+    assert cache.ocupacao() == {'memoria': 8, 'disco': 16}
+    # Outro worker (outra instância) enxerga o que está no disco
+    assert app.CachePDF(diretorio=str(tmp_path)).obter('c')[0] == 'disco'
@@ -0,0 +1,53 @@
+"""Fila de geração de PDFs: limite de pendentes e downloads que não prendem o worker"""
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def bloqueio(app, tmp_path, monkeypatch):
+    """Gerenciador e cache novos, com a renderização presa até o evento ser liberado"""
+    liberar = threading.Event()
+    renderizar = app.renderizar_pdf
+
+    def renderizar_preso(dados):
+        liberar.wait(10)
+        return renderizar(dados)
+    monkeypatch.setattr(app, 'renderizar_pdf', renderizar_preso)
+    monkeypatch.setattr(app, 'cache_pdf', app.CachePDF(diretorio=str(tmp_path)))
+    monkeypatch.setattr(app, 'gerenciador_pdf', app.GerenciadorPDF(max_workers=1, max_pendentes=2))
+    yield liberar
+    liberar.set()
+
+
+def conversa_finalizada(app, catalogo, indice):
+    conversa = app.ConversaBalcao(catalogo)
+    conversa.balcao_selecionado = catalogo.listar_todos_balcoes()[indice]
+    conversa.estado = app.ESTADOS['ORCAMENTO_FINALIZADO']
+    return conversa
+
+
+def test_fila_cheia_recusa_e_libera_as_vagas(app, catalogo, bloqueio):
+    gerenciador = app.gerenciador_pdf
+    jobs = [gerenciador.enviar(f"s{i}", conversa_finalizada(app, catalogo, i)) for i in range(2)]
+    assert gerenciador.enviar('s2', conversa_finalizada(app, catalogo, 2)) is None
+    assert jobs[1]['status'] == 'na_fila'  # o único worker está preso no primeiro
+    bloqueio.set()
+    assert all(gerenciador.aguardar(job, 10) for job in jobs)
+    assert [job['status'] for job in jobs] == ['concluido', 'concluido']
+    assert gerenciador.enviar('s2', conversa_finalizada(app, catalogo, 2)) is not None
+
+
+def test_download_responde_202_com_retry_after(app, catalogo, cliente, bloqueio, monkeypatch):
+    monkeypatch.setattr(app, 'PDF_WAIT_TIMEOUT', 0.05)
+    app.gerenciador_pdf.enviar('sessao-pdf', conversa_finalizada(app, catalogo, 5))
+    resposta = cliente.get('/download/pdf/sessao-pdf')
+    assert resposta.status_code == 202
+    assert resposta.headers['Retry-After'] == str(app.PDF_RETRY_AFTER)
+    assert resposta.get_json()['status'] in ('na_fila', 'gerando')
+
+    bloqueio.set()
+    app.gerenciador_pdf.aguardar(app.gerenciador_pdf.job_da_sessao('sessao-pdf'), 10)
+    resposta = cliente.get('/download/pdf/sessao-pdf')
+    assert resposta.status_code == 200
+    assert resposta.data.startswith(b'%PDF')
@@ -0,0 +1,68 @@
+"""Exportação de PDFs em lote: ZIP em streaming a partir do pool de processos"""
+import io
+import zipfile
+
+import pytest
+
+
+@pytest.fixture(scope='module')
+def exportador(app):
+    exportador = app.ExportadorPDF(processos=2, por_tarefa=2)
+    yield exportador
+    exportador._descartar_pool()
+
+
+@pytest.fixture
+def cache_vazio(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'cache_pdf', app.CachePDF(diretorio=str(tmp_path)))
+    return app.cache_pdf
+
+
+def itens(app, catalogo, quantidade):
+    resultado = []
+    for balcao in catalogo.listar_todos_balcoes()[:quantidade]:
+        conversa = app.ConversaBalcao(catalogo)
+        conversa.balcao_selecionado = balcao
+        conversa.estado = app.ESTADOS['ORCAMENTO_FINALIZADO']
+        resultado.append((f"orcamento_{balcao.id}.pdf", conversa))
+    return resultado
+
+
+def abrir(pedacos):
+    return zipfile.ZipFile(io.BytesIO(b''.join(pedacos)))
+
+
+def test_um_pdf_por_item(app, catalogo, exportador, cache_vazio):
+    lote = itens(app, catalogo, 7)
+    arquivo = abrir(exportador.zip(lote))
+    assert sorted(arquivo.namelist()) == sorted(nome for nome, _ in lote)
+    assert all(arquivo.read(nome).startswith(b'%PDF') for nome, _ in lote)
+
+
+def test_pdfs_do_cache_nao_sao_renderizados(app, catalogo, exportador, cache_vazio):
+    lote = itens(app, catalogo, 3)
+    data = app.datetime.now().strftime('%d/%m/%Y')
+    cache_vazio.guardar(app.chave_pdf(lote[0][1], data), b'%PDF do cache')
+    arquivo = abrir(exportador.zip(lote))
+    assert arquivo.read(lote[0][0]) == b'%PDF do cache'
+    assert arquivo.read(lote[1][0]).startswith(b'%PDF-')
+
+
+def test_falhas_listadas_em_erros_csv(app, catalogo, exportador, cache_vazio, monkeypatch):
+    lote = itens(app, catalogo, 3)
+    dados_pdf = app.dados_pdf
+
+    def dados_quebrados(conversa, data=None):
+        dados = dados_pdf(conversa, data)
+        if conversa is lote[1][1]:
+            del dados['componentes']
+        return dados
+    monkeypatch.setattr(app, 'dados_pdf', dados_quebrados)
+    arquivo = abrir(exportador.zip(lote, erros=[('sessao-x', 'sessão não encontrada')]))
+    erros = arquivo.read('erros.csv').decode('utf-8').splitlines()
+    assert erros[0] == 'referencia,erro'
+    assert 'sessao-x,sessão não encontrada' in erros
+    # A tarefa inteira (dois PDFs) falha junto
+    falhos = {linha.split(',')[0] for linha in erros[1:]} - {'sessao-x'}
+    assert lote[1][0] in falhos
+    assert set(arquivo.namelist()) == {nome for nome, _ in lote} - falhos | {'erros.csv'}
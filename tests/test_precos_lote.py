@@ -0,0 +1,79 @@
+"""A precificação vetorizada (TabelaPrecos) dá exatamente os totais do caminho escalar"""
+import random
+
+
+def configuracoes_aleatorias(catalogo, quantidade, semente):
+    """Configurações no formato do /quotes/batch; a mesma troca pode se repetir (vale a última)"""
+    rnd = random.Random(semente)
+    balcoes = catalogo.listar_todos_balcoes()
+    configuracoes = []
+    for n in range(quantidade):
+        balcao = rnd.choice(balcoes)
+        personalizacoes = []
+        for _ in range(rnd.randint(0, 6)):
+            componente = rnd.choice(balcao.componentes)
+            if componente.alternativas:
+                alt = rnd.choice(componente.alternativas)
+                personalizacoes.append({'componente': componente.nome, 'marca': alt.marca_alternativa, 'cor': alt.cor_alternativa})
+        configuracoes.append({
+            'referencia': n,
+            'balcao': rnd.choice([balcao.id, str(balcao.id), balcao.nome]),
+            'personalizacoes': personalizacoes
+        })
+    return configuracoes
+
+
+def total_escalar(app, catalogo, configuracao):
+    """Uma ConversaBalcao por configuração, personalizada pelo mesmo caminho do chat"""
+    conversa = app.ConversaBalcao(catalogo)
+    conversa.balcao_selecionado = next(b for b in catalogo.listar_todos_balcoes()
+                                       if configuracao['balcao'] in (b.id, str(b.id), b.nome))
+    for p in configuracao['personalizacoes']:
+        componente = next(c for c in conversa.balcao_selecionado.componentes if c.nome == p['componente'])
+        alternativa = next(a for a in componente.alternativas
+                           if a.marca_alternativa == p['marca'] and a.cor_alternativa == p['cor'])
+        assert conversa.aplicar_personalizacao(componente.nome, alternativa)
+    return conversa.calcular_orcamento_final()
+
+
+def test_lote_igual_ao_escalar(app, catalogo):
+    configuracoes = configuracoes_aleatorias(catalogo, 3000, semente=13)
+    resultados = app.precificar_lote(configuracoes, catalogo)
+    assert [r['referencia'] for r in resultados] == list(range(len(configuracoes)))
+    for configuracao, resultado in zip(configuracoes, resultados):
+        assert 'erro' not in resultado
+        # Igualdade exata, não aproximada: a ordem das somas é a mesma
+        assert resultado['total'] == total_escalar(app, catalogo, configuracao)
+
+
+def test_lote_sem_personalizacao_igual_ao_preco_total(app, catalogo):
+    balcoes = catalogo.listar_todos_balcoes()
+    resultados = app.precificar_lote([{'balcao': b.id} for b in balcoes], catalogo)
+    assert [r['total'] for r in resultados] == [b.calcular_preco_total() for b in balcoes]
+
+
+def test_lote_erros_por_configuracao(app, catalogo):
+    balcao = catalogo.listar_todos_balcoes()[0]
+    resultados = app.precificar_lote([
+        {'referencia': 'ok', 'balcao': balcao.id},
+        {'referencia': 'sem balcao', 'balcao': 10 ** 9},
+        {'referencia': 'componente', 'balcao': balcao.id, 'personalizacoes': [['nao existe', 'x', 'y']]},
+    ], catalogo)
+    assert resultados[0]['total'] == balcao.calcular_preco_total()
+    assert 'erro' in resultados[1] and 'erro' in resultados[2]
+
+
+def test_lote_csv(app, catalogo):
+    """Uma linha por personalização, agrupadas pela referência"""
+    configuracoes = configuracoes_aleatorias(catalogo, 200, semente=5)
+    linhas = ['referencia,balcao,componente,marca,cor']
+    ids = {}
+    for c in configuracoes:
+        balcao_id = next(b.id for b in catalogo.listar_todos_balcoes() if c['balcao'] in (b.id, str(b.id), b.nome))
+        ids[c['referencia']] = balcao_id
+        for p in c['personalizacoes'] or [{'componente': '', 'marca': '', 'cor': ''}]:
+            linhas.append(f"{c['referencia']},{balcao_id},{p['componente']},{p['marca']},{p['cor']}")
+    resultados = app.precificar_lote(app.ler_configuracoes_csv("\n".join(linhas)), catalogo)
+    for configuracao, resultado in zip(configuracoes, resultados):
+        assert resultado['balcao_id'] == ids[configuracao['referencia']]
+        assert resultado['total'] == total_escalar(app, catalogo, configuracao)
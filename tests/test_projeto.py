@@ -0,0 +1,86 @@
+"""Projetos: totais em centavos, dono do projeto e o PDF assinado"""
+import io
+import random
+import uuid
+
+import pytest
+
+
+def configuracao_aleatoria(rnd, balcoes):
+    balcao = rnd.choice(balcoes)
+    personalizacoes = [
+        {'componente': c.nome, 'marca': alt.marca_alternativa, 'cor': alt.cor_alternativa}
+        for c in balcao.componentes if c.alternativas and rnd.random() < 0.4
+        for alt in [rnd.choice(c.alternativas)]
+    ]
+    return {'balcao': balcao.id, 'quantidade': rnd.randint(1, 9), 'personalizacoes': personalizacoes}
+
+
+def test_totais_incrementais_iguais_a_soma(app, catalogo):
+    rnd = random.Random(5)
+    balcoes = catalogo.listar_todos_balcoes()
+    projeto = app.Projeto(catalogo)
+    for _ in range(500):
+        operacao = rnd.random()
+        if operacao < 0.5 or not projeto.itens:
+            projeto.adicionar(configuracao_aleatoria(rnd, balcoes))
+        elif operacao < 0.8:
+            projeto.alterar(rnd.choice(list(projeto.itens)), quantidade=rnd.randint(1, 20))
+        else:
+            projeto.remover(rnd.choice(list(projeto.itens)))
+        assert (projeto.unidades, projeto.total_centavos) == projeto.recalcular_total()
+    assert projeto.total == projeto.total_centavos / 100
+
+
+def test_erro_nao_altera_totais(app, catalogo):
+    projeto = app.Projeto(catalogo)
+    item = projeto.adicionar({'balcao': catalogo.listar_todos_balcoes()[0].id, 'quantidade': 2})
+    antes = projeto.resumo()
+    with pytest.raises(ValueError):
+        projeto.alterar(item.id, quantidade=3, personalizacoes=[{'componente': 'nao existe', 'marca': 'x', 'cor': 'y'}])
+    assert projeto.resumo() == antes and item.quantidade == 2
+
+
+def test_token_so_no_cabecalho(cliente, catalogo):
+    sid = uuid.uuid4().hex
+    balcao = catalogo.listar_todos_balcoes()[0]
+    r = cliente.post(f'/projeto/{sid}/itens', json={'balcao': balcao.id, 'quantidade': 2})
+    assert r.status_code == 201
+    token = r.get_json()['token']
+    assert cliente.get(f'/projeto/{sid}').status_code == 403
+    assert cliente.get(f'/projeto/{sid}?token={token}').status_code == 403
+    projeto = cliente.get(f'/projeto/{sid}', headers={'X-Projeto-Token': token}).get_json()
+    assert projeto['unidades'] == 2 and token not in projeto['pdf_url']
+    # Um segundo POST sem o token não entra no projeto
+    assert cliente.post(f'/projeto/{sid}/itens', json={'balcao': balcao.id}).status_code == 403
+
+
+def test_post_nao_toma_sessao_do_chat(app, cliente, catalogo):
+    sid = uuid.uuid4().hex
+    app.conversas.salvar(sid, app.ConversaBalcao(catalogo))
+    r = cliente.post(f'/projeto/{sid}/itens', json={'balcao': catalogo.listar_todos_balcoes()[0].id})
+    assert r.status_code == 403 and app.conversas.obter(sid).projeto is None
+
+
+def test_link_assinado_do_pdf(app, cliente, catalogo):
+    sid = uuid.uuid4().hex
+    r = cliente.post(f'/projeto/{sid}/itens', json={'balcao': catalogo.listar_todos_balcoes()[0].id})
+    token = r.get_json()['token']
+    url = cliente.get(f'/projeto/{sid}', headers={'X-Projeto-Token': token}).get_json()['pdf_url']
+    pdf = cliente.get(url)
+    assert pdf.status_code == 200 and pdf.get_data().startswith(b'%PDF')
+    assert cliente.get(url.replace('assinatura=', 'assinatura=0')).status_code == 403
+    vencido = app.conversas.obter(sid).projeto.link_pdf(sid, validade=-1)
+    assert cliente.get(vencido).status_code == 403
+
+
+def test_pdf_grande_em_varias_paginas(app, catalogo):
+    rnd = random.Random(9)
+    balcoes = catalogo.listar_todos_balcoes()
+    projeto = app.Projeto(catalogo)
+    for _ in range(120):
+        projeto.adicionar(configuracao_aleatoria(rnd, balcoes))
+    destino = io.BytesIO()
+    paginas = app.renderizar_pdf_projeto(app.dados_pdf_projeto(projeto), destino)
+    conteudo = destino.getvalue()
+    assert paginas > 1 and conteudo.startswith(b'%PDF') and conteudo.count(b'/Type /Page\n') == paginas
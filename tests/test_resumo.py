@@ -0,0 +1,77 @@
+"""O resumo montado a partir dos fragmentos em cache é idêntico, byte a byte, ao original"""
+import random
+
+
+def resumo_original(balcao, personalizacoes_ativas=[]):
+    """gerar_resumo_balcao antes dos fragmentos em cache (concatenação a cada turno)"""
+    if not balcao:
+        return "Nenhum balcão selecionado."
+
+    resposta = f" *Orçamento para: {balcao.nome}*\n\n"
+    resposta += f" *Preço Base da Estrutura:* R$ {balcao.preco_base:.2f}\n\n"
+    resposta += " *Componentes Incluídos (Configuração Padrão):*\n"
+
+    for comp in balcao.componentes:
+        personalizacao_ativa = next((p for p in personalizacoes_ativas if p['componente'] == comp.nome), None)
+
+        if personalizacao_ativa:
+            alt = personalizacao_ativa['alternativa']
+            preco_unitario = comp.preco_unitario + alt.preco_diferenca
+            descricao_alt = f" (Personalizado: {alt.marca_alternativa} - {alt.cor_alternativa})"
+        else:
+            preco_unitario = comp.preco_unitario
+            descricao_alt = ""
+
+        subtotal = preco_unitario * comp.quantidade
+
+        resposta += f"  • *{comp.nome}* (x{comp.quantidade}) - {comp.marca_padrao} ({comp.cor_padrao}){descricao_alt}\n"
+        resposta += f"    💵 Unitário: R$ {preco_unitario:.2f} | Subtotal: R$ {subtotal:.2f}\n"
+
+        if not personalizacao_ativa and comp.alternativas:
+            resposta += "    ✨ *Opções de personalização disponíveis:*\n"
+            for alt in comp.alternativas:
+                novo_preco = comp.preco_unitario + alt.preco_diferenca
+                resposta += f"      - Trocar para {alt.marca_alternativa} ({alt.cor_alternativa}) "
+                resposta += f"por R$ {novo_preco:.2f}/unid (dif. +R$ {alt.preco_diferenca:.2f})\n"
+        resposta += "\n"
+
+    total_final = balcao.calcular_preco_total() + sum(p['preco_adicional_total'] for p in personalizacoes_ativas)
+    resposta += f"💰 *VALOR TOTAL DO ORÇAMENTO:* R$ {total_final:.2f}\n\n"
+
+    if not personalizacoes_ativas:
+        resposta += "🤔 *Deseja personalizar algum componente? Me diga qual e para qual opção!*\n"
+        resposta += "Ex: 'Trocar a dobradiça para Hafele' ou 'Mudar a cor da frente para Madeira'.\n"
+    else:
+        resposta += "✅ *Personalização aplicada! Deseja alterar mais algo ou finalizar o orçamento?*\n"
+        resposta += "Digite 'finalizar' para concluir e gerar o PDF."
+    return resposta
+
+
+def test_resumo_sem_personalizacao(app, catalogo):
+    for balcao in catalogo.listar_todos_balcoes():
+        assert app.gerar_resumo_balcao(balcao).encode('utf-8') == resumo_original(balcao).encode('utf-8')
+    assert app.gerar_resumo_balcao(None) == resumo_original(None)
+
+
+def test_resumo_turnos_de_personalizacao(app, catalogo):
+    """Vários turnos na mesma conversa: cada resumo sai igual ao original"""
+    rnd = random.Random(19)
+    for balcao in rnd.sample(catalogo.listar_todos_balcoes(), 60):
+        conversa = app.ConversaBalcao(catalogo)
+        conversa.balcao_selecionado = balcao
+        trocaveis = [c for c in balcao.componentes if c.alternativas]
+        for _ in range(5):
+            comp = rnd.choice(trocaveis)
+            assert conversa.aplicar_personalizacao(comp.nome, rnd.choice(comp.alternativas))
+            esperado = resumo_original(balcao, conversa.personalizacoes)
+            assert app.gerar_resumo_balcao(balcao, conversa.personalizacoes).encode('utf-8') == esperado.encode('utf-8')
+
+
+def test_resumo_personalizacao_repetida_vale_a_primeira(app, catalogo):
+    balcao = next(b for b in catalogo.listar_todos_balcoes() if any(len(c.alternativas) > 1 for c in b.componentes))
+    comp = next(c for c in balcao.componentes if len(c.alternativas) > 1)
+    personalizacoes = [
+        {'componente': comp.nome, 'alternativa': alt, 'preco_adicional_total': alt.preco_diferenca * comp.quantidade}
+        for alt in comp.alternativas[:2]
+    ]
+    assert app.gerar_resumo_balcao(balcao, personalizacoes) == resumo_original(balcao, personalizacoes)
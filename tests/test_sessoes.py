@@ -0,0 +1,78 @@
+"""Armazéns de sessões: expiração por TTL, LRU e gravação em lote (write-behind) no SQLite"""
+import time
+
+import pytest
+
+
+@pytest.fixture
+def conversa(app, catalogo, monkeypatch):
+    """Fábrica de conversas com um balcão escolhido, no catálogo sintético (registrado como versão ativa)"""
+    monkeypatch.setitem(app.catalogos_ativos, catalogo.versao, catalogo)
+
+    def criar(indice=0, estado='PRODUTO_SELECIONADO'):
+        nova = app.ConversaBalcao(catalogo)
+        nova.balcao_selecionado = catalogo.listar_todos_balcoes()[indice]
+        nova.estado = app.ESTADOS[estado]
+        return nova
+    return criar
+
+
+def esperar(condicao, prazo=5):
+    limite = time.time() + prazo
+    while not condicao() and time.time() < limite:
+        time.sleep(0.01)
+    return condicao()
+
+
+def test_memoria_expira_pelo_ttl(app, conversa):
+    armazem = app.ArmazemSessoesMemoria(ttl=0.05)
+    armazem.salvar('s', conversa())
+    assert armazem.obter('s') is not None
+    time.sleep(0.1)
+    assert armazem.obter('s') is None
+    assert len(armazem) == 0
+
+
+def test_memoria_descarta_a_menos_usada(app, conversa):
+    armazem = app.ArmazemSessoesMemoria(max_sessoes=2)
+    armazem.salvar('a', conversa(0))
+    armazem.salvar('b', conversa(1))
+    armazem.obter('a')
+    armazem.salvar('c', conversa(2))
+    assert 'a' in armazem and 'c' in armazem and 'b' not in armazem
+
+
+def test_sqlite_grava_em_lote(app, conversa, tmp_path):
+    caminho = str(tmp_path / 'sessoes.db')
+    worker = app.ArmazemSessoesSQLite(caminho, intervalo=60, tamanho_lote=3)
+    outro_worker = app.ArmazemSessoesSQLite(caminho, intervalo=60)
+    worker.salvar('s0', conversa(7))
+    # Pendente: visível só para quem salvou, até a gravação
+    assert worker.obter('s0').balcao_selecionado.id == conversa(7).balcao_selecionado.id
+    assert outro_worker.obter('s0') is None
+    worker.gravar_pendentes()
+    assert outro_worker.obter('s0').balcao_selecionado.id == conversa(7).balcao_selecionado.id
+
+    # Lote cheio acorda a thread de gravação sem esperar o intervalo
+    worker.salvar('s1', conversa(1))
+    worker.salvar('s2', conversa(2))
+    worker.remover('s0')
+    assert esperar(lambda: outro_worker.obter('s0') is None and outro_worker.obter('s2') is not None)
+    assert len(outro_worker) == 2
+
+
+def test_sqlite_expira_pelo_ttl(app, conversa, tmp_path):
+    armazem = app.ArmazemSessoesSQLite(str(tmp_path / 'sessoes.db'), ttl=0.2, intervalo=60)
+    armazem.salvar('s', conversa(estado='ORCAMENTO_FINALIZADO'))
+    armazem.gravar_pendentes()
+    assert armazem.finalizadas(0) == ['s']
+    time.sleep(0.3)
+    assert armazem.obter('s') is None
+    assert armazem.finalizadas(0) == []
+    assert len(armazem) == 0
+
+
+def test_versoes_em_uso(app, catalogo, conversa, tmp_path):
+    for armazem in (app.ArmazemSessoesMemoria(), app.ArmazemSessoesSQLite(str(tmp_path / 'sessoes.db'), intervalo=60)):
+        armazem.salvar('s', conversa())
+        assert armazem.versoes_em_uso() == {catalogo.versao}